@@ -1,6 +1,7 @@
 import streamlit as st
-from PyPDF2 import PdfReader, PdfWriter
-import io
+
+from core import tables, warmup, whisper_models
+from core.metrics import metrics
 
 
 st.set_page_config(
@@ -8,3 +9,40 @@ st.set_page_config(
     page_title="Data Manipulation Center"
 )
 
+
+# Start loading the default Whisper model once per server process, so the
+# first visit to the audio page does not have to wait for it.
+@st.cache_resource
+def start_whisper_prewarm():
+    return whisper_models.prewarm()
+
+
+start_whisper_prewarm()
+
+
+# Optionally import the heavy modules in the background as well
+# (EXTRACT_WARMUP_MODULES=all or a comma-separated list)
+@st.cache_resource
+def start_module_prewarm():
+    return warmup.prewarm()
+
+
+start_module_prewarm()
+
+
+# Optionally start the tabula JVM in the background as well (TABULA_PREWARM=1)
+@st.cache_resource
+def start_tabula_prewarm():
+    return tables.prewarm()
+
+
+start_tabula_prewarm()
+
+
+# Serve the job metrics for Prometheus when EXTRACT_METRICS_PORT is set
+@st.cache_resource
+def start_metrics_server():
+    return metrics.serve()
+
+
+start_metrics_server()
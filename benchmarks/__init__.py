@@ -0,0 +1 @@
+# Benchmarks for the core operations: python -m benchmarks.run --help
@@ -0,0 +1,178 @@
+import os
+import statistics
+import time
+
+from core import parallel
+
+# One function per benchmarked operation. Each takes the corpus manifest,
+# runs the tool's core operation over its inputs and returns the amount of
+# work done in the case's unit, for the throughput figure.
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _pdfs(corpus):
+    return [(item["path"], item["pages"]) for item in corpus["pdfs"]]
+
+
+def _text(corpus, engine):
+    from core import pdf_text
+    from core.text_spool import TextSpool
+    pages = 0
+    for path, _ in _pdfs(corpus):
+        spool = TextSpool()
+        pages += pdf_text.extract_text_to_spool(_read(path), spool, engine)[0]
+        spool.close()
+    return pages
+
+
+def text_fitz(corpus):
+    return _text(corpus, "fitz")
+
+
+def text_pdfplumber(corpus):
+    return _text(corpus, "pdfplumber")
+
+
+def tables_pdfplumber(corpus):
+    from core import tables
+    for path, _ in _pdfs(corpus):
+        tables.read_tables_plumber(_read(path))
+    return sum(pages for _, pages in _pdfs(corpus))
+
+
+def tables_tabula(corpus):
+    from core import tables
+    pdfs = [(os.path.basename(path), _read(path)) for path, _ in _pdfs(corpus)]
+    results = tables.tabula_service.read_batch(pdfs)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return sum(pages for _, pages in _pdfs(corpus))
+
+
+def tables_to_xlsx(corpus):
+    # Detection plus the XLSX export, as the table pages do for a download.
+    from core import table_export, tables
+    frames = []
+    for path, _ in _pdfs(corpus):
+        frames.extend(tables.read_tables_plumber(_read(path)))
+    output = parallel.spooled_file()
+    table_export.write_xlsx([("tables", table_export.combine_tables(frames))], output)
+    output.close()
+    return len(frames)
+
+
+def images(corpus):
+    from core import pdf_images
+    documents = [(os.path.basename(path), f"doc{idx}", _read(path))
+                 for idx, (path, _) in enumerate(_pdfs(corpus))]
+    for result in pdf_images.extract_documents(documents):
+        if isinstance(result, Exception):
+            raise result
+        result[0].close()
+    return sum(pages for _, pages in _pdfs(corpus))
+
+
+def ocr(corpus):
+    from core import ocr as ocr_module
+    for item in corpus["images"]:
+        ocr_module.ocr_image(_read(item["path"]), preset=ocr_module.PRESETS["Fast"])
+    return len(corpus["images"])
+
+
+def merge(corpus):
+    from core import pdf_merge
+    output = parallel.spooled_file()
+    report = pdf_merge.merge_pdfs([path for path, _ in _pdfs(corpus)], output)
+    output.close()
+    return report["pages"]
+
+
+def split(corpus):
+    from core import pdf_split
+    path, pages = max(_pdfs(corpus), key=lambda item: item[1])
+    parts = [(pdf_split.part_file_name(idx + 1), part)
+             for idx, part in enumerate(pdf_split.plan_every_n(pages, 2))]
+    output = parallel.spooled_file()
+    pdf_split.split_to_zip(_read(path), parts, output)
+    output.close()
+    return pages
+
+
+def whisper_tiny(corpus):
+    from core import transcription, whisper_models
+    model = whisper_models.get_model("tiny")
+    audio_seconds = 0.0
+    for item in corpus["audio"]:
+        audio = transcription.decode_audio(_read(item["path"]), suffix=".wav")
+        model.transcribe(audio, **whisper_models.transcribe_options("pytorch"))
+        audio_seconds += len(audio) / transcription.SAMPLE_RATE
+    return audio_seconds
+
+
+# The core modules the pages import at startup. They import their heavy
+# dependencies on first use, so these should stay cheap.
+STARTUP_MODULES = [
+    "core.incremental", "core.metrics", "core.ocr", "core.parallel", "core.pdf_images", "core.pdf_merge",
+    "core.pdf_split", "core.pdf_text", "core.result_cache", "core.table_export", "core.tables",
+    "core.text_spool", "core.transcription", "core.whisper_models",
+]
+
+
+def startup_imports(corpus):
+    # Each module is imported in a fresh interpreter, as on a cold start.
+    # They need no optional dependency to import, so a failure is a broken
+    # module and reported as an error, not a skip (hence no ImportError).
+    from core import warmup
+    for name in STARTUP_MODULES:
+        if warmup.cold_import_seconds(name) is None:
+            raise RuntimeError(f"{name} cannot be imported")
+    return len(STARTUP_MODULES)
+
+
+CASES = {
+    # name: (function, unit)
+    "startup_imports": (startup_imports, "modules"),
+    "text_fitz": (text_fitz, "pages"),
+    "text_pdfplumber": (text_pdfplumber, "pages"),
+    "tables_pdfplumber": (tables_pdfplumber, "pages"),
+    "tables_tabula": (tables_tabula, "pages"),
+    "tables_to_xlsx": (tables_to_xlsx, "tables"),
+    "images": (images, "pages"),
+    "ocr": (ocr, "images"),
+    "merge": (merge, "pages"),
+    "split": (split, "pages"),
+    "whisper_tiny": (whisper_tiny, "audio seconds"),
+}
+
+
+def run_case(name, corpus, repeat=3, warmup=1):
+    # Runs in a fresh worker process, so the peak RSS belongs to this case
+    # alone. Warm-up runs (model loads, JVM start, imports) are not timed.
+    function, unit = CASES[name]
+    try:
+        for _ in range(warmup):
+            function(corpus)
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            units = function(corpus)
+            runs.append(time.perf_counter() - start)
+    except (ImportError, OSError) as e:
+        # Missing optional dependency or program (Java, Tesseract, ffmpeg)
+        return {"skipped": f"{type(e).__name__}: {e}"}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    seconds = statistics.median(runs)
+    return {
+        "seconds": round(seconds, 4),
+        "runs": [round(run, 4) for run in runs],
+        "units": units,
+        "unit": unit,
+        "throughput": round(units / seconds, 2) if seconds else None,
+        "peak_rss_mb": parallel.peak_rss_mb(),
+    }
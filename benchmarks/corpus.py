@@ -0,0 +1,167 @@
+import io
+import json
+import math
+import os
+import random
+import wave
+
+# Deterministic inputs for the benchmarks. Everything is generated from a
+# seed, so the same profile and seed always produce the same files and runs
+# on different machines or commits time identical work.
+
+PROFILES = {
+    # pages of each generated PDF, OCR images, seconds of audio
+    "small": {"pdf_pages": [4, 20], "ocr_images": 3, "audio_seconds": [15]},
+    "full": {"pdf_pages": [10, 100, 400], "ocr_images": 10, "audio_seconds": [30, 300]},
+}
+
+WORDS = (
+    "invoice total amount customer order shipment delivery account balance payment "
+    "quarter revenue region product service contract period report summary table "
+    "figure analysis result method sample value average growth market cost"
+).split()
+
+SAMPLE_RATE = 16000
+
+
+def _sentence(rng, words=12):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text.capitalize() + "."
+
+
+def _noise_png(rng, width, height):
+    # A photo-like image (smooth gradient plus noise) as PNG bytes.
+    import numpy as np
+    from PIL import Image
+    np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=-1)
+    pixels = np.clip(base + np_rng.normal(0, 25, base.shape), 0, 255).astype("uint8")
+    output = io.BytesIO()
+    Image.fromarray(pixels, "RGB").save(output, format="PNG")
+    return output.getvalue()
+
+
+def _ruled_table(page, rng, top, rows=6, columns=4):
+    # Header plus rows of numbers inside drawn cell borders, the kind of
+    # table both table engines detect.
+    import fitz
+    left, cell_width, cell_height = 50, 120, 20
+    for row in range(rows + 1):
+        for column in range(columns):
+            rect = fitz.Rect(left + column * cell_width, top + row * cell_height,
+                             left + (column + 1) * cell_width, top + (row + 1) * cell_height)
+            page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+            text = f"Column {column + 1}" if row == 0 else f"{rng.randint(0, 99999) / 100:.2f}"
+            page.insert_text((rect.x0 + 4, rect.y1 - 6), text, fontsize=9)
+    return top + (rows + 1) * cell_height
+
+
+def make_pdf(path, pages, rng):
+    # Every page has a paragraph of text and the same logo (one xref, as in
+    # real documents); every third page a ruled table; every fifth page a
+    # unique photo. A bookmark starts every tenth page.
+    import fitz
+    logo = _noise_png(rng, 64, 64)
+    with fitz.open() as doc:
+        toc = []
+        logo_xref = 0
+        for page_index in range(pages):
+            page = doc.new_page(width=595, height=842)
+            logo_rect = fitz.Rect(480, 30, 544, 94)
+            if logo_xref:
+                page.insert_image(logo_rect, xref=logo_xref)
+            else:
+                logo_xref = page.insert_image(logo_rect, stream=logo)
+            page.insert_textbox(fitz.Rect(50, 110, 545, 300),
+                                " ".join(_sentence(rng) for _ in range(8)), fontsize=10)
+            top = 320
+            if page_index % 3 == 0:
+                top = _ruled_table(page, rng, top) + 20
+            if page_index % 5 == 0:
+                page.insert_image(fitz.Rect(50, top, 350, top + 200), stream=_noise_png(rng, 300, 200))
+            if page_index % 10 == 0:
+                toc.append([1, f"Section {page_index // 10 + 1}", page_index + 1])
+        doc.set_toc(toc)
+        # Fixed metadata and no new file id, so the bytes are reproducible.
+        doc.set_metadata({"creationDate": "D:20240101000000", "modDate": "D:20240101000000",
+                          "producer": "benchmark corpus"})
+        doc.save(path, garbage=3, deflate=True, no_new_id=True)
+
+
+def make_text_image(path, rng, lines=12):
+    # Black text on a white page at roughly 300 DPI sizes, for Tesseract.
+    from PIL import Image, ImageDraw, ImageFont
+    try:
+        font = ImageFont.load_default(size=36)
+    except TypeError:  # Pillow < 10.1 only has the small bitmap font
+        font = ImageFont.load_default()
+    image = Image.new("L", (2480, 120 + lines * 60), 255)
+    draw = ImageDraw.Draw(image)
+    for line in range(lines):
+        draw.text((100, 60 + line * 60), _sentence(rng, 9), fill=0, font=font)
+    image.save(path, format="PNG", dpi=(300, 300))
+
+
+def make_speech_like_wav(path, seconds, rng):
+    # Voiced "syllables": a few harmonics over a wandering pitch with
+    # formant-like amplitude weights and a syllable envelope, separated by
+    # short and long pauses, plus low background noise. Not intelligible,
+    # but it has the energy pattern Whisper and the silence detector see in
+    # speech.
+    import numpy as np
+    np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    audio = np_rng.normal(0, 0.003, int(seconds * SAMPLE_RATE))
+    position = 0.2
+    while position < seconds - 0.5:
+        duration = rng.uniform(0.12, 0.35)
+        samples = int(duration * SAMPLE_RATE)
+        t = np.arange(samples) / SAMPLE_RATE
+        pitch = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * math.pi * rng.uniform(1, 4) * t))
+        phase = 2 * math.pi * np.cumsum(pitch) / SAMPLE_RATE
+        formant = rng.uniform(2, 5)
+        syllable = sum(np.sin(k * phase) / (1 + abs(k - formant)) for k in range(1, 8))
+        syllable *= np.sin(math.pi * t / duration) ** 2 * 0.2
+        start = int(position * SAMPLE_RATE)
+        audio[start:start + samples] += syllable[:len(audio) - start]
+        # Mostly short gaps between syllables, sometimes a sentence pause.
+        position += duration + (rng.uniform(0.6, 1.5) if rng.random() < 0.08 else rng.uniform(0.03, 0.12))
+    pcm = (np.clip(audio, -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+
+
+def generate(directory, profile="small", seed=0):
+    # Create the corpus in `directory` unless a complete one with the same
+    # profile and seed is already there. Returns the manifest: the generated
+    # file paths by kind.
+    manifest_path = os.path.join(directory, "corpus.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("profile") == profile and manifest.get("seed") == seed:
+            return manifest
+
+    settings = PROFILES[profile]
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"profile": profile, "seed": seed, "pdfs": [], "images": [], "audio": []}
+    for pages in settings["pdf_pages"]:
+        path = os.path.join(directory, f"document_{pages:04d}p.pdf")
+        make_pdf(path, pages, rng)
+        manifest["pdfs"].append({"path": path, "pages": pages})
+    for idx in range(settings["ocr_images"]):
+        path = os.path.join(directory, f"scan_{idx:03d}.png")
+        make_text_image(path, rng)
+        manifest["images"].append({"path": path})
+    for seconds in settings["audio_seconds"]:
+        path = os.path.join(directory, f"speech_{seconds:04d}s.wav")
+        make_speech_like_wav(path, seconds, rng)
+        manifest["audio"].append({"path": path, "seconds": seconds})
+    # Written last, so an interrupted generation is redone next time.
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -0,0 +1,130 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import cases, corpus
+from core import parallel
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "extract-center-bench")
+
+# A case is reported as a regression when its median time grows by more than
+# this fraction over the baseline.
+DEFAULT_TOLERANCE = 0.15
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(names, manifest, repeat, warmup):
+    results = {}
+    for name in names:
+        print(f"{name} ...", end=" ", flush=True)
+        # Each case gets a fresh process: imports, loaded models and the peak
+        # memory of one case do not leak into the next.
+        with parallel.process_pool(1) as pool:
+            result = pool.submit(cases.run_case, name, manifest, repeat, warmup).result()
+        results[name] = result
+        if "seconds" in result:
+            print(f"{result['seconds']:.3f} s, {result['throughput']} {result['unit']}/s, "
+                  f"peak {result['peak_rss_mb'] or 0:.0f} MB", flush=True)
+        else:
+            print(result.get("skipped") or result.get("error"), flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Print current vs. baseline median times. Returns the regressed cases.
+    regressions = []
+    print(f"\n{'case':<20} {'baseline s':>11} {'current s':>10} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name, {})
+        if "seconds" not in result or "seconds" not in before:
+            continue
+        change = result["seconds"] / before["seconds"] - 1 if before["seconds"] else 0.0
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -tolerance:
+            flag = "  faster"
+        print(f"{name:<20} {before['seconds']:>11.3f} {result['seconds']:>10.3f} {change:>+8.0%}{flag}")
+    if baseline.get("environment", {}).get("machine") != platform.node():
+        print("\nNote: the baseline was recorded on another machine; compare with care.")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Time the core operations of every tool on a generated corpus.",
+    )
+    parser.add_argument("--profile", choices=sorted(corpus.PROFILES), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", help=f"where the corpus is generated (default {DEFAULT_CORPUS_DIR}/<profile>-<seed>)")
+    parser.add_argument("--cases", help=f"comma-separated subset of: {', '.join(cases.CASES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the median is reported")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs per case first")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown before a case counts as a regression (0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    names = args.cases.split(",") if args.cases else list(cases.CASES)
+    unknown = [name for name in names if name not in cases.CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    corpus_dir = args.corpus_dir or os.path.join(DEFAULT_CORPUS_DIR, f"{args.profile}-{args.seed}")
+    print(f"Corpus: {corpus_dir} (profile {args.profile}, seed {args.seed})")
+    manifest = corpus.generate(corpus_dir, args.profile, args.seed)
+
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "machine": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "commit": _git_commit(),
+        },
+        "corpus": {"profile": args.profile, "seed": args.seed},
+        "repeat": args.repeat,
+        "results": run(names, manifest, args.repeat, args.warmup),
+    }
+
+    for path in filter(None, [args.output, args.baseline if args.save_baseline else None]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {path}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("corpus") != results["corpus"]:
+        print(f"\nBaseline corpus {baseline.get('corpus')} differs from this run; not comparing.")
+        return 0
+    regressions = compare(results["results"], baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+# Shared helpers used by the Streamlit pages in pages/.
+#
+# Streamlit adds the directory of FrontCenter.py to sys.path, so the pages can
+# simply `import core.<module>`. Anything that has to live for the whole
+# server process (loaded models, caches, pools) is kept at module level here,
+# because modules are imported once per process while the page scripts are
+# re-executed on every rerun.
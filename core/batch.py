@@ -0,0 +1,341 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from core import parallel
+
+# Headless versions of the operations behind the pages, working on file
+# paths instead of uploads, and a batch runner that applies one of them to
+# every matching file under a directory. Used by the command line in
+# core/cli.py; nothing here imports Streamlit.
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def _write_atomic(output_path, write):
+    # Write through a temp file next to the output and rename it into place,
+    # so an interrupted run never leaves a half-written output behind.
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    partial_path = output_path + ".partial"
+    try:
+        with open(partial_path, "wb") as f:
+            result = write(f)
+        os.replace(partial_path, output_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return result
+
+
+def _write_text(output_path, text):
+    _write_atomic(output_path, lambda f: f.write(text.encode("utf-8")))
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def merge_files(paths, output_path, engine="fitz", dedupe=True):
+    from core import pdf_merge
+    return _write_atomic(output_path, lambda f: pdf_merge.merge_pdfs(list(paths), f, engine, dedupe))
+
+
+def split_file(path, output_path, mode="every_n", pages_per_part=1, max_mb=10.0, workers=1):
+    # Split the PDF into parts (every N pages, by size or by bookmarks) and
+    # write them as one ZIP.
+    from core import pdf_split, pdf_text
+    data = _read(path)
+    if mode == "every_n":
+        plan = [(None, pages) for pages in pdf_split.plan_every_n(pdf_text.page_count(data), pages_per_part)]
+    elif mode == "max_size":
+        plan = [(None, pages) for pages in pdf_split.plan_max_size(data, max_mb)]
+    elif mode == "bookmarks":
+        plan = pdf_split.plan_bookmarks(data)
+    else:
+        raise ValueError(f"Unknown split mode: {mode}")
+    parts = [(pdf_split.part_file_name(idx + 1, title or ""), pages) for idx, (title, pages) in enumerate(plan)]
+    return _write_atomic(output_path, lambda f: pdf_split.split_to_zip(data, parts, f, workers))
+
+
+def extract_text_file(path, output_path, engine="fitz", ocr_dpi=None, lang="eng", workers=1):
+    from core import pdf_text
+
+    def write(f):
+        # extract_text_to_spool only needs write(text); the output file is
+        # wrapped as UTF-8 text and detached again, so closing stays with
+        # _write_atomic.
+        import io
+        text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+        pages, ocr_pages, seconds = pdf_text.extract_text_to_spool(
+            _read(path), text, engine, workers, ocr_dpi=ocr_dpi, lang=lang
+        )
+        text.flush()
+        text.detach()
+        return {"pages": pages, "ocr_pages": ocr_pages, "seconds": seconds}
+
+    return _write_atomic(output_path, write)
+
+
+def extract_tables_file(path, output_path, engine="pdfplumber", output_format="xlsx", workers=1):
+    # All tables of the PDF as one sheet (xlsx), one CSV per table (csv_zip)
+    # or one Parquet file.
+    from core import table_export, tables
+    name = os.path.basename(path)
+    result = tables.read_batch([(name, _read(path))], engine, workers)[0]
+    if isinstance(result, Exception):
+        raise result
+
+    def write(f):
+        base = os.path.splitext(name)[0]
+        if output_format == "xlsx":
+            if result:
+                table_export.write_xlsx([(base, table_export.combine_tables(result))], f)
+            else:
+                table_export.write_xlsx([], f)
+        elif output_format == "csv_zip":
+            table_export.write_csv_zip(((f"{base}_table{idx + 1}", df) for idx, df in enumerate(result)), f)
+        elif output_format == "parquet":
+            table_export.write_parquet(
+                [(name, df.attrs.get("page"), idx + 1, df) for idx, df in enumerate(result)], f
+            )
+        else:
+            raise ValueError(f"Unknown output format: {output_format}")
+        return {"tables": len(result)}
+
+    return _write_atomic(output_path, write)
+
+
+def extract_images_file(path, output_path, dedupe=True, min_side=0, workers=1):
+    import shutil
+    from core import pdf_images
+    pdf_name = os.path.splitext(os.path.basename(path))[0]
+    result = pdf_images.extract_documents(
+        [(pdf_name, pdf_name.replace(" ", "_"), _read(path))], dedupe, min_side, workers
+    )[0]
+    if isinstance(result, Exception):
+        raise result
+    archive_file, image_count, report = result
+
+    def write(f):
+        with archive_file:
+            archive_file.seek(0)
+            shutil.copyfileobj(archive_file, f, 1024 * 1024)
+        return {"images": image_count, "bytes_saved": report["bytes_saved"]}
+
+    return _write_atomic(output_path, write)
+
+
+def ocr_file(path, output_path, lang="eng", preset="Fast", dpi=300, workers=1):
+    # Images, multi-page TIFFs and PDFs; pages are joined as on the OCR page.
+    from core import ocr
+    options = ocr.PRESETS[preset]
+    data = _read(path)
+    file_name = os.path.basename(path)
+    pages = ocr.iter_document_pages(data, file_name, dpi, gray=options.get("grayscale", False))
+    texts = {}
+    for idx, result, error in ocr.ocr_images(pages, workers, lang, options):
+        if error:
+            raise error
+        texts[idx] = result[0]
+    _write_text(output_path, ocr.join_pages([texts[idx] for idx in range(len(texts))]) if texts else "")
+    return {"pages": len(texts)}
+
+
+def transcribe_file(path, output_path, model_size="base", backend="pytorch", threads=None,
+                    skip_silence=False, vad_margin_db=10.0):
+    # The worker's model is loaded once through the model registry and reused
+    # for every file the worker handles.
+    from core import transcription, whisper_models
+    model = whisper_models.get_model(model_size, backend, threads)
+    audio = transcription.decode_audio(_read(path), suffix=os.path.splitext(path)[1])
+    audio_seconds = len(audio) / transcription.SAMPLE_RATE
+    if skip_silence:
+        regions = transcription.detect_speech(audio, margin_db=vad_margin_db)
+        audio, _ = transcription.compact_regions(audio, regions)
+    if len(audio) == 0:
+        result = {"text": "", "segments": []}
+    else:
+        result = model.transcribe(audio, **whisper_models.transcribe_options(backend))
+    _write_text(output_path, result["text"])
+    return {"audio_seconds": round(audio_seconds, 1)}
+
+
+# Per-file tools for the batch runner: input extensions, output suffix and
+# the operation. `merge` takes a whole directory and is handled separately.
+AUDIO_TYPES = ["mp3", "mp4", "wmv", "wma", "wav", "m4a"]
+TOOLS = {
+    "text": (["pdf"], ".txt", extract_text_file),
+    "tables": (["pdf"], None, extract_tables_file),
+    "images": (["pdf"], "_images.zip", extract_images_file),
+    "ocr": (["png", "jpg", "jpeg", "pdf", "tif", "tiff"], ".txt", ocr_file),
+    "audio": (AUDIO_TYPES, ".txt", transcribe_file),
+    "split": (["pdf"], "_split.zip", split_file),
+}
+
+TABLE_SUFFIXES = {"xlsx": ".xlsx", "csv_zip": "_tables.zip", "parquet": ".parquet"}
+
+
+def output_suffix(tool, options):
+    if tool == "tables":
+        return TABLE_SUFFIXES[options.get("output_format", "xlsx")]
+    return TOOLS[tool][1]
+
+
+def output_name(tool, rel_path, suffix):
+    # Tools that take several input types keep the input's extension in the
+    # output name (scan.png.txt, scan.pdf.txt), so inputs that differ only in
+    # their extension do not write the same output.
+    if len(TOOLS[tool][0]) > 1:
+        return rel_path + suffix
+    return os.path.splitext(rel_path)[0] + suffix
+
+
+def iter_inputs(input_dir, extensions, recursive=True):
+    # Paths relative to input_dir of the files with one of `extensions`, in
+    # a stable order, found lazily so huge directories start right away.
+    extensions = {f".{ext.lower()}" for ext in extensions}
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        if not recursive:
+            dirs.clear()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in extensions:
+                yield os.path.relpath(os.path.join(root, name), input_dir)
+
+
+class Manifest:
+    """Append-only record of the files a batch run has finished.
+
+    One JSON line per completed file in <output dir>/manifest.jsonl, written
+    and flushed as each file completes. A file is done when its size,
+    modification time and the tool options all match its line, so a rerun
+    after a crash picks up where the last one stopped, and changed files or
+    options are processed again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # the line being written when a run crashed
+                    self._done[entry["input"]] = entry
+
+    @staticmethod
+    def fingerprint(path, tool, options):
+        stat = os.stat(path)
+        payload = json.dumps([tool, options], sort_keys=True, default=repr)
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "options": hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16],
+        }
+
+    def is_done(self, rel_path, fingerprint):
+        entry = self._done.get(rel_path)
+        return entry is not None and all(entry.get(name) == value for name, value in fingerprint.items())
+
+    def record(self, rel_path, fingerprint, **details):
+        entry = {"input": rel_path, **fingerprint, **details}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=repr) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._done[rel_path] = entry
+
+    def __len__(self):
+        return len(self._done)
+
+
+def _run_one(task):
+    # Runs in the worker process: (tool, input path, output path, options).
+    tool, path, output_path, options = task
+    start = time.perf_counter()
+    details = TOOLS[tool][2](path, output_path, **options) or {}
+    return {**details, "seconds": round(time.perf_counter() - start, 3)}
+
+
+def run_batch(tool, input_dir, output_dir, options=None, workers=1, recursive=True, resume=True,
+              on_result=None):
+    # Apply `tool` to every matching file under input_dir, writing each
+    # output under output_dir at the same relative path. Files are streamed
+    # through `workers` spawned processes with at most `workers` in flight,
+    # and every output is written as soon as its file is done.
+    # on_result(rel_path, details, error) is called in the calling thread as
+    # files finish (details is None for files skipped by the manifest).
+    # Returns counts of done, skipped and failed files and the seconds taken.
+    if tool not in TOOLS:
+        raise ValueError(f"Unknown tool: {tool}")
+    options = dict(options or {})
+    if tool == "audio":
+        # Split the cores between the workers' Whisper models.
+        options.setdefault("threads", max(1, (os.cpu_count() or workers) // max(1, workers)))
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    suffix = output_suffix(tool, options)
+    totals = {"done": 0, "skipped": 0, "failed": 0}
+    start = time.perf_counter()
+
+    def tasks():
+        # Generator, so the directory walk and the manifest checks run only as
+        # fast as the workers take files.
+        for rel_path in iter_inputs(input_dir, TOOLS[tool][0], recursive):
+            path = os.path.join(input_dir, rel_path)
+            fingerprint = Manifest.fingerprint(path, tool, options)
+            output_path = os.path.join(output_dir, output_name(tool, rel_path, suffix))
+            if resume and manifest.is_done(rel_path, fingerprint) and os.path.exists(output_path):
+                totals["skipped"] += 1
+                if on_result is not None:
+                    on_result(rel_path, None, None)
+                continue
+            yield rel_path, fingerprint, (tool, path, output_path, options)
+
+    def finish(item, details, error):
+        rel_path, fingerprint, task = item
+        if error is None:
+            manifest.record(rel_path, fingerprint, output=os.path.relpath(task[2], output_dir), **details)
+            totals["done"] += 1
+        else:
+            totals["failed"] += 1
+        if on_result is not None:
+            on_result(rel_path, details, error)
+
+    if workers <= 1:
+        for item in tasks():
+            try:
+                details, error = _run_one(item[2]), None
+            except Exception as e:
+                details, error = None, e
+            finish(item, details, error)
+    else:
+        submitted = []  # items by submission index, for bounded_map's indices
+
+        def submitted_tasks():
+            for item in tasks():
+                submitted.append(item)
+                yield item[2]
+
+        with parallel.process_pool(workers) as pool:
+            for index, details, error in parallel.bounded_map(_run_one, submitted_tasks(), workers, pool):
+                finish(submitted[index], details, error)
+                submitted[index] = None  # done; let it be freed
+
+    totals["seconds"] = time.perf_counter() - start
+    return totals
+
+
+def merge_directory(input_dir, output_path, engine="fitz", dedupe=True, recursive=True):
+    # Merge every PDF under input_dir, in path order, into one file.
+    paths = [os.path.join(input_dir, rel_path) for rel_path in iter_inputs(input_dir, ["pdf"], recursive)]
+    if not paths:
+        raise ValueError(f"No PDF files found in {input_dir}")
+    return merge_files(paths, output_path, engine, dedupe)
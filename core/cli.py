@@ -0,0 +1,101 @@
+import argparse
+import sys
+
+from core import batch
+
+USAGE_EXAMPLES = """examples:
+  python -m core.cli text  scans/ out/ --workers 8
+  python -m core.cli tables reports/ out/ --engine pdfplumber --format parquet
+  python -m core.cli audio recordings/ transcripts/ --model small --backend int8 --workers 2
+  python -m core.cli merge chapters/ book.pdf
+"""
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m core.cli",
+        description="Run one of the Data Manipulation Center tools over a directory without Streamlit.",
+        epilog=USAGE_EXAMPLES,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("tool", choices=sorted(list(batch.TOOLS) + ["merge"]))
+    parser.add_argument("input_dir")
+    parser.add_argument("output", help="output directory (for merge: the merged PDF file)")
+    parser.add_argument("--workers", type=int, default=1, help="files processed in parallel")
+    parser.add_argument("--no-recursive", action="store_true", help="only look at the top directory")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="process every file again, ignoring the manifest of completed files")
+
+    tools = parser.add_argument_group("tool options")
+    tools.add_argument("--engine", help="text: fitz|pdfplumber, tables: tabula|pdfplumber, merge: fitz|pypdf2")
+    tools.add_argument("--format", dest="output_format", choices=sorted(batch.TABLE_SUFFIXES),
+                       help="tables output format (default xlsx)")
+    tools.add_argument("--ocr-dpi", type=int, help="text: OCR pages without a text layer at this DPI")
+    tools.add_argument("--lang", help="text/ocr: Tesseract language (default eng)")
+    tools.add_argument("--preset", help="ocr: preprocessing preset (default Fast)")
+    tools.add_argument("--dpi", type=int, help="ocr: render DPI for PDF pages (default 300)")
+    tools.add_argument("--model", dest="model_size", help="audio: Whisper model size (default base)")
+    tools.add_argument("--backend", help="audio: pytorch|int8|ctranslate2")
+    tools.add_argument("--skip-silence", action="store_true", help="audio: drop silent stretches first")
+    tools.add_argument("--mode", help="split: every_n|max_size|bookmarks (default every_n)")
+    tools.add_argument("--pages-per-part", type=int, help="split: pages per part for every_n")
+    tools.add_argument("--max-mb", type=float, help="split: maximum part size for max_size")
+    tools.add_argument("--min-side", type=int, help="images: skip images smaller than this (pixels)")
+    tools.add_argument("--keep-duplicates", action="store_true",
+                       help="images/merge: do not de-duplicate repeated images and fonts")
+    return parser
+
+
+# Which command-line options each tool's operation accepts.
+TOOL_OPTIONS = {
+    "text": ["engine", "ocr_dpi", "lang"],
+    "tables": ["engine", "output_format"],
+    "images": ["min_side", "dedupe"],
+    "ocr": ["lang", "preset", "dpi"],
+    "audio": ["model_size", "backend", "skip_silence"],
+    "split": ["mode", "pages_per_part", "max_mb"],
+}
+
+
+def tool_options(args):
+    values = vars(args)
+    values["dedupe"] = False if args.keep_duplicates else None
+    values["skip_silence"] = args.skip_silence or None
+    return {name: values[name] for name in TOOL_OPTIONS[args.tool] if values.get(name) is not None}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.tool == "merge":
+        try:
+            report = batch.merge_directory(
+                args.input_dir, args.output, args.engine or "fitz", not args.keep_duplicates,
+                recursive=not args.no_recursive
+            )
+        except Exception as e:
+            print(f"FAILED  merge of {args.input_dir}: {e}", file=sys.stderr, flush=True)
+            return 1
+        from core import pdf_merge
+        print(pdf_merge.summary(report))
+        return 0
+
+    def show(rel_path, details, error):
+        if error is not None:
+            print(f"FAILED  {rel_path}: {error}", file=sys.stderr, flush=True)
+        elif details is None:
+            print(f"skipped {rel_path} (already done)", flush=True)
+        else:
+            print(f"done    {rel_path} ({details['seconds']:.2f} s)", flush=True)
+
+    totals = batch.run_batch(
+        args.tool, args.input_dir, args.output, tool_options(args), workers=args.workers,
+        recursive=not args.no_recursive, resume=not args.no_resume, on_result=show
+    )
+    print(f"{totals['done']} done, {totals['skipped']} skipped, {totals['failed']} failed "
+          f"in {totals['seconds']:.1f} s")
+    return 1 if totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import hashlib
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _unique_id(uploaded_file):
+    # Streamlit gives every upload a unique id; older versions call it `id`.
+    return getattr(uploaded_file, "file_id", None) or getattr(uploaded_file, "id", None)
+
+
+def upload_id(uploaded_file):
+    return _unique_id(uploaded_file) or uploaded_file.name
+
+
+class IncrementalStore:
+    """Per-session results keyed by upload id, content hash and parameters.
+
+    Lives in st.session_state, so on a rerun a page only has to process the
+    uploads whose key is not in the store yet.
+    """
+
+    def __init__(self):
+        self._digests = {}  # upload id -> sha256, so each upload is hashed once
+        self._results = {}
+
+    @classmethod
+    def for_session(cls, session_state, name):
+        store_name = f"incremental_{name}"
+        if store_name not in session_state:
+            session_state[store_name] = cls()
+        return session_state[store_name]
+
+    def digest(self, uploaded_file):
+        file_id = _unique_id(uploaded_file)
+        if file_id is None:
+            # Without an id the upload is only known by its name, which a
+            # different file uploaded later can share; hash it every time.
+            return content_hash(uploaded_file.getvalue())
+        if file_id not in self._digests:
+            self._digests[file_id] = content_hash(uploaded_file.getvalue())
+        return self._digests[file_id]
+
+    def key(self, uploaded_file, params=()):
+        return (upload_id(uploaded_file), self.digest(uploaded_file), repr(params))
+
+    def __contains__(self, key):
+        return key in self._results
+
+    def get(self, key, default=None):
+        return self._results.get(key, default)
+
+    def put(self, key, result):
+        self._results[key] = result
+
+    def retain(self, keys):
+        # Drop results (and hashes) of uploads that were removed or whose
+        # parameters changed, so the session only keeps what is on screen.
+        keys = set(keys)
+        self._results = {key: value for key, value in self._results.items() if key in keys}
+        file_ids = {key[0] for key in keys}
+        self._digests = {file_id: digest for file_id, digest in self._digests.items() if file_id in file_ids}
+
+    def clear(self):
+        self._digests.clear()
+        self._results.clear()
@@ -0,0 +1,233 @@
+import collections
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from core import parallel
+
+# How many finished jobs are kept for the diagnostics page and the
+# percentiles; the Prometheus counters cover the whole process lifetime.
+RECENT_JOBS = int(os.environ.get("EXTRACT_METRICS_RECENT_JOBS", "500"))
+
+# Serve the Prometheus text format on this port when set (e.g. 9464).
+METRICS_PORT = int(os.environ.get("EXTRACT_METRICS_PORT", "0"))
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of a non-empty list.
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Job:
+    """One run of a tool's hot path: stage timings, bytes and peak memory.
+
+    Spans may nest; each stage is charged only its own time, so a serialize
+    span that pulls tables through a concat span does not count the concat
+    twice.
+    """
+
+    def __init__(self, tool, labels):
+        self.tool = tool
+        self.labels = labels
+        self.stages = {}  # stage -> seconds
+        self.bytes = 0
+        self.status = "ok"
+        self.error = ""
+        self.started = time.time()
+        self.seconds = 0.0
+        self.peak_rss_mb = parallel.current_rss_mb()
+        self._stack = []  # [stage, start, seconds spent in child spans]
+
+    @contextmanager
+    def span(self, stage):
+        frame = [stage, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - frame[1]
+            self._stack.remove(frame)
+            self.record(stage, elapsed - frame[2])
+            if self._stack:
+                self._stack[-1][2] += elapsed
+            self._sample_memory()
+
+    def record(self, stage, seconds):
+        # Add time measured elsewhere, e.g. the per-stage timings ocr_image
+        # returns.
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def _sample_memory(self):
+        current = parallel.current_rss_mb()
+        if current is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, current)
+
+    def as_row(self):
+        return {
+            "time": time.strftime("%H:%M:%S", time.localtime(self.started)),
+            "tool": self.tool,
+            "status": self.status,
+            "seconds": round(self.seconds, 3),
+            "MB": round(self.bytes / (1024 * 1024), 2),
+            "peak RSS MB": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            **{f"{stage} s": round(seconds, 3) for stage, seconds in self.stages.items()},
+            **self.labels,
+            "error": self.error,
+        }
+
+
+class MetricsStore:
+    """In-process store of job timings, exported in the Prometheus text format."""
+
+    def __init__(self, recent=RECENT_JOBS):
+        self._lock = threading.Lock()
+        self._recent = collections.deque(maxlen=recent)
+        self._jobs = collections.Counter()          # (tool, status) -> count
+        self._job_seconds = collections.Counter()   # tool -> seconds
+        self._stage_seconds = collections.Counter()  # (tool, stage) -> seconds
+        self._bytes = collections.Counter()          # tool -> bytes
+
+    @contextmanager
+    def job(self, tool, **labels):
+        job = Job(tool, labels)
+        start = time.perf_counter()
+        try:
+            yield job
+        except BaseException as e:
+            job.status = "error"
+            job.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            job.seconds = time.perf_counter() - start
+            job._sample_memory()
+            self._finish(job)
+
+    def _finish(self, job):
+        with self._lock:
+            self._recent.append(job)
+            self._jobs[(job.tool, job.status)] += 1
+            self._job_seconds[job.tool] += job.seconds
+            self._bytes[job.tool] += job.bytes
+            for stage, seconds in job.stages.items():
+                self._stage_seconds[(job.tool, stage)] += seconds
+
+    def recent(self, tool=None):
+        with self._lock:
+            jobs = list(self._recent)
+        return [job for job in jobs if tool is None or job.tool == tool]
+
+    def percentiles(self):
+        # Per tool over the recent jobs: count, p50/p90/p99 job seconds and the
+        # mean seconds of each stage.
+        rows = []
+        by_tool = collections.defaultdict(list)
+        for job in self.recent():
+            by_tool[job.tool].append(job)
+        for tool, jobs in sorted(by_tool.items()):
+            seconds = [job.seconds for job in jobs]
+            row = {"tool": tool, "jobs": len(jobs), "errors": sum(job.status != "ok" for job in jobs)}
+            for q in QUANTILES:
+                row[f"p{int(q * 100)} s"] = round(percentile(seconds, q), 3)
+            stages = collections.Counter()
+            for job in jobs:
+                stages.update(job.stages)
+            for stage, total in stages.most_common():
+                row[f"mean {stage} s"] = round(total / len(jobs), 3)
+            rows.append(row)
+        return rows
+
+    def prometheus_text(self):
+        def labels(**values):
+            return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in values.items()) + "}"
+
+        with self._lock:
+            recent = list(self._recent)
+            jobs = dict(self._jobs)
+            job_seconds = dict(self._job_seconds)
+            stage_seconds = dict(self._stage_seconds)
+            processed = dict(self._bytes)
+
+        lines = [
+            "# HELP extract_job_seconds Wall time of tool jobs (quantiles over the recent jobs).",
+            "# TYPE extract_job_seconds summary",
+        ]
+        by_tool = collections.defaultdict(list)
+        for job in recent:
+            by_tool[job.tool].append(job.seconds)
+        for tool, seconds in sorted(by_tool.items()):
+            for q in QUANTILES:
+                lines.append(f"extract_job_seconds{labels(tool=tool, quantile=q)} {percentile(seconds, q):.6f}")
+        for tool in sorted(job_seconds):
+            count = sum(value for (name, _), value in jobs.items() if name == tool)
+            lines.append(f"extract_job_seconds_sum{labels(tool=tool)} {job_seconds[tool]:.6f}")
+            lines.append(f"extract_job_seconds_count{labels(tool=tool)} {count}")
+
+        lines += ["# HELP extract_jobs_total Finished tool jobs by status.",
+                  "# TYPE extract_jobs_total counter"]
+        for (tool, status), count in sorted(jobs.items()):
+            lines.append(f"extract_jobs_total{labels(tool=tool, status=status)} {count}")
+
+        lines += ["# HELP extract_stage_seconds_total Time spent per tool and stage.",
+                  "# TYPE extract_stage_seconds_total counter"]
+        for (tool, stage), seconds in sorted(stage_seconds.items()):
+            lines.append(f"extract_stage_seconds_total{labels(tool=tool, stage=stage)} {seconds:.6f}")
+
+        lines += ["# HELP extract_bytes_processed_total Input bytes processed per tool.",
+                  "# TYPE extract_bytes_processed_total counter"]
+        for tool, count in sorted(processed.items()):
+            lines.append(f"extract_bytes_processed_total{labels(tool=tool)} {count}")
+
+        peak = parallel.peak_rss_mb()
+        if peak is not None:
+            lines += ["# HELP extract_process_peak_rss_bytes Peak resident memory of the server process.",
+                      "# TYPE extract_process_peak_rss_bytes gauge",
+                      f"extract_process_peak_rss_bytes {int(peak * 1024 * 1024)}"]
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._jobs.clear()
+            self._job_seconds.clear()
+            self._stage_seconds.clear()
+            self._bytes.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = MetricsStore()
+
+
+def serve(port=METRICS_PORT):
+    # Serve /metrics for Prometheus from a daemon thread. Returns the server,
+    # or None when no port is configured.
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # keep scrapes out of the server log
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,216 @@
+import io
+import os
+import time
+
+from core import parallel
+
+# Configure the path to the Tesseract executable. The Windows default install
+# location is used when it exists; otherwise tesseract must be on the PATH.
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD", r"C:/Program Files/Tesseract-OCR/tesseract.exe")
+
+# Tesseract starts its own OpenMP threads for every call; with several calls
+# running side by side that only oversubscribes the cores. pytesseract starts
+# tesseract with this process's environment and has no option for another
+# one, so the limit is set here, once, unless the deployment sets its own.
+# It is inherited by everything started after this import, torch's OpenMP
+# included: set OMP_THREAD_LIMIT for the server to give torch more threads.
+TESSERACT_THREAD_LIMIT = "1"
+os.environ.setdefault("OMP_THREAD_LIMIT", TESSERACT_THREAD_LIMIT)
+
+# Preprocessing presets for the OCR page. An empty preset keeps the original
+# behaviour: the full-size image converted to RGB.
+PRESETS = {
+    "Original (full-size RGB)": {},
+    "Fast": {"grayscale": True, "max_dimension": 2000},
+    "Balanced": {"grayscale": True, "target_dpi": 300, "max_dimension": 3500, "binarize": True},
+    "Accurate": {"grayscale": True, "target_dpi": 300, "max_dimension": 5000, "deskew": True, "binarize": True},
+}
+
+
+def _tesseract():
+    # Imported on first use, like NumPy and Pillow in the functions below.
+    import pytesseract
+    if os.path.exists(TESSERACT_CMD):
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract
+
+
+def resample(image, target_dpi=None, max_dimension=None):
+    # Scale to target_dpi when the image records its DPI, then make sure the
+    # longest side does not exceed max_dimension. Returns the image and the DPI
+    # it now has (None when unknown).
+    source_dpi = image.info.get("dpi", (None,))[0]
+    scale = 1.0
+    dpi = source_dpi
+    if target_dpi and source_dpi:
+        scale = target_dpi / float(source_dpi)
+        dpi = target_dpi
+    if max_dimension:
+        longest = max(image.size) * scale
+        if longest > max_dimension:
+            scale *= max_dimension / longest
+            dpi = dpi * max_dimension / longest if dpi else None
+    if abs(scale - 1.0) > 0.01:
+        from PIL import Image
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        # reducing_gap lets Pillow shrink by an integer factor first, which is
+        # much cheaper than a full Lanczos pass over a 12 MP photo.
+        image = image.resize(size, Image.LANCZOS, reducing_gap=3.0 if scale < 1 else None)
+    return image, dpi
+
+
+def otsu_threshold(pixels):
+    import numpy as np
+    histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    weights = np.cumsum(histogram)
+    means = np.cumsum(histogram * np.arange(256))
+    background = weights / total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (means[-1] * background - means) ** 2 / (weights * (total - weights))
+    return int(np.nanargmax(between))
+
+
+def binarize(image):
+    import numpy as np
+    from PIL import Image
+    pixels = np.asarray(image.convert("L"))
+    threshold = otsu_threshold(pixels)
+    return Image.fromarray(np.where(pixels > threshold, 255, 0).astype(np.uint8))
+
+
+def estimate_skew(image, max_angle=5.0, step=0.5):
+    # Projection-profile skew estimate on a small copy: text lines give the
+    # sharpest row profile (highest variance of row sums) when level.
+    import numpy as np
+    from PIL import Image
+    small = image.convert("L")
+    small.thumbnail((800, 800))
+    ink = (np.asarray(small) < otsu_threshold(np.asarray(small))).astype(np.float32)
+    best_angle = 0.0
+    best_score = -1.0
+    for angle in np.arange(-max_angle, max_angle + step, step):
+        rotated = Image.fromarray((ink * 255).astype(np.uint8)).rotate(angle, resample=Image.NEAREST)
+        score = np.var(np.asarray(rotated, dtype=np.float32).sum(axis=1))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def deskew(image):
+    from PIL import Image
+    angle = estimate_skew(image)
+    if angle == 0.0:
+        return image
+    fill = 255 if image.mode == "L" else (255, 255, 255)
+    return image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+
+def preprocess(image, grayscale=False, target_dpi=None, max_dimension=None, deskew_image=False,
+               binarize_image=False):
+    # Returns the processed image, its DPI (or None) and the seconds spent in
+    # each stage.
+    timings = {}
+
+    start = time.perf_counter()
+    image = image.convert("L" if grayscale else "RGB")
+    timings["convert"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    image, dpi = resample(image, target_dpi, max_dimension)
+    timings["resample"] = time.perf_counter() - start
+
+    if deskew_image:
+        start = time.perf_counter()
+        image = deskew(image)
+        timings["deskew"] = time.perf_counter() - start
+
+    if binarize_image:
+        start = time.perf_counter()
+        image = binarize(image)
+        timings["binarize"] = time.perf_counter() - start
+
+    return image, dpi, timings
+
+
+def ocr_image(image, lang="eng", preset=None):
+    # `image` is encoded image bytes or an already decoded PIL image (e.g. a
+    # TIFF frame). Returns the extracted text and the seconds spent in each
+    # stage.
+    from PIL import Image
+    options = preset or {}
+    start = time.perf_counter()
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+        image.load()
+    decode_seconds = time.perf_counter() - start
+
+    image, dpi, timings = preprocess(
+        image,
+        grayscale=options.get("grayscale", False),
+        target_dpi=options.get("target_dpi"),
+        max_dimension=options.get("max_dimension"),
+        deskew_image=options.get("deskew", False),
+        binarize_image=options.get("binarize", False),
+    )
+    timings = {"decode": decode_seconds, **timings}
+
+    start = time.perf_counter()
+    config = f"--dpi {int(dpi)}" if dpi else ""
+    text = _tesseract().image_to_string(image, lang=lang, config=config)
+    timings["ocr"] = time.perf_counter() - start
+    return text, timings
+
+
+# Multi-page uploads accepted by the OCR page besides single images.
+DOCUMENT_TYPES = ["pdf", "tif", "tiff"]
+
+
+def _extension(file_name):
+    return os.path.splitext(file_name)[1].lower().lstrip(".")
+
+
+def document_page_count(data, file_name):
+    extension = _extension(file_name)
+    if extension == "pdf":
+        from core import pdf_text
+        return pdf_text.page_count(data)
+    if extension in ("tif", "tiff"):
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as image:
+            return getattr(image, "n_frames", 1)
+    return 1
+
+
+def iter_document_pages(data, file_name, dpi=300, gray=False):
+    # Yield the pages of an upload one at a time: PDF pages rendered with
+    # PyMuPDF at `dpi`, TIFF frames decoded by Pillow, or the image itself.
+    # Nothing is rendered before the consumer asks for it.
+    extension = _extension(file_name)
+    if extension == "pdf":
+        from core import pdf_text
+        yield from pdf_text.render_pages(data, range(document_page_count(data, file_name)), dpi, gray)
+    elif extension in ("tif", "tiff"):
+        from PIL import Image, ImageSequence
+        with Image.open(io.BytesIO(data)) as image:
+            for frame in ImageSequence.Iterator(image):
+                # The iterator reuses one image object; copy the frame out.
+                yield frame.copy()
+    else:
+        yield data
+
+
+def join_pages(page_texts):
+    if len(page_texts) == 1:
+        return page_texts[0]
+    return "\n".join(f"--- Page {number} ---\n{text}" for number, text in enumerate(page_texts, start=1))
+
+
+def ocr_images(images, workers, lang="eng", preset=None):
+    # OCR the images (bytes or PIL images) in `images` on the shared OCR pool.
+    # `images` may be a generator; it is only advanced when a worker slot is
+    # free, so at most `workers` pages are held in memory. Each tesseract
+    # call is a subprocess, so threads are enough to keep the cores busy.
+    # Yields (index, (text, timings), error) in completion order.
+    pool = parallel.shared_pool("ocr")
+    return parallel.bounded_map(lambda data: ocr_image(data, lang, preset), images, workers, pool)
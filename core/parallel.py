@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Upper bound on worker threads for each shared pool. Every session submits
+# into the same pools, so together they can never use more than this.
+MAX_WORKERS = int(os.environ.get("EXTRACT_MAX_WORKERS", str(os.cpu_count() or 1)))
+
+# Outputs built on the server (merged PDFs, ZIPs, table exports) are kept in
+# memory up to this size and spooled to an anonymous temp file beyond it.
+SPOOL_MB = int(os.environ.get("EXTRACT_SPOOL_MB", "32"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def shared_pool(name, max_workers=MAX_WORKERS):
+    # One process-wide thread pool per tool, created on first use.
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+            _pools[name] = pool
+        return pool
+
+
+def bounded_map(fn, items, workers, pool):
+    # Run fn over items on `pool` with at most `workers` calls in flight, and
+    # yield (index, result, error) as each call completes. error is the
+    # exception raised by fn, or None.
+    workers = max(1, workers)
+    items = iter(enumerate(items))
+    pending = {}
+
+    def submit_next():
+        for index, item in items:
+            pending[pool.submit(fn, item)] = index
+            return True
+        return False
+
+    for _ in range(workers):
+        if not submit_next():
+            break
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            error = future.exception()
+            yield index, (None if error else future.result()), error
+            submit_next()
+
+
+def process_pool(workers, initializer=None, initargs=()):
+    # Worker processes are spawned rather than forked: the Streamlit server
+    # runs several threads, and forking a threaded process can deadlock.
+    return ProcessPoolExecutor(
+        max_workers=max(1, min(workers, MAX_WORKERS)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=initializer,
+        initargs=initargs,
+    )
+
+
+# Worker-process side of process_pool(workers, init_worker_data, (data,)):
+# the data (e.g. the PDF bytes) is sent once per worker through the pool
+# initializer, and each task only carries its own arguments.
+_worker_data = None
+
+
+def init_worker_data(data):
+    global _worker_data
+    _worker_data = data
+
+
+def worker_data():
+    return _worker_data
+
+
+def spooled_file(max_mb=SPOOL_MB):
+    return tempfile.SpooledTemporaryFile(max_size=int(max_mb * 1024 * 1024), mode="w+b")
+
+
+def read_spooled(file):
+    # The whole file from the start. Used as the deferred `data` of download
+    # buttons, so an output is only read into memory when it is downloaded.
+    file.seek(0)
+    return file.read()
+
+
+def peak_rss_mb():
+    # Peak resident memory of this process, where the platform reports it
+    # (ru_maxrss is in KB on Linux and in bytes on macOS).
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    # Current resident memory of this process (Linux only).
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
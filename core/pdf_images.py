@@ -0,0 +1,266 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import as_completed
+
+from core import parallel
+
+# Documents are split into page ranges of this size; each range is one task
+# for the worker processes.
+PAGES_PER_TASK = int(os.environ.get("EXTRACT_IMAGE_PAGES_PER_TASK", "50"))
+
+
+def new_report():
+    # Counters for one or more extractions. `bytes_saved` is the size of the
+    # skipped duplicates and `extract_seconds_saved` the extract_image time
+    # their first extraction took, i.e. what extracting them again would have
+    # cost.
+    return {
+        "images": 0,           # image placements found on the pages
+        "written": 0,          # distinct images written out
+        "repeated_xrefs": 0,   # placements of an image already written
+        "duplicate_bytes": 0,  # different xrefs with identical image data
+        "tiny": 0,             # skipped by the minimum size filter
+        "bytes_written": 0,
+        "bytes_saved": 0,
+        "extracted": 0,        # extract_image calls made
+        "extract_seconds": 0.0,
+        "extract_seconds_saved": 0.0,
+        "seconds": 0.0,
+    }
+
+
+def merge_reports(total, report):
+    for name, value in report.items():
+        total[name] = total.get(name, 0) + value
+    return total
+
+
+def _iter_range_images(doc, start, stop, pdf_name, dedupe, min_side, report):
+    # Yields (file name, image bytes, xref, digest) for the images on pages
+    # [start, stop) of the open document, named <pdf>_page<n>_img<i>.<ext>
+    # after their first placement. The bytes are the stream stored in the
+    # PDF, without decoding. With `dedupe` an xref placed on several pages,
+    # or two xrefs holding the same data, are yielded once. Images whose
+    # width or height (in pixels) is below `min_side` are skipped before they
+    # are extracted.
+    seen_xrefs = {}   # xref -> (size, extract seconds) of the extracted image
+    seen_digests = set()
+    for page_index in range(start, stop):
+        for img_index, img in enumerate(doc.get_page_images(page_index, full=True), start=1):
+            xref, width, height = img[0], img[2], img[3]
+            report["images"] += 1
+            if min_side and min(width, height) < min_side:
+                report["tiny"] += 1
+                continue
+            if dedupe and xref in seen_xrefs:
+                size, seconds = seen_xrefs[xref]
+                report["repeated_xrefs"] += 1
+                report["bytes_saved"] += size
+                report["extract_seconds_saved"] += seconds
+                continue
+
+            extract_start = time.perf_counter()
+            base_image = doc.extract_image(xref)
+            extract_seconds = time.perf_counter() - extract_start
+            report["extract_seconds"] += extract_seconds
+            report["extracted"] += 1
+            if not base_image:
+                continue  # not a raster image PyMuPDF can export
+            image_bytes = base_image["image"]
+            digest = None
+            if dedupe:
+                seen_xrefs[xref] = (len(image_bytes), extract_seconds)
+                digest = hashlib.sha1(image_bytes).hexdigest()
+                if digest in seen_digests:
+                    report["duplicate_bytes"] += 1
+                    report["bytes_saved"] += len(image_bytes)
+                    continue
+                seen_digests.add(digest)
+
+            report["written"] += 1
+            report["bytes_written"] += len(image_bytes)
+            file_name = f"{pdf_name}_page{page_index + 1}_img{img_index}.{base_image['ext']}"
+            yield file_name, image_bytes, xref, digest
+
+
+def iter_pdf_images(data, pdf_name, dedupe=True, min_side=0, report=None):
+    # Yields (file name, image bytes) for every image in the PDF in `data`.
+    import fitz
+    report = new_report() if report is None else report
+    start = time.perf_counter()
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for file_name, image_bytes, _, _ in _iter_range_images(doc, 0, len(doc), pdf_name,
+                                                               dedupe, min_side, report):
+            yield file_name, image_bytes
+    report["seconds"] += time.perf_counter() - start
+
+
+def _extract_range(path, pdf_name, folder, start, stop, dedupe, min_side, output_path):
+    # Worker task: extract pages [start, stop) of the PDF at `path` into a ZIP
+    # at `output_path`. The PDF is read from the file rather than pickled
+    # with every task, and the images go back to the parent through the ZIP.
+    # Returns the entries written as (arcname, xref, digest, size) and the
+    # range's report.
+    import fitz
+    report = new_report()
+    entries = []
+    with fitz.open(path) as doc, zipfile.ZipFile(output_path, "w") as archive:
+        for file_name, image_bytes, xref, digest in _iter_range_images(doc, start, stop, pdf_name,
+                                                                       dedupe, min_side, report):
+            arcname = f"{folder}/{file_name}" if folder else file_name
+            archive.writestr(arcname, image_bytes, compress_type=compression_for(file_name))
+            entries.append((arcname, xref, digest, len(image_bytes)))
+    return entries, report
+
+
+def _merge_ranges(parts, output, dedupe, report):
+    # Copy the range ZIPs of one document into `output` in page order. Each
+    # range only de-duplicates within itself, so images repeated across
+    # ranges are dropped here and the report is corrected (they were
+    # extracted in every range, so no extraction time is saved). Returns the
+    # number of images written.
+    seen_xrefs = set()
+    seen_digests = set()
+    count = 0
+    with zipfile.ZipFile(output, "w") as archive:
+        for part_path, entries in parts:
+            with zipfile.ZipFile(part_path) as part:
+                for arcname, xref, digest, size in entries:
+                    if dedupe and (xref in seen_xrefs or digest in seen_digests):
+                        report["repeated_xrefs" if xref in seen_xrefs else "duplicate_bytes"] += 1
+                        report["written"] -= 1
+                        report["bytes_written"] -= size
+                        report["bytes_saved"] += size
+                        continue
+                    seen_xrefs.add(xref)
+                    seen_digests.add(digest)
+                    _copy_entry(part, part.getinfo(arcname), archive)
+                    count += 1
+    output.seek(0)
+    return count
+
+
+def extract_documents(documents, dedupe=True, min_side=0, workers=1, on_progress=None,
+                      pages_per_task=PAGES_PER_TASK):
+    # Extract the images of several PDFs, spreading documents and page ranges
+    # of large documents over worker processes. `documents` is a list of
+    # (pdf name, folder in the ZIP, bytes). on_progress(doc_index, pages_done,
+    # total_pages) is called in the calling thread as ranges complete.
+    # Returns one entry per document: (archive file, image count, report), or
+    # the exception raised for it.
+    import fitz
+    results = [None] * len(documents)
+    directory = tempfile.mkdtemp(prefix="pdf-images-")
+    try:
+        tasks = []  # (doc index, start, stop, arguments of _extract_range)
+        totals = []
+        for doc_index, (pdf_name, folder, data) in enumerate(documents):
+            path = os.path.join(directory, f"{doc_index:05d}.pdf")
+            try:
+                with open(path, "wb") as f:
+                    f.write(data)
+                with fitz.open(path) as doc:
+                    total = len(doc)
+            except Exception as e:
+                results[doc_index] = e
+                totals.append(0)
+                continue
+            totals.append(total)
+            for start in range(0, total, pages_per_task):
+                stop = min(start + pages_per_task, total)
+                part_path = os.path.join(directory, f"{doc_index:05d}-{start:07d}.zip")
+                args = (path, pdf_name, folder, start, stop, dedupe, min_side, part_path)
+                tasks.append((doc_index, start, stop, args))
+
+        parts = {}       # doc index -> {start: (range ZIP path, entries)}
+        reports = {}
+        pages_done = {}
+        started = time.perf_counter()
+
+        def collect(task, outcome):
+            doc_index, start, stop, args = task
+            if isinstance(results[doc_index], Exception):
+                return
+            if isinstance(outcome, Exception):
+                results[doc_index] = outcome
+                return
+            entries, report = outcome
+            parts.setdefault(doc_index, {})[start] = (args[-1], entries)
+            merge_reports(reports.setdefault(doc_index, new_report()), report)
+            pages_done[doc_index] = pages_done.get(doc_index, 0) + stop - start
+            if on_progress is not None:
+                on_progress(doc_index, pages_done[doc_index], totals[doc_index])
+
+        if workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                try:
+                    collect(task, _extract_range(*task[3]))
+                except Exception as e:
+                    collect(task, e)
+        else:
+            with parallel.process_pool(workers) as pool:
+                futures = {pool.submit(_extract_range, *task[3]): task for task in tasks}
+                for future in as_completed(futures):
+                    error = future.exception()
+                    collect(futures[future], error if error else future.result())
+
+        seconds = time.perf_counter() - started
+        for doc_index in range(len(documents)):
+            if results[doc_index] is not None:
+                continue
+            report = reports.get(doc_index, new_report())
+            # Wall time is shared by the documents extracted together.
+            report["seconds"] = seconds / len(documents)
+            ranges = [parts[doc_index][start] for start in sorted(parts.get(doc_index, {}))]
+            archive_file = parallel.spooled_file()
+            count = _merge_ranges(ranges, archive_file, dedupe, report)
+            results[doc_index] = (archive_file, count, report)
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def summary(report):
+    skipped = report["repeated_xrefs"] + report["duplicate_bytes"]
+    text = (f"{report['written']} distinct image(s) from {report['images']} placement(s) "
+            f"in {report['seconds']:.2f} s; {skipped} duplicate(s) skipped, "
+            f"saving {report['bytes_saved'] / (1024 * 1024):.1f} MB and about "
+            f"{report['extract_seconds_saved']:.2f} s of extraction.")
+    if report["tiny"]:
+        text += f" {report['tiny']} image(s) below the size limit left out."
+    return text
+
+
+# Formats that are already compressed; deflating them again costs CPU time
+# for next to no gain, so they are stored in the ZIP as-is.
+STORED_EXTENSIONS = {"jpeg", "jpg", "jpx", "jp2", "png", "jb2", "jbig2"}
+
+
+def compression_for(file_name):
+    ext = os.path.splitext(file_name)[1].lstrip(".").lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def combine_zips(sources, output):
+    # Copy every entry of the ZIP files in `sources` into one ZIP in
+    # `output`, keeping each entry's compression method.
+    with zipfile.ZipFile(output, "w") as archive:
+        for source in sources:
+            source.seek(0)
+            with zipfile.ZipFile(source) as part:
+                for info in part.infolist():
+                    _copy_entry(part, info, archive)
+    output.seek(0)
+    return output
+
+
+def _copy_entry(source, info, archive):
+    entry = zipfile.ZipInfo(info.filename, info.date_time)
+    entry.compress_type = info.compress_type
+    force_zip64 = info.file_size > zipfile.ZIP64_LIMIT
+    with source.open(info) as src, archive.open(entry, "w", force_zip64=force_zip64) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
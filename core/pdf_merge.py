@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import time
+
+# Merge engines for the merge page. PyMuPDF copies pages in C and can drop
+# duplicate objects (fonts and images shared between inputs) when saving.
+ENGINES = {
+    "fitz": "PyMuPDF (fast, de-duplicates fonts and images)",
+    "pypdf2": "PyPDF2",
+}
+
+
+def _open(pdf_file):
+    import fitz
+    if isinstance(pdf_file, str):
+        return fitz.open(pdf_file)
+    return fitz.open(stream=pdf_file.getvalue(), filetype="pdf")
+
+
+def _input_size(pdf_file):
+    if isinstance(pdf_file, str):
+        return os.path.getsize(pdf_file)
+    return pdf_file.getbuffer().nbytes
+
+
+def _merge_fitz(pdf_files, output, dedupe):
+    import fitz
+    pages = 0
+    with fitz.open() as merged:
+        for pdf_file in pdf_files:
+            # One input open at a time; its pages are copied and it is closed
+            # before the next one is read.
+            with _open(pdf_file) as doc:
+                merged.insert_pdf(doc)
+                pages += len(doc)
+        # garbage=4 also merges identical objects and streams, which is what
+        # removes fonts and images repeated across the inputs; object streams
+        # and deflate compress what is left. PyMuPDF takes any object with a
+        # `name` as a path and cannot save into the spooled file, so the PDF
+        # is saved to a temp file and copied into `output` in blocks.
+        directory = tempfile.mkdtemp(prefix="pdf-merge-")
+        try:
+            path = os.path.join(directory, "merged.pdf")
+            merged.save(path, garbage=4 if dedupe else 1, deflate=True, use_objstms=1)
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, output, 1024 * 1024)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return pages
+
+
+def _merge_pypdf2(pdf_files, output):
+    from PyPDF2 import PdfMerger
+    merger = PdfMerger()
+    pages = 0
+    try:
+        for pdf_file in pdf_files:
+            if not isinstance(pdf_file, str):
+                pdf_file.seek(0)
+            merger.append(pdf_file)
+        pages = len(merger.pages)
+        merger.write(output)
+    finally:
+        merger.close()
+    return pages
+
+
+def merge_pdfs(pdf_files, output, engine="fitz", dedupe=True):
+    # Merge the PDFs in `pdf_files` (file paths, or uploaded files and other
+    # BytesIO objects) into `output`, in order. Returns a report with the input and output sizes in bytes,
+    # the page count and the seconds it took.
+    start = time.perf_counter()
+    if engine == "fitz":
+        pages = _merge_fitz(pdf_files, output, dedupe)
+    elif engine == "pypdf2":
+        pages = _merge_pypdf2(pdf_files, output)
+    else:
+        raise ValueError(f"Unknown merge engine: {engine}")
+    output.seek(0, os.SEEK_END)
+    report = {
+        "files": len(pdf_files),
+        "pages": pages,
+        "input_bytes": sum(_input_size(pdf_file) for pdf_file in pdf_files),
+        "output_bytes": output.tell(),
+        "seconds": time.perf_counter() - start,
+    }
+    output.seek(0)
+    return report
+
+
+def summary(report):
+    mb = 1024 * 1024
+    seconds = max(report["seconds"], 1e-6)
+    return (f"{report['files']} file(s), {report['pages']} page(s): "
+            f"{report['input_bytes'] / mb:.1f} MB in, {report['output_bytes'] / mb:.1f} MB out, "
+            f"merged in {report['seconds']:.2f} s "
+            f"({report['input_bytes'] / mb / seconds:.1f} MB/s, {report['pages'] / seconds:.0f} pages/s).")
@@ -0,0 +1,218 @@
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import as_completed
+
+from core import parallel
+
+# Split strategies for the split page.
+MODES = {
+    "ranges": "Page ranges (typed by hand)",
+    "every_n": "Every N pages",
+    "max_size": "Maximum part size (MB)",
+    "bookmarks": "Top-level bookmarks",
+}
+
+# Parts are written in batches of this many per worker task, so splitting
+# into thousands of small parts does not mean thousands of tasks.
+PARTS_PER_TASK = 25
+
+
+def parse_page_range(text, total_pages):
+    # "1-3, 5" -> [0, 1, 2, 4]. Raises ValueError for malformed input or
+    # pages outside the document.
+    pages = []
+    for part in (r.strip() for r in text.split(",")):
+        if "-" in part:
+            start, end = part.split("-")
+            pages.extend(range(int(start), int(end) + 1))
+        else:
+            pages.append(int(part))
+    for page in pages:
+        if not 1 <= page <= total_pages:
+            raise ValueError(f"Page number {page} is out of range.")
+    return [page - 1 for page in pages]
+
+
+def plan_every_n(total_pages, pages_per_part):
+    return [list(range(start, min(start + pages_per_part, total_pages)))
+            for start in range(0, total_pages, pages_per_part)]
+
+
+def _page_sizes(doc):
+    # Rough size of every page: its content streams plus the images it
+    # uses. Returns one (content bytes, {image xref: bytes}) pair per page.
+    image_sizes = {}
+    sizes = []
+    for page in doc:
+        content = sum(len(doc.xref_stream_raw(xref) or b"") for xref in page.get_contents())
+        images = {}
+        for img in page.get_images(full=True):
+            xref = img[0]
+            if xref not in image_sizes:
+                image_sizes[xref] = len(doc.xref_stream_raw(xref) or b"")
+            images[xref] = image_sizes[xref]
+        sizes.append((content, images))
+    return sizes
+
+
+def plan_max_size(data, max_mb):
+    # Greedily add pages to a part until its estimated size would go over
+    # max_mb. An image used on several pages of a part is counted once. The
+    # estimate leaves out fonts and other shared resources, so parts can come
+    # out somewhat larger; a single page larger than the limit gets its own
+    # part.
+    import fitz
+    limit = max_mb * 1024 * 1024
+    parts = []
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        current, current_size, current_images = [], 0, set()
+        for page_index, (content, images) in enumerate(_page_sizes(doc)):
+            added = content + sum(size for xref, size in images.items() if xref not in current_images)
+            if current and current_size + added > limit:
+                parts.append(current)
+                current, current_size, current_images = [], 0, set()
+                added = content + sum(images.values())
+            current.append(page_index)
+            current_size += added
+            current_images.update(images)
+        if current:
+            parts.append(current)
+    return parts
+
+
+def plan_bookmarks(data):
+    # One part per top-level outline entry, running up to the next one.
+    # Pages before the first entry become a part of their own. Returns
+    # (title, pages) pairs.
+    import fitz
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        total_pages = len(doc)
+        starts = []
+        for level, title, page in doc.get_toc(simple=True):
+            if level == 1 and page >= 1 and (not starts or page - 1 > starts[-1][1]):
+                starts.append((title, page - 1))
+    if not starts:
+        raise ValueError("The PDF has no top-level bookmarks.")
+    parts = []
+    if starts[0][1] > 0:
+        parts.append(("Front matter", list(range(0, starts[0][1]))))
+    for idx, (title, start) in enumerate(starts):
+        stop = starts[idx + 1][1] if idx + 1 < len(starts) else total_pages
+        parts.append((title, list(range(start, stop))))
+    return parts
+
+
+def part_file_name(number, title=""):
+    title = re.sub(r"[^\w\- ]+", "", title).strip().replace(" ", "_")[:60]
+    return f"Part_{number:04d}_{title}.pdf" if title else f"Part_{number:04d}.pdf"
+
+
+def _runs(pages):
+    # [0, 1, 2, 5, 6] -> [(0, 2), (5, 6)]: consecutive pages are copied with
+    # one insert_pdf call.
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return runs
+
+
+def _write_parts(path, parts, directory):
+    # Worker task: write each (file name, pages) part of the PDF at `path`
+    # into `directory`. Returns the (file name, path) of every part and the
+    # worker's peak memory.
+    import fitz
+    written = []
+    with fitz.open(path) as src:
+        for file_name, pages in parts:
+            part_path = os.path.join(directory, file_name)
+            with fitz.open() as part:
+                for first, last in _runs(pages):
+                    part.insert_pdf(src, from_page=first, to_page=last)
+                part.save(part_path, garbage=3, deflate=True)
+            written.append((file_name, part_path))
+    return written, parallel.peak_rss_mb()
+
+
+def split_to_zip(data, parts, output, workers=1, on_progress=None):
+    # Write the (file name, pages) parts of the PDF in `data` as PDFs into a
+    # ZIP in `output`. Batches of parts are written by worker processes,
+    # which read the PDF from a temp file; each finished part is streamed
+    # into the ZIP and removed. on_progress(parts_done, total_parts) is
+    # called in the calling thread. Returns a report with the part count,
+    # page count, input and output sizes, seconds and peak memory in MB.
+    start = time.perf_counter()
+    directory = tempfile.mkdtemp(prefix="pdf-split-")
+    peaks = {"main": parallel.current_rss_mb(), "worker": None}
+
+    def track(worker_peak=None):
+        current = parallel.current_rss_mb()
+        if current is not None:
+            peaks["main"] = max(peaks["main"] or 0, current)
+        if worker_peak is not None:
+            peaks["worker"] = max(peaks["worker"] or 0, worker_peak)
+
+    try:
+        path = os.path.join(directory, "input.pdf")
+        with open(path, "wb") as f:
+            f.write(data)
+        batches = [parts[i:i + PARTS_PER_TASK] for i in range(0, len(parts), PARTS_PER_TASK)]
+        done = 0
+        # PDF streams are compressed already, so parts are stored as-is.
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+
+            def add(written):
+                nonlocal done
+                for file_name, part_path in written:
+                    archive.write(part_path, file_name)
+                    os.remove(part_path)
+                done += len(written)
+                if on_progress is not None:
+                    on_progress(done, len(parts))
+
+            if workers <= 1 or len(batches) <= 1:
+                for batch in batches:
+                    written, _ = _write_parts(path, batch, directory)
+                    add(written)
+                    track()
+            else:
+                with parallel.process_pool(workers) as pool:
+                    futures = [pool.submit(_write_parts, path, batch, directory) for batch in batches]
+                    for future in as_completed(futures):
+                        written, worker_peak = future.result()
+                        add(written)
+                        track(worker_peak)
+        output.seek(0, os.SEEK_END)
+        report = {
+            "parts": len(parts),
+            "pages": sum(len(pages) for _, pages in parts),
+            "input_bytes": len(data),
+            "output_bytes": output.tell(),
+            "seconds": time.perf_counter() - start,
+            "main_peak_mb": peaks["main"],
+            "worker_peak_mb": peaks["worker"],
+        }
+        output.seek(0)
+        return report
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def summary(report):
+    mb = 1024 * 1024
+    seconds = max(report["seconds"], 1e-6)
+    text = (f"{report['parts']} part(s), {report['pages']} page(s) written in {report['seconds']:.2f} s "
+            f"({report['pages'] / seconds:.0f} pages/s, {report['input_bytes'] / mb / seconds:.1f} MB/s); "
+            f"ZIP size {report['output_bytes'] / mb:.1f} MB.")
+    if report["main_peak_mb"] is not None:
+        text += f" Peak memory: {report['main_peak_mb']:.0f} MB in the server process"
+        if report["worker_peak_mb"] is not None:
+            text += f", {report['worker_peak_mb']:.0f} MB per worker"
+        text += "."
+    return text
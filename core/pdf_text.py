@@ -0,0 +1,153 @@
+import io
+import time
+
+from core import parallel
+
+# Text extraction engines for the text page. PyMuPDF is implemented in C and
+# is many times faster than pdfplumber, which is kept for comparison.
+ENGINES = {
+    "fitz": "PyMuPDF (fast)",
+    "pdfplumber": "pdfplumber",
+}
+
+# Documents with fewer pages than this are extracted in the calling process;
+# starting worker processes costs more than it saves on small files.
+PARALLEL_MIN_PAGES = 40
+
+
+def page_count(data):
+    import fitz
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return len(doc)
+
+
+def _fitz_page_texts(data, start, stop):
+    import fitz
+    texts = []
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page_index in range(start, stop):
+            # sort=True orders the blocks top-to-bottom, left-to-right, which
+            # matches the line order of pdfplumber's extract_text().
+            text = doc.load_page(page_index).get_text("text", sort=True)
+            texts.append(text.rstrip("\n"))
+    return texts
+
+
+def _pdfplumber_page_texts(data, start, stop):
+    import pdfplumber
+    texts = []
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for page in pdf.pages[start:stop]:
+            texts.append(page.extract_text() or "")
+    return texts
+
+
+_PAGE_EXTRACTORS = {
+    "fitz": _fitz_page_texts,
+    "pdfplumber": _pdfplumber_page_texts,
+}
+
+def _extract_range(engine, start, stop):
+    # Runs in a worker process, which was handed the PDF bytes once
+    return _PAGE_EXTRACTORS[engine](parallel.worker_data(), start, stop)
+
+
+# A page is sent to OCR when its text layer has fewer than MIN_TEXT_CHARS
+# characters and images cover at least MIN_IMAGE_COVERAGE of it, or when it
+# has no text at all but does contain an image.
+MIN_TEXT_CHARS = 25
+MIN_IMAGE_COVERAGE = 0.3
+
+
+def classify_pages(data):
+    # Returns one dict per page with its text-layer character count, the
+    # share of the page covered by images and whether it needs OCR.
+    import fitz
+    pages = []
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page in doc:
+            chars = len(page.get_text("text").strip())
+            page_area = abs(page.rect) or 1.0
+            covered = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+            coverage = min(1.0, covered / page_area)
+            needs_ocr = (chars < MIN_TEXT_CHARS and coverage >= MIN_IMAGE_COVERAGE) or (
+                chars == 0 and coverage > 0
+            )
+            pages.append({"chars": chars, "image_coverage": coverage, "needs_ocr": needs_ocr})
+    return pages
+
+
+def render_pages(data, page_indices, dpi, gray=True):
+    # Render pages one at a time as PNG bytes. This is a generator so only
+    # the pages currently being OCR'd are held in memory.
+    import fitz
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page_index in page_indices:
+            colorspace = fitz.csGRAY if gray else fitz.csRGB
+            pixmap = doc.load_page(page_index).get_pixmap(dpi=dpi, colorspace=colorspace)
+            pixmap.set_dpi(dpi, dpi)
+            yield pixmap.tobytes("png")
+
+
+def ocr_scanned_pages(data, page_indices, dpi=300, workers=1, lang="eng"):
+    # OCR the given pages through the shared Tesseract path. Returns
+    # {page_index: text}.
+    from core import ocr
+    texts = {}
+    images = render_pages(data, page_indices, dpi)
+    for idx, result, error in ocr.ocr_images(images, workers, lang=lang, preset={"grayscale": True}):
+        if error:
+            raise error
+        texts[page_indices[idx]] = result[0].strip()
+    return texts
+
+
+def iter_page_texts(data, engine="fitz", workers=1, pages_per_task=20):
+    # Yields the text of every page of the PDF in `data`, in page order.
+    if engine not in _PAGE_EXTRACTORS:
+        raise ValueError(f"Unknown text extraction engine: {engine}")
+    total = page_count(data)
+    if workers <= 1 or total < PARALLEL_MIN_PAGES:
+        for start in range(0, total, pages_per_task):
+            yield from _PAGE_EXTRACTORS[engine](data, start, min(start + pages_per_task, total))
+        return
+
+    ranges = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+    with parallel.process_pool(workers, parallel.init_worker_data, (data,)) as pool:
+        for chunk in pool.map(_extract_range, [engine] * len(ranges), *zip(*ranges)):
+            yield from chunk
+
+
+def extract_page_texts(data, engine="fitz", workers=1):
+    return list(iter_page_texts(data, engine, workers))
+
+
+def extract_text(data, engine="fitz", workers=1):
+    # Same layout as the original page: non-empty pages, each followed by a
+    # newline. Returns the text, the page count and the seconds it took.
+    start = time.perf_counter()
+    page_texts = extract_page_texts(data, engine, workers)
+    text = "".join(page_text + "\n" for page_text in page_texts if page_text)
+    return text, len(page_texts), time.perf_counter() - start
+
+
+def extract_text_to_spool(data, spool, engine="fitz", workers=1, ocr_dpi=None, lang="eng"):
+    # Streaming variant of extract_text: page text goes straight into `spool`
+    # (a TextSpool) instead of being built up as one string. With ocr_dpi set,
+    # pages without a usable text layer are rendered at that DPI and OCR'd
+    # instead. Returns the page count, the number of OCR'd pages and the
+    # seconds it took.
+    start = time.perf_counter()
+    ocr_texts = {}
+    if ocr_dpi:
+        scanned = [idx for idx, page in enumerate(classify_pages(data)) if page["needs_ocr"]]
+        if scanned:
+            ocr_texts = ocr_scanned_pages(data, scanned, ocr_dpi, workers, lang)
+
+    pages = 0
+    for page_index, page_text in enumerate(iter_page_texts(data, engine, workers)):
+        pages += 1
+        page_text = ocr_texts.get(page_index, page_text)
+        if page_text:
+            spool.write(page_text + "\n")
+    return pages, len(ocr_texts), time.perf_counter() - start
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+# Where extraction results are kept between server restarts, and how large
+# the cache may grow before the least recently used entries are removed.
+CACHE_DIR = os.environ.get(
+    "EXTRACT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "extract_center")
+)
+CACHE_MAX_MB = int(os.environ.get("EXTRACT_CACHE_MAX_MB", "2048"))
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ResultCache:
+    """Content-addressed on-disk cache of extraction results.
+
+    An entry is a directory <root>/<tool>/<hash>/ where the hash covers the
+    SHA-256 of the input file, the engine and the parameters. Entries hold
+    text, JSON (e.g. Whisper transcripts) or DataFrames stored as Parquet.
+    The directory mtime is refreshed on every hit and the oldest entries are
+    evicted once the cache is larger than max_mb.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_mb=CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._size = None  # measured lazily on the first write
+        self.hits = {}
+        self.misses = {}
+
+    def key(self, file_digest, tool, engine="", params=()):
+        payload = json.dumps([file_digest, tool, engine, params], sort_keys=True, default=repr)
+        return f"{tool}/{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def _lookup(self, key, filename):
+        tool = key.split("/")[0]
+        path = os.path.join(self._path(key), filename)
+        with self._lock:
+            if os.path.exists(path):
+                self.hits[tool] = self.hits.get(tool, 0) + 1
+                try:
+                    os.utime(self._path(key))
+                except OSError:
+                    pass
+                return path
+            self.misses[tool] = self.misses.get(tool, 0) + 1
+            return None
+
+    def _store(self, key, write):
+        # Build the entry in a scratch directory and rename it into place, so
+        # readers never see a half-written entry.
+        final_path = self._path(key)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        scratch = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(scratch)
+        try:
+            write(scratch)
+            size = _dir_size(scratch)
+            with self._lock:
+                replaced = 0
+                if os.path.exists(final_path):
+                    replaced = _dir_size(final_path)
+                    shutil.rmtree(final_path, ignore_errors=True)
+                os.replace(scratch, final_path)
+                if self._size is None:
+                    self._size = _dir_size(self.root)
+                else:
+                    self._size += size - replaced
+                if self._size > self.max_bytes:
+                    self._evict()
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def _evict(self):
+        entries = []
+        for tool in os.listdir(self.root):
+            tool_dir = os.path.join(self.root, tool)
+            if tool.startswith(".") or not os.path.isdir(tool_dir):
+                continue
+            for name in os.listdir(tool_dir):
+                path = os.path.join(tool_dir, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+        # Evict down to 90% so the next few writes do not evict again.
+        target = self.max_bytes * 0.9
+        for _, path in sorted(entries):
+            if self._size <= target:
+                break
+            size = _dir_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+            self._size -= size
+
+    def get_text(self, key):
+        path = self._lookup(key, "result.txt")
+        if path is None:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def put_text(self, key, text):
+        def write(directory):
+            with open(os.path.join(directory, "result.txt"), "w", encoding="utf-8") as f:
+                f.write(text)
+        self._store(key, write)
+
+    def get_text_file(self, key):
+        # Path of the cached text, for callers that stream it instead of
+        # loading it into memory.
+        return self._lookup(key, "result.txt")
+
+    def put_text_file(self, key, source):
+        def write(directory):
+            with open(os.path.join(directory, "result.txt"), "wb") as f:
+                shutil.copyfileobj(source, f, 1024 * 1024)
+        self._store(key, write)
+
+    def get_json(self, key):
+        path = self._lookup(key, "result.json")
+        if path is None:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put_json(self, key, value):
+        def write(directory):
+            with open(os.path.join(directory, "result.json"), "w", encoding="utf-8") as f:
+                json.dump(value, f)
+        self._store(key, write)
+
+    def get_frames(self, key):
+        import pandas as pd
+        path = self._lookup(key, "frames.json")
+        if path is None:
+            return None
+        directory = os.path.dirname(path)
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        frames = []
+        for item in manifest:
+            file_path = os.path.join(directory, item["file"])
+            if item["format"] == "parquet":
+                df = pd.read_parquet(file_path)
+                df.columns = item["columns"]
+            else:
+                df = pd.read_pickle(file_path)
+            df.attrs.update(item.get("attrs", {}))
+            frames.append(df)
+        return frames
+
+    def put_frames(self, key, frames):
+        def write(directory):
+            manifest = []
+            for idx, df in enumerate(frames):
+                columns = list(df.columns)
+                try:
+                    # Parquet needs string column names; the real names are
+                    # restored from the manifest.
+                    stored = df.copy()
+                    stored.columns = [str(c) for c in range(len(columns))]
+                    file_name = f"frame_{idx:04d}.parquet"
+                    stored.to_parquet(os.path.join(directory, file_name), index=False)
+                    manifest.append({"file": file_name, "format": "parquet", "columns": columns,
+                                     "attrs": dict(df.attrs)})
+                except Exception:
+                    # Mixed-type object columns cannot always be written as
+                    # Parquet; keep those tables as pickles.
+                    file_name = f"frame_{idx:04d}.pkl"
+                    df.to_pickle(os.path.join(directory, file_name))
+                    manifest.append({"file": file_name, "format": "pickle", "columns": None,
+                                     "attrs": dict(df.attrs)})
+            with open(os.path.join(directory, "frames.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, default=str)
+        self._store(key, write)
+
+    def stats(self):
+        with self._lock:
+            tools = sorted(set(self.hits) | set(self.misses))
+            return [
+                {"tool": tool, "hits": self.hits.get(tool, 0), "misses": self.misses.get(tool, 0)}
+                for tool in tools
+            ]
+
+    def summary(self, tool):
+        with self._lock:
+            hits = self.hits.get(tool, 0)
+            misses = self.misses.get(tool, 0)
+        return (f"Result cache ({tool}): {hits} hits, {misses} misses since server start; "
+                f"{self.size_mb():.0f} / {self.max_bytes / (1024 * 1024):.0f} MB on disk.")
+
+    def size_mb(self):
+        with self._lock:
+            if self._size is None:
+                self._size = _dir_size(self.root) if os.path.isdir(self.root) else 0
+            return self._size / (1024 * 1024)
+
+
+result_cache = ResultCache()
@@ -0,0 +1,215 @@
+import io
+import math
+import re
+import zipfile
+
+# Excel's hard per-sheet limit, header row included.
+EXCEL_MAX_ROWS = 1_048_576
+
+OUTPUT_FORMATS = {
+    "xlsx": "Excel workbook (.xlsx)",
+    "csv_zip": "Zipped CSV, one file per table (.zip)",
+    "parquet": "Single Parquet file with source columns (.parquet)",
+}
+
+MIME_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv_zip": "application/zip",
+    "parquet": "application/octet-stream",
+}
+
+
+def align_columns(df):
+    # tabula headers can be NaN, numbers or repeated; give every column a
+    # unique string name so tables can be concatenated and written as-is.
+    names = []
+    seen = {}
+    for idx, column in enumerate(df.columns):
+        name = "" if column is None or (isinstance(column, float) and math.isnan(column)) else str(column)
+        name = name or f"Column_{idx + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    df = df.copy()
+    df.columns = names
+    return df
+
+
+def combine_tables(dfs):
+    # All tables of a PDF in one DataFrame with a Table_Number column, built
+    # with a single concat over the union of the columns.
+    import pandas as pd
+    aligned = []
+    for idx, df in enumerate(dfs):
+        df = align_columns(df)
+        df["Table_Number"] = idx + 1  # Add a column to indicate table number
+        aligned.append(df)
+    return pd.concat(aligned, ignore_index=True, sort=False)
+
+
+def sheet_name(name, used):
+    # Excel sheet names: at most 31 characters, no []:*?/\ and unique
+    # (case-insensitively) within the workbook.
+    base = re.sub(r"[\[\]:*?/\\]", "_", name)[:31] or "Sheet"
+    candidate = base
+    number = 2
+    while candidate.lower() in used:
+        suffix = f" ({number})"
+        candidate = base[:31 - len(suffix)] + suffix
+        number += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _cell(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "item"):
+        # numpy scalars
+        value = value.item()
+        if isinstance(value, float) and math.isnan(value):
+            return None
+    return value
+
+
+def write_xlsx(sheets, output):
+    # `sheets` yields (name, DataFrame). Rows are streamed with xlsxwriter's
+    # constant_memory mode, so only one row per sheet is buffered. Tables
+    # longer than Excel's row limit continue on extra sheets.
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "strings_to_numbers": False})
+    used = set()
+    for name, df in sheets:
+        header = [str(column) for column in df.columns]
+        rows_per_sheet = EXCEL_MAX_ROWS - 1
+        starts = range(0, max(len(df), 1), rows_per_sheet)
+        for start in starts:
+            worksheet = workbook.add_worksheet(sheet_name(name, used))
+            worksheet.write_row(0, 0, header)
+            chunk = df.iloc[start:start + rows_per_sheet]
+            for row_idx, row in enumerate(chunk.itertuples(index=False, name=None), start=1):
+                for col_idx, value in enumerate(row):
+                    value = _cell(value)
+                    if value is not None:
+                        worksheet.write(row_idx, col_idx, value)
+    workbook.close()
+    output.seek(0)
+    return output
+
+
+def write_csv_zip(tables, output):
+    # `tables` yields (file name, DataFrame); each is streamed into its own
+    # CSV entry of the ZIP.
+    used = set()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, df in tables:
+            file_name = re.sub(r"[\\/:*?\"<>|]", "_", name)
+            candidate = f"{file_name}.csv"
+            number = 2
+            while candidate in used:
+                candidate = f"{file_name}_{number}.csv"
+                number += 1
+            used.add(candidate)
+            with archive.open(candidate, "w") as entry:
+                with io.TextIOWrapper(entry, encoding="utf-8", newline="") as text:
+                    df.to_csv(text, index=False)
+    output.seek(0)
+    return output
+
+
+def _arrow_array(series):
+    # The column typed the way pa.Table.from_pandas types it; object columns
+    # that mix numbers and text become strings.
+    import pyarrow as pa
+    try:
+        array = pa.Array.from_pandas(series)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return _string_array(series)
+    if pa.types.is_large_string(array.type):
+        array = array.cast(pa.string())
+    return array
+
+
+def _string_array(series):
+    import pyarrow as pa
+    return pa.array([None if _cell(v) is None else str(_cell(v)) for v in series.tolist()], pa.string())
+
+
+def _common_type(types):
+    # Columns that are empty in a table take the type of the other tables,
+    # integers and floats meet as floats, anything else that differs is
+    # stored as strings.
+    import pyarrow as pa
+    types = {t for t in types if not pa.types.is_null(t)}
+    if not types:
+        return pa.string()
+    if len(types) == 1:
+        return types.pop()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        return pa.float64()
+    return pa.string()
+
+
+def write_parquet(tables, output):
+    # `tables` is a list of (source file, page, table number, DataFrame). All
+    # tables go into one file with the union of their columns; each column
+    # keeps its type unless the tables disagree on it (see _common_type).
+    # Each table is written as its own row group, so the types are worked out
+    # in a first pass and the tables converted again while writing. A table
+    # column named like one of the source columns is renamed the way
+    # align_columns renames repeats.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    aligned = [(source, page, number, align_columns(df)) for source, page, number, df in tables]
+    meta_fields = [
+        pa.field("source_file", pa.string()),
+        pa.field("page", pa.int32()),
+        pa.field("table_number", pa.int32()),
+    ]
+    used = {field.name for field in meta_fields}
+    columns = []
+    names = {}
+    types = {}
+    for _, _, _, df in aligned:
+        for column in df.columns:
+            types.setdefault(column, []).append(_arrow_array(df[column]).type)
+            if column in names:
+                continue
+            name = column
+            number = 1
+            while name in used:
+                name = f"{column}_{number}"
+                number += 1
+            used.add(name)
+            names[column] = name
+            columns.append(column)
+    targets = {column: _common_type(types[column]) for column in columns}
+    schema = pa.schema(meta_fields + [pa.field(names[column], targets[column]) for column in columns])
+    with pq.ParquetWriter(output, schema) as writer:
+        for source, page, number, df in aligned:
+            rows = len(df)
+            arrays = [
+                pa.array([source] * rows, pa.string()),
+                pa.array([page] * rows, pa.int32()),
+                pa.array([number] * rows, pa.int32()),
+            ]
+            for column in columns:
+                target = targets[column]
+                if column not in df.columns:
+                    arrays.append(pa.nulls(rows, target))
+                    continue
+                array = _arrow_array(df[column])
+                if array.type == target:
+                    arrays.append(array)
+                elif pa.types.is_string(target) and not pa.types.is_null(array.type):
+                    arrays.append(_string_array(df[column]))
+                else:
+                    arrays.append(array.cast(target))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    output.seek(0)
+    return output
@@ -0,0 +1,428 @@
+import collections
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from core import parallel
+from core.metrics import metrics
+
+# Start the JVM in the background when the server starts ("1" enables).
+PREWARM_TABULA = os.environ.get("TABULA_PREWARM", "0") == "1"
+
+# Table extraction engines for the table pages. The pdfplumber engine needs
+# no Java and only runs table detection on pages that look like they hold a
+# table.
+ENGINES = {
+    "tabula": "tabula (Java)",
+    "pdfplumber": "pdfplumber (pure Python)",
+}
+
+# Documents with fewer candidate pages than this are handled in the calling
+# process.
+PARALLEL_MIN_PAGES = 8
+
+
+def _blank_pdf():
+    import fitz
+    with fitz.open() as doc:
+        doc.new_page()
+        return doc.tobytes()
+
+
+def _frame_from_rows(rows):
+    # Same conversion tabula-py applies to tabula-java's output: the first
+    # row becomes the header, empty cells become NaN and columns that parse as
+    # numbers are converted.
+    import numpy as np
+    import pandas as pd
+    rows = [[cell if cell not in (None, "") else np.nan for cell in row] for row in rows]
+    df = pd.DataFrame(rows[1:], columns=rows[0])
+    for column in range(df.shape[1]):
+        # isetitem replaces the column, so it takes the numeric dtype
+        # (assigning through iloc keeps object); by position, since headers
+        # can be repeated or NaN.
+        try:
+            df.isetitem(column, pd.to_numeric(df.iloc[:, column]))
+        except (ValueError, TypeError):
+            pass
+    return df
+
+
+def _frames_from_json(raw_tables):
+    frames = []
+    for table in raw_tables:
+        rows = [[cell["text"] for cell in row] for row in table["data"]]
+        if rows:
+            df = _frame_from_rows(rows)
+            if table.get("page_number"):
+                df.attrs["page"] = table["page_number"]
+            frames.append(df)
+    return frames
+
+
+# Pre-filter thresholds: a page is a table candidate when it has enough
+# ruling lines, or when enough consecutive text lines share the same column
+# starts. A column starts after a gap wider than COLUMN_GAP times the text
+# height, which ordinary word spacing never is.
+MIN_HORIZONTAL_RULES = 3
+MIN_VERTICAL_RULES = 2
+MIN_ALIGNED_LINES = 3
+MIN_ALIGNED_COLUMNS = 3
+COLUMN_GAP = 1.0
+
+
+def _ruling_counts(page):
+    horizontal = vertical = 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < 1:
+                    horizontal += 1
+                elif abs(p1.x - p2.x) < 1:
+                    vertical += 1
+            elif item[0] == "re":
+                rect = item[1]
+                # Thin rectangles are how many generators draw rules; larger
+                # ones are cell borders contributing two rules each way.
+                if rect.height < 2:
+                    horizontal += 1
+                elif rect.width < 2:
+                    vertical += 1
+                else:
+                    horizontal += 2
+                    vertical += 2
+    return horizontal, vertical
+
+
+def _visual_lines(page):
+    # Words grouped by baseline, left to right. PyMuPDF often puts the cells
+    # of a borderless table in separate blocks, so its own line numbers do
+    # not group a table row.
+    lines = []
+    for word in sorted(page.get_text("words"), key=lambda w: (round(w[3]), w[0])):
+        if lines and abs(word[3] - lines[-1][0][3]) < 2:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    return [sorted(line, key=lambda w: w[0]) for line in lines]
+
+
+def _column_starts(line):
+    # x positions (in 5 pt bins) where the line's text starts a column: its
+    # first word and every word after a wide gap.
+    starts = [line[0][0]]
+    for previous, word in zip(line, line[1:]):
+        if word[0] - previous[2] > COLUMN_GAP * (word[3] - word[1]):
+            starts.append(word[0])
+    return {round(x / 5) for x in starts}
+
+
+def _has_aligned_columns(page):
+    # Columns of a borderless table show up as several consecutive lines
+    # with the same set of column starts. The left margin, where every line
+    # of prose starts, does not count as a column.
+    line_starts = [_column_starts(line) for line in _visual_lines(page)]
+    if not line_starts:
+        return False
+    first_starts = collections.Counter(min(starts) for starts in line_starts)
+    margin = first_starts.most_common(1)[0][0]
+    run = 0
+    previous = None
+    for starts in line_starts:
+        starts = starts - {margin}
+        if len(starts) < MIN_ALIGNED_COLUMNS:
+            run = 0
+        elif starts == previous:
+            run += 1
+        else:
+            run = 1
+        if run >= MIN_ALIGNED_LINES:
+            return True
+        previous = starts
+    return False
+
+
+def candidate_pages(data):
+    # Cheap PyMuPDF pass over every page. Returns {page index: strategy},
+    # where strategy is "lines" for ruled tables and "text" for tables
+    # recognised only by word alignment.
+    import fitz
+    candidates = {}
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page in doc:
+            horizontal, vertical = _ruling_counts(page)
+            if horizontal >= MIN_HORIZONTAL_RULES and vertical >= MIN_VERTICAL_RULES:
+                candidates[page.number] = "lines"
+            elif _has_aligned_columns(page):
+                candidates[page.number] = "text"
+    return candidates
+
+
+def _plumber_tables(data, pages):
+    # Full table detection with pdfplumber on the given (page index, strategy)
+    # pairs. Returns a list of row lists per page, in page order.
+    import pdfplumber
+    results = []
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for page_index, strategy in pages:
+            settings = {"vertical_strategy": strategy, "horizontal_strategy": strategy}
+            tables = pdf.pages[page_index].extract_tables(settings)
+            results.append([table for table in tables if table and len(table) > 1])
+    return results
+
+
+def _plumber_tables_in_worker(pages):
+    # Runs in a worker process, which was handed the PDF bytes once
+    return _plumber_tables(parallel.worker_data(), pages)
+
+
+def read_tables_plumber(data, workers=1, pages_per_task=4):
+    # Returns the list of tables (DataFrames) found in the PDF, in page order.
+    pages = sorted(candidate_pages(data).items())
+    if not pages:
+        return []
+    if workers <= 1 or len(pages) < PARALLEL_MIN_PAGES:
+        per_page = _plumber_tables(data, pages)
+    else:
+        tasks = [pages[start:start + pages_per_task] for start in range(0, len(pages), pages_per_task)]
+        with parallel.process_pool(workers, parallel.init_worker_data, (data,)) as pool:
+            per_page = [tables for chunk in pool.map(_plumber_tables_in_worker, tasks) for tables in chunk]
+
+    frames = []
+    for (page_index, _), tables in zip(pages, per_page):
+        for table in tables:
+            df = _frame_from_rows(table)
+            df.attrs["page"] = page_index + 1
+            frames.append(df)
+    return frames
+
+
+# Calls into tabula-java are serialised per process: there is only one JVM,
+# whichever TabulaService starts it.
+_jvm_lock = threading.Lock()
+
+
+class TabulaService:
+    """Table extraction that starts the Java VM as rarely as possible.
+
+    With jpype installed, tabula-py runs tabula-java inside one JVM that stays
+    up for the life of the server process, so only the first call pays the
+    JVM startup. Without jpype, a batch of files goes through a single
+    tabula-java process in its batch mode instead of one process per file.
+    """
+
+    def __init__(self):
+        self._lock = _jvm_lock
+        self.jvm_started = False
+        self.startup_seconds = None  # measured JVM + tabula-java startup cost
+        self.jvm_starts = 0
+        self.files_processed = 0
+
+    @property
+    def mode(self):
+        import importlib.util
+        return "jpype" if importlib.util.find_spec("jpype") is not None else "subprocess"
+
+    def warm_up(self):
+        # Run tabula once on a blank page. In jpype mode this starts the JVM
+        # for good; in both modes it measures the startup cost.
+        import tabula
+        with self._lock:
+            if self.startup_seconds is not None and (self.jvm_started or self.mode == "subprocess"):
+                return self.startup_seconds
+            start = time.perf_counter()
+            tabula.read_pdf(io.BytesIO(_blank_pdf()), pages="all", multiple_tables=True,
+                            force_subprocess=self.mode == "subprocess")
+            self.startup_seconds = time.perf_counter() - start
+            self.jvm_starts += 1
+            self.jvm_started = self.mode == "jpype"
+            return self.startup_seconds
+
+    def read_batch(self, pdfs):
+        # `pdfs` is a list of (name, bytes). Returns one entry per PDF: the
+        # list of its tables as DataFrames, or the exception raised for it.
+        if not pdfs:
+            return []
+        self.warm_up()
+        if self.mode == "jpype":
+            results = [self._read_in_jvm(data) for _, data in pdfs]
+        else:
+            results = self._read_in_batch_process(pdfs)
+        self.files_processed += len(pdfs)
+        return results
+
+    def _read_in_jvm(self, data):
+        import tabula
+        try:
+            with self._lock:
+                return tabula.read_pdf(io.BytesIO(data), pages="all", multiple_tables=True,
+                                       force_subprocess=False)
+        except Exception as e:
+            return e
+
+    def _read_in_batch_process(self, pdfs):
+        # tabula-java's --batch mode converts every PDF in a directory in one
+        # JVM; the JSON output keeps the table boundaries.
+        import tabula
+        directory = tempfile.mkdtemp(prefix="tabula-batch-")
+        try:
+            paths = []
+            for idx, (_, data) in enumerate(pdfs):
+                path = os.path.join(directory, f"{idx:05d}.pdf")
+                with open(path, "wb") as f:
+                    f.write(data)
+                paths.append(path)
+            with self._lock:
+                try:
+                    tabula.convert_into_by_batch(directory, output_format="json", pages="all")
+                except subprocess.CalledProcessError:
+                    # tabula-java stops the whole batch at the first PDF it
+                    # cannot read. The files converted before it keep their
+                    # JSON; the others are read one at a time below.
+                    pass
+                self.jvm_starts += 1
+            results = []
+            for path in paths:
+                json_path = os.path.splitext(path)[0] + ".json"
+                try:
+                    if not os.path.exists(json_path):
+                        self._convert_one(path, json_path)
+                    with open(json_path, "r", encoding="utf-8") as f:
+                        results.append(_frames_from_json(json.load(f)))
+                except Exception as e:
+                    results.append(e)
+            return results
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _convert_one(self, path, json_path):
+        import tabula
+        with self._lock:
+            try:
+                tabula.convert_into(path, json_path, output_format="json", pages="all")
+            finally:
+                self.jvm_starts += 1
+
+    def saved_seconds(self):
+        # Without the service every file would have started its own JVM.
+        if not self.startup_seconds:
+            return 0.0
+        return max(0, self.files_processed - self.jvm_starts) * self.startup_seconds
+
+    def summary(self):
+        if self.startup_seconds is None:
+            return "Tabula JVM not started yet."
+        return (f"Tabula ({self.mode} mode): JVM startup {self.startup_seconds:.1f} s, "
+                f"{self.jvm_starts} JVM start(s) for {self.files_processed} file(s), "
+                f"about {self.saved_seconds():.1f} s of startup saved.")
+
+
+tabula_service = TabulaService()
+
+
+def read_batch(pdfs, engine="tabula", workers=1, service=None):
+    # `pdfs` is a list of (name, bytes). Returns one entry per PDF: its
+    # tables as DataFrames, or the exception raised for it. tabula runs on
+    # `service`, the shared tabula_service by default.
+    if engine == "tabula":
+        return (service or tabula_service).read_batch(pdfs)
+    if engine != "pdfplumber":
+        raise ValueError(f"Unknown table extraction engine: {engine}")
+    results = []
+    for _, data in pdfs:
+        try:
+            results.append(read_tables_plumber(data, workers))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def load_tables(uploaded_files, keys, store, engine="tabula", workers=1):
+    # Make sure `store` (an IncrementalStore) holds the tables of every
+    # upload under its key: uploads seen before come from the on-disk cache,
+    # and all remaining ones go to the engine as one batch. Returns
+    # {upload index: exception} for the uploads that failed.
+    from core.result_cache import result_cache
+    missing = []
+    for idx, (uploaded_file, key) in enumerate(zip(uploaded_files, keys)):
+        if key in store:
+            continue
+        cache_key = result_cache.key(store.digest(uploaded_file), "tables", engine, {"pages": "all"})
+        dfs = result_cache.get_frames(cache_key)
+        if dfs is not None:
+            store.put(key, dfs)
+        else:
+            missing.append((idx, cache_key))
+
+    errors = {}
+    if not missing:
+        return errors
+    with metrics.job("tables", engine=engine, files=len(missing)) as job:
+        pdfs = [(uploaded_files[idx].name, uploaded_files[idx].getvalue()) for idx, _ in missing]
+        job.add_bytes(sum(len(data) for _, data in pdfs))
+        if engine == "tabula":
+            # Reported separately, so a slow first request shows up as JVM
+            # startup rather than extraction
+            with job.span("jvm_start"):
+                tabula_service.warm_up()
+        with job.span("extract"):
+            results = read_batch(pdfs, engine, workers)
+        for (idx, cache_key), result in zip(missing, results):
+            if isinstance(result, Exception):
+                errors[idx] = result
+            else:
+                with job.span("cache_write"):
+                    result_cache.put_frames(cache_key, result)
+                store.put(keys[idx], result)
+    return errors
+
+
+def compare_engines(pdfs, workers=1):
+    # Run every engine over the same PDFs, bypassing the caches. Returns one
+    # row per engine with its wall time and the number of tables found.
+    # tabula runs on a TabulaService of its own, so the comparison does not
+    # count towards the files and startup savings of the shared service.
+    service = TabulaService()
+    rows = []
+    for engine in ENGINES:
+        start = time.perf_counter()
+        try:
+            if engine == "tabula":
+                # Outside the timing, as the shared service is usually warm
+                service.warm_up()
+                start = time.perf_counter()
+            results = read_batch(pdfs, engine, workers, service)
+            error = next((str(r) for r in results if isinstance(r, Exception)), "")
+            tables = sum(len(r) for r in results if not isinstance(r, Exception))
+        except Exception as e:
+            error, tables = str(e), 0
+        rows.append({
+            "engine": ENGINES[engine],
+            "seconds": round(time.perf_counter() - start, 2),
+            "tables": tables,
+            "error": error,
+        })
+    return rows
+
+
+def prewarm():
+    # Start the JVM in a daemon thread. Returns the thread, or None when
+    # pre-warming is disabled.
+    if not PREWARM_TABULA:
+        return None
+
+    def run():
+        try:
+            tabula_service.warm_up()
+        except Exception:
+            pass  # Java missing; the table pages report the error on use
+
+    thread = threading.Thread(target=run, name="tabula-prewarm", daemon=True)
+    thread.start()
+    return thread
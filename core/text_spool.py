@@ -0,0 +1,74 @@
+import codecs
+import os
+import re
+import shutil
+import tempfile
+
+# Text is kept in memory up to these sizes and rolled over to a temp file
+# beyond them. Per-file spools are kept small so a batch of thousands of
+# documents does not pile up in RAM; the merged output gets a larger buffer.
+FILE_SPOOL_KB = int(os.environ.get("EXTRACT_FILE_SPOOL_KB", "256"))
+MERGED_SPOOL_MB = int(os.environ.get("EXTRACT_MERGED_SPOOL_MB", "8"))
+
+CHUNK_SIZE = 1024 * 1024
+
+_newlines = re.compile(r"\n+")
+
+
+class TextSpool:
+    """UTF-8 text written to a SpooledTemporaryFile and read back in chunks."""
+
+    def __init__(self, max_size=FILE_SPOOL_KB * 1024):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size, mode="w+b")
+        self.size = 0  # bytes
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self.size += len(data)
+
+    def write_file(self, source):
+        # Append the raw bytes of an open binary file.
+        self._file.seek(0, os.SEEK_END)
+        shutil.copyfileobj(source, self._file, CHUNK_SIZE)
+        self.size = self._file.tell()
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        # Decode incrementally so multi-byte characters split across chunk
+        # boundaries come out whole.
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        self._file.seek(0)
+        while True:
+            data = self._file.read(chunk_size)
+            if not data:
+                break
+            yield decoder.decode(data)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def write_spool(self, other, collapse_newlines=False):
+        # Stream `other` into this spool, optionally squeezing runs of line
+        # breaks into one (also across chunk boundaries).
+        ends_with_newline = False
+        for chunk in other.chunks():
+            if collapse_newlines:
+                chunk = _newlines.sub("\n", chunk)
+                if ends_with_newline and chunk.startswith("\n"):
+                    chunk = chunk[1:]
+                if chunk:
+                    ends_with_newline = chunk.endswith("\n")
+            self.write(chunk)
+
+    def read_slice(self, start, length):
+        # Bytes [start, start + length) decoded leniently, for previews.
+        self._file.seek(start)
+        return self._file.read(length).decode("utf-8", errors="ignore")
+
+    def file(self):
+        self._file.seek(0)
+        return self._file
+
+    def close(self):
+        self._file.close()
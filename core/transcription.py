@@ -0,0 +1,359 @@
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from core import parallel, whisper_models
+
+# Whisper always works on 16 kHz mono audio.
+SAMPLE_RATE = 16000
+
+
+def _ffmpeg_decode(source, data=None, sample_rate=SAMPLE_RATE):
+    import numpy as np
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", source,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-",
+    ]
+    if data is not None:
+        cmd.remove("-nostdin")
+    out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def decode_audio(data, suffix="", sample_rate=SAMPLE_RATE):
+    # Decode an in-memory upload to the float32 mono waveform Whisper expects,
+    # piping the bytes through ffmpeg's stdin. Containers that need seeking
+    # (mp4/m4a with the index at the end) cannot be read from a pipe; those
+    # fall back to a private file in the system temp directory. The file is
+    # closed before ffmpeg opens it, which Windows requires.
+    try:
+        return _ffmpeg_decode("pipe:0", data=bytes(data), sample_rate=sample_rate)
+    except subprocess.CalledProcessError:
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+            temp_file.write(data)
+        try:
+            return _ffmpeg_decode(temp_file.name, sample_rate=sample_rate)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='replace')}") from e
+        finally:
+            os.remove(temp_file.name)
+
+
+def frame_rms(audio, frame_seconds=0.1, sample_rate=SAMPLE_RATE):
+    import numpy as np
+    frame = max(1, int(frame_seconds * sample_rate))
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return np.zeros(1, dtype=np.float32), frame
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    return np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1)), frame
+
+
+def split_at_silence(audio, window_seconds=300, overlap_seconds=5, search_seconds=20,
+                     sample_rate=SAMPLE_RATE):
+    # Cut the waveform into (start, end) sample windows of roughly
+    # window_seconds. Each cut is moved to the quietest frame within
+    # search_seconds before the nominal end, and consecutive windows overlap by
+    # overlap_seconds so that words on a boundary are heard by both chunks.
+    # The cut never moves so early that a window advances by less than half
+    # its length, however large the overlap and search range are.
+    import numpy as np
+    total = len(audio)
+    window = int(window_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+    if total <= window:
+        return [(0, total)]
+
+    rms, frame = frame_rms(audio, sample_rate=sample_rate)
+    search_frames = max(1, int(search_seconds * sample_rate) // frame)
+
+    chunks = []
+    start = 0
+    while start < total:
+        nominal_end = start + window
+        if nominal_end >= total:
+            chunks.append((start, total))
+            break
+        last_frame = min(nominal_end // frame, len(rms))
+        first_frame = max(last_frame - search_frames, (start + overlap + window // 2) // frame + 1)
+        if first_frame < last_frame:
+            quietest = first_frame + int(np.argmin(rms[first_frame:last_frame]))
+            end = quietest * frame
+        else:
+            end = nominal_end
+        chunks.append((start, end))
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+# Voice-activity thresholds. Frames quieter than SILENCE_DB are never speech.
+# A frame within LOUD_RANGE_DB of the loud level is always speech, which
+# matters for audio without pauses (continuous speech, speech over music),
+# where the noise floor is itself speech. When less than MIN_SPEECH_FRACTION
+# of audible audio is kept, the detection is not trusted and the whole audio
+# is returned.
+SILENCE_DB = -60.0
+LOUD_RANGE_DB = 20.0
+MIN_SPEECH_FRACTION = 0.05
+
+
+def detect_speech(audio, margin_db=10.0, min_speech_seconds=0.3, min_silence_seconds=0.6,
+                  pad_seconds=0.2, sample_rate=SAMPLE_RATE):
+    # Energy-based voice-activity detection. A frame counts as speech when its
+    # level is margin_db above the noise floor (the 10th percentile of frame
+    # levels) or within LOUD_RANGE_DB of the loud level (the 90th
+    # percentile). Returns a list of (start, end) sample ranges.
+    import numpy as np
+    frame_seconds = 0.03
+    rms, frame = frame_rms(audio, frame_seconds, sample_rate)
+    level_db = 20 * np.log10(rms + 1e-10)
+    noise_floor = np.percentile(level_db, 10)
+    loud_level = np.percentile(level_db, 90)
+    threshold = max(min(noise_floor + margin_db, loud_level - LOUD_RANGE_DB), SILENCE_DB)
+    voiced = level_db > threshold
+
+    # Find runs of voiced frames.
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    min_silence = int(min_silence_seconds / frame_seconds)
+    merged = []
+    for start, end in zip(starts, ends):
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    min_speech = int(min_speech_seconds / frame_seconds)
+    pad = int(pad_seconds * sample_rate)
+    regions = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start = max(0, start * frame - pad)
+        end = min(len(audio), end * frame + pad)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+
+    if loud_level > SILENCE_DB and sum(end - start for start, end in regions) < MIN_SPEECH_FRACTION * len(audio):
+        return [(0, len(audio))]
+    return regions
+
+
+def compact_regions(audio, regions):
+    # Concatenate the speech regions into one array. Returns the compacted
+    # audio and the start of each region in the compacted array, which is what
+    # remap_segments needs to move timestamps back to the original timeline.
+    import numpy as np
+    if not regions:
+        return audio[:0], np.zeros(0, dtype=np.int64)
+    compact = np.concatenate([audio[start:end] for start, end in regions])
+    lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+    compact_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return compact, compact_starts
+
+
+def remap_segments(segments, regions, compact_starts, sample_rate=SAMPLE_RATE):
+    import numpy as np
+    if not regions:
+        return list(segments)
+    original_starts = np.array([start for start, _ in regions], dtype=np.int64)
+
+    def to_original(seconds, side):
+        # An end time on a region boundary belongs to the region before it.
+        sample = int(round(seconds * sample_rate))
+        index = max(0, int(np.searchsorted(compact_starts, sample, side=side)) - 1)
+        return (original_starts[index] + sample - compact_starts[index]) / sample_rate
+
+    remapped = []
+    for segment in segments:
+        segment = dict(segment)
+        segment["start"] = to_original(segment["start"], "right")
+        segment["end"] = to_original(segment["end"], "left")
+        remapped.append(segment)
+    return remapped
+
+
+def offset_segments(segments, offset_seconds):
+    shifted = []
+    for segment in segments:
+        segment = dict(segment)
+        segment["start"] = segment["start"] + offset_seconds
+        segment["end"] = segment["end"] + offset_seconds
+        shifted.append(segment)
+    return shifted
+
+
+def stitch_chunks(chunk_results, chunks, sample_rate=SAMPLE_RATE):
+    # chunk_results[i] holds the segments of chunks[i], already on the original
+    # timeline. In each overlap a segment belongs to the chunk whose side of
+    # the overlap midpoint its centre falls on, so overlap speech is kept once.
+    segments = []
+    for i, chunk_segments in enumerate(chunk_results):
+        lower = None
+        upper = None
+        if i > 0:
+            prev_end = chunks[i - 1][1]
+            lower = (chunks[i][0] + prev_end) / 2 / sample_rate
+        if i + 1 < len(chunks):
+            next_start = chunks[i + 1][0]
+            upper = (next_start + chunks[i][1]) / 2 / sample_rate
+        for segment in chunk_segments:
+            centre = (segment["start"] + segment["end"]) / 2
+            if lower is not None and centre < lower:
+                continue
+            if upper is not None and centre >= upper:
+                continue
+            # A sentence straddling the midpoint can still be decoded by both
+            # chunks; drop the repeat.
+            if segments and _normalise(segments[-1]["text"]) == _normalise(segment["text"]):
+                continue
+            segments.append(segment)
+    text = "".join(segment["text"] for segment in segments).strip()
+    return {"text": text, "segments": segments}
+
+
+def _normalise(text):
+    return " ".join(text.lower().split())
+
+
+def default_workers():
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+
+# Worker-process side: each worker loads its own copy of the model once.
+# Whisper installs decoder hooks per transcribe call, so one model object
+# cannot be shared by concurrent threads.
+_worker_model = None
+
+
+def _init_worker(model_size, backend, threads):
+    global _worker_model
+    _worker_model = (model_size, backend, threads)
+    whisper_models.get_model(model_size, backend, threads)
+
+
+def _transcribe_in_worker(task):
+    audio_chunk, options = task
+    model = whisper_models.get_model(*_worker_model)
+    return model.transcribe(audio_chunk, **options)
+
+
+class WorkerPools:
+    """Persistent long-audio worker pools, one per (model size, backend).
+
+    A pool and the model copies its workers loaded are reused by every later
+    file with the same model. Each worker holds its own copy, so the copies
+    are booked against the model registry's budget and the worker count is
+    capped by what the budget has left. Idle pools of other models are shut
+    down when a new pool is started.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}  # (model_size, backend) -> [pool, workers, active calls]
+
+    @contextmanager
+    def use(self, model_size, backend, workers):
+        # Yields (pool, workers), or (None, 1) when the budget has no room for
+        # a second copy of the model and the caller should run in-process.
+        key = (model_size, backend)
+        with self._lock:
+            entry = self._pools.get(key)
+            if entry is None:
+                self._close_idle()
+                copy_mb = whisper_models.model_mb(model_size, backend)
+                workers = min(workers, int(whisper_models.registry.available_mb() // copy_mb))
+                if workers <= 1:
+                    entry = None
+                else:
+                    threads = max(1, (os.cpu_count() or workers) // workers)
+                    pool = parallel.process_pool(workers, _init_worker, (model_size, backend, threads))
+                    whisper_models.registry.reserve(("workers",) + key, workers * copy_mb)
+                    entry = self._pools[key] = [pool, workers, 0]
+            if entry is not None:
+                entry[2] += 1
+        if entry is None:
+            yield None, 1
+            return
+        try:
+            yield entry[0], entry[1]
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start afresh next time.
+            with self._lock:
+                if self._pools.get(key) is entry:
+                    self._close(key)
+            raise
+        finally:
+            with self._lock:
+                entry[2] -= 1
+
+    def _close(self, key):
+        pool = self._pools.pop(key)[0]
+        pool.shutdown(wait=False, cancel_futures=True)
+        whisper_models.registry.release(("workers",) + key)
+
+    def _close_idle(self):
+        for key in [key for key, entry in self._pools.items() if entry[2] == 0]:
+            self._close(key)
+
+    def shutdown(self):
+        with self._lock:
+            for key in list(self._pools):
+                self._close(key)
+
+
+worker_pools = WorkerPools()
+
+
+def transcribe_long_audio(model, model_size, audio, window_seconds=300, overlap_seconds=5,
+                          workers=1, on_chunk=None, backend="pytorch", **options):
+    # Transcribe `audio` chunk by chunk. With workers > 1 the chunks are spread
+    # over the persistent worker pool for `backend`/`model_size` (see
+    # WorkerPools), each worker holding its own copy of the model; otherwise,
+    # or when the model budget has no room for worker copies, they run in this
+    # process on the already-loaded model. on_chunk(done, total,
+    # partial_result) is called after every chunk with the stitched text of
+    # the finished in-order prefix.
+    chunks = split_at_silence(audio, window_seconds, overlap_seconds)
+    results = [None] * len(chunks)
+    ready = 0
+
+    def collect(index, result):
+        nonlocal ready
+        offset = chunks[index][0] / SAMPLE_RATE
+        results[index] = offset_segments(result["segments"], offset)
+        while ready < len(results) and results[ready] is not None:
+            ready += 1
+        if on_chunk is not None:
+            done = sum(r is not None for r in results)
+            on_chunk(done, len(chunks), stitch_chunks(results[:ready], chunks[:ready]))
+
+    def in_process():
+        for index, (start, end) in enumerate(chunks):
+            collect(index, model.transcribe(audio[start:end], **options))
+
+    workers = max(1, min(workers, len(chunks)))
+    if workers == 1:
+        in_process()
+    else:
+        with worker_pools.use(model_size, backend, workers) as (pool, pool_workers):
+            if pool is None:
+                in_process()
+            else:
+                # At most `workers` chunks in flight, sliced as they are sent
+                tasks = ((audio[start:end], options) for start, end in chunks)
+                for index, result, error in parallel.bounded_map(
+                    _transcribe_in_worker, tasks, min(workers, pool_workers), pool
+                ):
+                    if error is not None:
+                        raise error
+                    collect(index, result)
+
+    return stitch_chunks(results, chunks)
@@ -0,0 +1,138 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from core.metrics import metrics
+
+# Heavy third-party modules and the tools that need them. The pages import
+# them only when an operation runs, so each is paid for on first use unless
+# it was preloaded.
+HEAVY_MODULES = {
+    "fitz": "text, images, merge, split, OCR of PDFs",
+    "pdfplumber": "text, tables",
+    "pandas": "tables",
+    "numpy": "OCR, audio",
+    "PIL.Image": "OCR",
+    "pytesseract": "OCR",
+    "docx": "text (DOCX uploads)",
+    "tabula": "tables (tabula engine)",
+    "xlsxwriter": "table export",
+    "pyarrow": "table export (Parquet)",
+    "PyPDF2": "merge (PyPDF2 engine)",
+    "torch": "audio",
+    "whisper": "audio",
+}
+
+# Modules imported by the warm-up thread after startup: a comma-separated
+# list, or "all" for every heavy module. Empty (the default) disables it.
+WARMUP_MODULES = os.environ.get("EXTRACT_WARMUP_MODULES", "")
+
+# Seconds each module took to import in this process, for the ones the
+# warm-up thread imported.
+import_seconds = {}
+_lock = threading.Lock()
+
+
+def warmup_modules(setting=WARMUP_MODULES):
+    if setting.strip() == "all":
+        return list(HEAVY_MODULES)
+    return [name.strip() for name in setting.split(",") if name.strip()]
+
+
+def import_module(name):
+    # Import `name` and record how long it took when it was not loaded yet.
+    # Raises ImportError like importlib does.
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        import_seconds.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def prewarm(modules=None):
+    # Import the modules in a daemon thread, one warm-up job with a stage
+    # per module. Missing optional modules are skipped. Returns the thread,
+    # or None when there is nothing to import.
+    modules = warmup_modules() if modules is None else modules
+    if not modules:
+        return None
+
+    def run():
+        with metrics.job("warmup", modules=len(modules)) as job:
+            for name in modules:
+                with job.span(name):
+                    try:
+                        import_module(name)
+                    except Exception:
+                        pass  # not installed; the tool reports it on use
+
+    thread = threading.Thread(target=run, name="module-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def cold_import_seconds(name):
+    # Import time of `name` in a fresh interpreter, with everything it pulls
+    # in, from `python -X importtime`. Returns None when it cannot be
+    # imported.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {name}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode != 0:
+        return None
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|")
+        if package.strip() == name:
+            return int(cumulative) / 1e6
+    return None
+
+
+def import_report(modules=None):
+    # One row per module: its cold import time in a fresh interpreter, and
+    # whether (and how quickly) it was imported in this process.
+    rows = []
+    for name in modules or list(HEAVY_MODULES):
+        seconds = cold_import_seconds(name)
+        rows.append({
+            "module": name,
+            "used by": HEAVY_MODULES.get(name, ""),
+            "cold import s": round(seconds, 3) if seconds is not None else None,
+            "loaded": name in sys.modules,
+            "import s here": round(import_seconds[name], 3) if name in import_seconds else None,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m core.warmup",
+        description="Print the cold import time of the heavy modules, each in a fresh interpreter.",
+    )
+    parser.add_argument("modules", nargs="*", help="modules to time, e.g. core.ocr (default: the heavy modules)")
+    parser.add_argument("--json", action="store_true", help="print the times as JSON")
+    args = parser.parse_args(argv)
+
+    rows = [{"module": name, "seconds": cold_import_seconds(name)} for name in args.modules or HEAVY_MODULES]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+    for row in rows:
+        seconds = row["seconds"]
+        print(f"{row['module']:<30} {'not installed' if seconds is None else f'{seconds:8.3f} s'}")
+    print(f"{'total':<30} {sum(row['seconds'] or 0.0 for row in rows):8.3f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Approximate resident size of each fp32 Whisper checkpoint, used when the
+# real size cannot be measured from the model parameters.
+APPROX_MODEL_MB = {
+    "tiny": 150,
+    "base": 290,
+    "small": 970,
+    "medium": 3060,
+    "large": 6170,
+}
+
+# RAM budget for all cached models together, in megabytes.
+DEFAULT_BUDGET_MB = int(os.environ.get("WHISPER_MODEL_BUDGET_MB", "4096"))
+
+# Model size to load in the background when the server starts ("" disables).
+PREWARM_MODEL = os.environ.get("WHISPER_PREWARM_MODEL", "")
+PREWARM_BACKEND = os.environ.get("WHISPER_PREWARM_BACKEND", "pytorch")
+
+
+def estimate_model_mb(model, approx_mb):
+    # CTranslate2 models have no torch parameters at all, so that backend
+    # passes its approximate size instead. Dynamically quantized linear
+    # layers keep their weights in packed buffers that parameters() does not
+    # report; those are added from the layers themselves.
+    if approx_mb is not None:
+        return approx_mb
+    total = sum(p.numel() * p.element_size() for p in model.parameters())
+    total += sum(b.numel() * b.element_size() for b in model.buffers())
+    for module in model.modules():
+        if hasattr(module, "_weight_bias"):
+            for tensor in module._weight_bias():
+                if tensor is not None:
+                    total += tensor.numel() * tensor.element_size()
+    return total / (1024 * 1024)
+
+
+class SharedModel:
+    """A cached model shared by all sessions, with its transcribe calls serialized.
+
+    Whisper installs decoder hooks (the kv-cache) per transcribe call, so one
+    model object cannot run two transcriptions at once. Other attributes are
+    passed through to the wrapped model.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio, **options):
+        with self.lock:
+            return self.model.transcribe(audio, **options)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class ModelRegistry:
+    """Process-wide LRU cache of loaded models bounded by a RAM budget."""
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget_mb = budget_mb
+        self._models = OrderedDict()  # key -> (model, size_mb)
+        self._lock = threading.Lock()
+        self._loading = {}  # key -> threading.Lock, so a size is loaded once
+        self._reserved = {}  # name -> MB held outside the cache (worker copies)
+        self.load_seconds = {}
+
+    def get(self, key, loader, approx_mb=None):
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other sizes stay available, but
+        # make concurrent sessions asking for the same key wait for one load.
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key][0]
+
+            start = time.perf_counter()
+            model = loader()
+            self.load_seconds[key] = time.perf_counter() - start
+            size_mb = estimate_model_mb(model, approx_mb)
+            model = SharedModel(model)
+
+            with self._lock:
+                self._models[key] = (model, size_mb)
+                self._loading.pop(key, None)
+                self._evict(keep=key)
+            return model
+
+    def reserve(self, name, size_mb):
+        # Book memory used by models outside this cache, e.g. the copies in
+        # long-audio worker processes, evicting cached models to make room.
+        with self._lock:
+            self._reserved[name] = size_mb
+            self._evict(keep=None)
+
+    def release(self, name):
+        with self._lock:
+            self._reserved.pop(name, None)
+
+    def available_mb(self):
+        with self._lock:
+            return self.budget_mb - self.used_mb()
+
+    def size_mb(self, key):
+        with self._lock:
+            entry = self._models.get(key)
+            return entry[1] if entry is not None else None
+
+    def _evict(self, keep):
+        evicted = False
+        while self.used_mb() > self.budget_mb and len(self._models) > 1:
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            del self._models[oldest]
+            evicted = True
+        if evicted:
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def used_mb(self):
+        return sum(size_mb for _, size_mb in self._models.values()) + sum(self._reserved.values())
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models.keys())
+
+    def is_loaded(self, key):
+        with self._lock:
+            return key in self._models
+
+
+registry = ModelRegistry()
+
+
+# Inference backends selectable on the audio page. "int8" is the PyTorch
+# model with its linear layers dynamically quantized; "ctranslate2" uses
+# faster-whisper and is only offered when that package is installed.
+BACKENDS = {
+    "pytorch": "PyTorch fp32 (reference)",
+    "int8": "PyTorch int8 dynamic quantization (CPU)",
+    "ctranslate2": "CTranslate2 int8 (faster-whisper)",
+}
+
+# int8 models take about a third of the fp32 size: the quantized weights are a
+# quarter of their fp32 size, but embeddings, convs and layer norms stay in
+# fp32. Used for both int8 backends until a loaded model is measured
+# (CTranslate2 models cannot be measured at all).
+INT8_SIZE_RATIO = 0.35
+
+
+def available_backends():
+    import importlib.util
+    backends = ["pytorch", "int8"]
+    if importlib.util.find_spec("faster_whisper") is not None:
+        backends.append("ctranslate2")
+    return backends
+
+
+def default_threads():
+    return os.cpu_count() or 1
+
+
+class FasterWhisperModel:
+    """Adapter giving a faster-whisper model the openai-whisper transcribe API."""
+
+    def __init__(self, model_size, threads):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_size, device="cpu", compute_type="int8", cpu_threads=threads)
+
+    def transcribe(self, audio, **options):
+        language = options.get("language")
+        segments, _ = self.model.transcribe(audio, language=language)
+        segments = [
+            {"id": i, "start": segment.start, "end": segment.end, "text": segment.text}
+            for i, segment in enumerate(segments)
+        ]
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
+
+
+# torch's intra-op thread pool is process-wide. It is sized once, when the
+# first PyTorch model is loaded, instead of on every get_model call, where it
+# would change under transcriptions running in other sessions.
+_torch_threads = None
+_torch_threads_lock = threading.Lock()
+
+
+def _set_torch_threads(threads):
+    global _torch_threads
+    with _torch_threads_lock:
+        if _torch_threads is None:
+            import torch
+            torch.set_num_threads(threads)
+            _torch_threads = threads
+
+
+def torch_threads():
+    # The thread count PyTorch models use in this process (None before the
+    # first load).
+    return _torch_threads
+
+
+def _load_pytorch(model_size, threads):
+    import whisper
+    _set_torch_threads(threads)
+    return whisper.load_model(model_size)
+
+
+def _plain_linears(module):
+    # whisper.model.Linear (used for every linear layer) subclasses
+    # nn.Linear, but the dynamic quantization mapping and the quantized
+    # layer's from_float only accept nn.Linear itself. Swap each one for an
+    # nn.Linear sharing its weights; on CPU in fp32 they compute the same.
+    import torch
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            plain.weight = child.weight
+            plain.bias = child.bias
+            setattr(module, name, plain)
+        else:
+            _plain_linears(child)
+    return module
+
+
+def quantize_int8(model):
+    # Dynamic int8 quantization of the linear layers. Falls back to the fp32
+    # model with a warning when no layer could be quantized, so the model is
+    # never booked as int8 without being int8.
+    import warnings
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as QuantizedLinear
+    quantized = torch.quantization.quantize_dynamic(_plain_linears(model), {torch.nn.Linear}, dtype=torch.qint8)
+    if not any(isinstance(module, QuantizedLinear) for module in quantized.modules()):
+        warnings.warn("int8 quantization replaced no layers; using the fp32 model.")
+    return quantized
+
+
+def _load_int8(model_size, threads):
+    import whisper
+    _set_torch_threads(threads)
+    return quantize_int8(whisper.load_model(model_size, device="cpu"))
+
+
+def model_key(model_size, backend="pytorch", threads=None):
+    # Registry key of a model. CTranslate2 fixes its thread pool when the
+    # model is created, so each thread count is a separate model.
+    if backend == "ctranslate2":
+        return (backend, model_size, threads or default_threads())
+    return (backend, model_size)
+
+
+def get_model(model_size, backend="pytorch", threads=None):
+    threads = threads or default_threads()
+    key = model_key(model_size, backend, threads)
+    if backend == "ctranslate2":
+        return registry.get(
+            key,
+            lambda: FasterWhisperModel(model_size, threads),
+            approx_mb=APPROX_MODEL_MB.get(model_size, APPROX_MODEL_MB["large"]) * INT8_SIZE_RATIO,
+        )
+
+    if backend == "int8":
+        # Measured after quantization, so a fallback to fp32 is booked at
+        # its real size.
+        return registry.get(key, lambda: _load_int8(model_size, threads))
+    if backend != "pytorch":
+        raise ValueError(f"Unknown Whisper backend: {backend}")
+
+    return registry.get(key, lambda: _load_pytorch(model_size, threads))
+
+
+def model_mb(model_size, backend="pytorch", threads=None):
+    # Memory one copy of the model takes: measured when it is loaded in this
+    # process, approximated otherwise.
+    measured = registry.size_mb(model_key(model_size, backend, threads))
+    if measured is not None:
+        return measured
+    approx = APPROX_MODEL_MB.get(model_size, APPROX_MODEL_MB["large"])
+    return approx * INT8_SIZE_RATIO if backend != "pytorch" else approx
+
+
+def transcribe_options(backend):
+    # fp16 is only used on CUDA; asking for it on CPU just prints a warning.
+    if backend == "pytorch":
+        import torch
+        return {"fp16": torch.cuda.is_available()}
+    return {"fp16": False}
+
+
+class RealTimeFactors:
+    """Process-wide record of measured real-time factors per backend and size."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}  # (backend, model_size) -> [audio_seconds, inference_seconds, runs]
+
+    def record(self, backend, model_size, audio_seconds, inference_seconds):
+        if audio_seconds <= 0:
+            return
+        with self._lock:
+            totals = self._totals.setdefault((backend, model_size), [0.0, 0.0, 0])
+            totals[0] += audio_seconds
+            totals[1] += inference_seconds
+            totals[2] += 1
+
+    def rows(self):
+        # Real-time factor = inference time / audio duration (lower is faster).
+        with self._lock:
+            return [
+                {
+                    "backend": backend,
+                    "model": model_size,
+                    "runs": runs,
+                    "audio (s)": round(audio, 1),
+                    "inference (s)": round(inference, 1),
+                    "real-time factor": round(inference / audio, 3),
+                }
+                for (backend, model_size), (audio, inference, runs) in sorted(self._totals.items())
+            ]
+
+
+real_time_factors = RealTimeFactors()
+
+
+def prewarm(model_size=PREWARM_MODEL, backend=PREWARM_BACKEND):
+    # Load a model in a daemon thread so the first transcription does not pay
+    # the load cost. Returns the thread, or None when pre-warming is disabled.
+    if not model_size:
+        return None
+    thread = threading.Thread(
+        target=get_model, args=(model_size, backend), name=f"whisper-prewarm-{model_size}", daemon=True
+    )
+    thread.start()
+    return thread
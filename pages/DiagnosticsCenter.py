@@ -0,0 +1,61 @@
+import streamlit as st
+import sys
+
+from core import parallel, warmup
+from core.metrics import METRICS_PORT, metrics
+
+st.title("Diagnostics")
+
+st.write("""
+This page shows how long the tools of this server took, stage by stage, since it was started.
+
+- **Percentiles** of the job time per tool over the recent jobs, with the mean time of each stage.
+- **Recent jobs**, newest first, with their stage timings, data size and peak memory.
+- The same figures in the **Prometheus** text format, for a download or a scrape.
+- **Import times** of the heavy modules, which the tools load on first use.
+
+**Note:** Set `EXTRACT_METRICS_PORT` to serve the Prometheus metrics on that port.
+""")
+
+jobs = metrics.recent()
+peak = parallel.peak_rss_mb()
+if peak is not None:
+    st.caption(f"Peak memory of the server process: {peak:.0f} MB.")
+
+if jobs:
+    st.subheader("Percentiles per tool")
+    st.table(metrics.percentiles())
+
+    st.subheader("Recent jobs")
+    tool = st.selectbox("Tool:", ["All"] + sorted({job.tool for job in jobs}))
+    st.dataframe([job.as_row() for job in reversed(jobs) if tool == "All" or job.tool == tool])
+else:
+    st.info("No jobs have run on this server yet.")
+
+# Startup cost: what the heavy modules take to import cold, and which of
+# them this server has loaded so far
+st.subheader("Import times")
+if st.button("Measure import times"):
+    with st.spinner("Importing each module in a fresh interpreter..."):
+        st.session_state.import_report = warmup.import_report()
+if "import_report" in st.session_state:
+    st.table(st.session_state.import_report)
+else:
+    st.caption(f"Loaded in this server: {', '.join(name for name in warmup.HEAVY_MODULES if name in sys.modules) or 'none'}.")
+
+# Prometheus text format, also served on EXTRACT_METRICS_PORT when set
+prometheus_text = metrics.prometheus_text()
+with st.expander("Prometheus metrics"):
+    if METRICS_PORT:
+        st.caption(f"Served at http://<host>:{METRICS_PORT}/metrics")
+    st.code(prometheus_text, language="text")
+st.download_button(
+    label="Download metrics",
+    data=prometheus_text,
+    file_name="metrics.prom",
+    mime="text/plain"
+)
+
+if st.button("Clear metrics"):
+    metrics.clear()
+    st.rerun()
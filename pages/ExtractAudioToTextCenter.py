@@ -1,7 +1,12 @@
 import streamlit as st
-import whisper
 import os
 import datetime
+import time
+
+from core import whisper_models, transcription
+from core.incremental import IncrementalStore
+from core.metrics import metrics
+from core.result_cache import result_cache
 
 st.title("Audio Transcription with Whisper")
 
@@ -14,13 +19,52 @@ This app transcribes audio files using OpenAI's Whisper model.
 - Install FFmpeg from [ffmpeg.org](https://ffmpeg.org/download.html)
 """)
 
-# Select the Whisper model size
+# Select the Whisper model size and inference backend
 model_size = st.selectbox("Select Whisper model size:", ["tiny", "base", "small", "medium", "large"])
+col1, col2 = st.columns(2)
+backend = col1.selectbox(
+    "Inference backend:",
+    whisper_models.available_backends(),
+    format_func=lambda name: whisper_models.BACKENDS[name],
+)
+threads = col2.number_input(
+    "CPU threads:", min_value=1, max_value=os.cpu_count() or 1,
+    value=whisper_models.default_threads(),
+    help="PyTorch backends use the thread count of the first model loaded by this server."
+)
 
-# Load the Whisper model
-st.write(f"Loading Whisper model '{model_size}'...")
-model = whisper.load_model(model_size)
+# Load the Whisper model (shared by all sessions and kept across reruns)
+with st.spinner(f"Loading Whisper model '{model_size}' ({backend})..."):
+    if whisper_models.registry.is_loaded(whisper_models.model_key(model_size, backend, int(threads))):
+        model = whisper_models.get_model(model_size, backend, int(threads))
+    else:
+        with metrics.job("whisper_load", backend=backend, model=model_size):
+            model = whisper_models.get_model(model_size, backend, int(threads))
+transcribe_options = whisper_models.transcribe_options(backend)
 st.success(f"Model '{model_size}' loaded.")
+st.caption(
+    f"Models in memory: {', '.join(map(str, whisper_models.registry.loaded()))} "
+    f"({whisper_models.registry.used_mb():.0f} / {whisper_models.registry.budget_mb} MB)"
+)
+
+# Long recordings are split at silences and transcribed chunk by chunk
+long_audio_mode = st.checkbox("Long-audio mode (split into chunks and transcribe in parallel)", value=False)
+if long_audio_mode:
+    col1, col2, col3 = st.columns(3)
+    chunk_minutes = col1.number_input("Chunk length (minutes):", min_value=1, max_value=60, value=5)
+    overlap_seconds = col2.number_input("Chunk overlap (seconds):", min_value=0, max_value=30, value=5)
+    workers = col3.number_input(
+        "Worker processes:", min_value=1, max_value=os.cpu_count() or 1,
+        value=transcription.default_workers()
+    )
+
+# Skip silence and background noise before running the model
+skip_silence = st.checkbox("Skip silence (voice-activity filter)", value=False)
+if skip_silence:
+    vad_margin_db = st.slider(
+        "Speech threshold above noise floor (dB):", min_value=3, max_value=30, value=10,
+        help="Higher values skip more of the quiet audio."
+    )
 
 # Upload audio files
 uploaded_files = st.file_uploader(
@@ -29,54 +73,126 @@ uploaded_files = st.file_uploader(
     accept_multiple_files=True
 )
 
+# Transcripts are kept for the session, keyed by upload and settings
+transcripts = IncrementalStore.for_session(st.session_state, "audio")
+transcript_params = (
+    model_size, backend, long_audio_mode, skip_silence,
+    (chunk_minutes, overlap_seconds) if long_audio_mode else None,
+    vad_margin_db if skip_silence else None,
+)
+
 if uploaded_files:
+    transcripts.retain([transcripts.key(f, transcript_params) for f in uploaded_files])
     total_files = len(uploaded_files)
     progress_bar = st.progress(0)
     for idx, uploaded_file in enumerate(uploaded_files):
         st.write(f"Processing file: {uploaded_file.name}")
-        # Save the uploaded file temporarily
-        with open(uploaded_file.name, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
         try:
-            # Transcribe the audio file
-            result = model.transcribe(uploaded_file.name)
-            
+            # Uploads already transcribed with these settings are not run again
+            key = transcripts.key(uploaded_file, transcript_params)
+            cache_key = result_cache.key(
+                transcripts.digest(uploaded_file), "audio", backend, transcript_params
+            )
+            if key in transcripts:
+                result = transcripts.get(key)
+            elif (cached := result_cache.get_json(cache_key)) is not None:
+                # Same audio and settings were transcribed before; use the on-disk cache
+                result = cached
+                transcripts.put(key, result)
+            else:
+                # Decode the upload straight from memory, then transcribe; the
+                # stage timings also go to the diagnostics page
+                with metrics.job("audio", backend=backend, model=model_size) as job:
+                    job.add_bytes(uploaded_file.size)
+                    with job.span("decode"):
+                        audio = transcription.decode_audio(
+                            uploaded_file.getvalue(), suffix=os.path.splitext(uploaded_file.name)[1]
+                        )
+                    total_seconds = len(audio) / transcription.SAMPLE_RATE
+
+                    # Transcribe the audio file
+                    if skip_silence:
+                        with job.span("vad"):
+                            regions = transcription.detect_speech(audio, margin_db=vad_margin_db)
+                            audio, compact_starts = transcription.compact_regions(audio, regions)
+
+                    inference_start = time.perf_counter()
+                    if skip_silence and len(audio) == 0:
+                        result = {"text": "", "segments": []}
+                    elif long_audio_mode:
+                        chunk_progress = st.progress(0)
+                        partial_text = st.empty()
+
+                        def show_partial(done, total, partial):
+                            chunk_progress.progress(done / total)
+                            partial_text.text(partial["text"])
+
+                        result = transcription.transcribe_long_audio(
+                            model, model_size, audio,
+                            window_seconds=chunk_minutes * 60,
+                            overlap_seconds=overlap_seconds,
+                            workers=int(workers),
+                            on_chunk=show_partial,
+                            backend=backend,
+                            **transcribe_options,
+                        )
+                        partial_text.empty()
+                    else:
+                        result = model.transcribe(audio, **transcribe_options)
+                    inference_seconds = time.perf_counter() - inference_start
+                    job.record("inference", inference_seconds)
+                    whisper_models.real_time_factors.record(
+                        backend, model_size, len(audio) / transcription.SAMPLE_RATE, inference_seconds
+                    )
+
+                    if skip_silence:
+                        result["segments"] = transcription.remap_segments(
+                            result["segments"], regions, compact_starts
+                        )
+                        kept_seconds = len(audio) / transcription.SAMPLE_RATE
+                        skipped_seconds = total_seconds - kept_seconds
+                        # Inference time grows roughly linearly with audio length
+                        saved_seconds = inference_seconds * skipped_seconds / kept_seconds if kept_seconds else 0.0
+                        st.info(
+                            f"Voice-activity filter skipped {skipped_seconds:.1f} s of "
+                            f"{total_seconds:.1f} s ({skipped_seconds / total_seconds:.0%}) in "
+                            f"{len(regions)} speech regions, saving about {saved_seconds:.1f} s of inference."
+                            if total_seconds else "The audio file is empty."
+                        )
+                    transcripts.put(key, result)
+                    with job.span("cache_write"):
+                        result_cache.put_json(cache_key, result)
+
             # Display the transcription
             st.write(f"**Transcription of {uploaded_file.name}:**")
             st.write(result["text"])
             
-            # Save the transcription to a text file
+            # Offer the transcription for download, served from memory
             today_date = datetime.date.today()
             filename_nofiletype = os.path.splitext(uploaded_file.name)[0]
             txt_file_name = f"{today_date}_{filename_nofiletype}.txt"
-            
-            with open(txt_file_name, "w", encoding="utf-8") as txt_file:
-                txt_file.write(result["text"])
-            
-            st.success(f"Transcription saved as {txt_file_name}")
-            
-            # Offer the text file for download
-            with open(txt_file_name, "rb") as txt_file:
-                st.download_button(
-                    label=f"Download transcription of {uploaded_file.name}",
-                    data=txt_file,
-                    file_name=txt_file_name,
-                    mime="text/plain"
-                )
-            
-            # Clean up the transcription file
-            os.remove(txt_file_name)
-            
+
+            st.download_button(
+                label=f"Download transcription of {uploaded_file.name}",
+                data=result["text"].encode("utf-8"),
+                file_name=txt_file_name,
+                mime="text/plain",
+                key=f"download_{idx}"
+            )
+
         except Exception as e:
             st.error(f"An error occurred while processing {uploaded_file.name}: {e}")
-        
-        finally:
-            # Remove the temporary audio file
-            os.remove(uploaded_file.name)
-        
+
         # Update the progress bar
         progress = (idx + 1) / total_files
         progress_bar.progress(progress)
+    st.caption(result_cache.summary("audio"))
 else:
     st.info("Please upload audio files to transcribe.")
+
+# Measured speed of every backend and model size used on this server
+rtf_rows = whisper_models.real_time_factors.rows()
+if rtf_rows:
+    st.subheader("Measured real-time factor")
+    st.caption("Inference time divided by audio duration; lower is faster.")
+    st.table(rtf_rows)
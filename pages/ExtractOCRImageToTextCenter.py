@@ -1,10 +1,9 @@
 import streamlit as st
-import pytesseract
-from PIL import Image
 
-# Configure the path to the Tesseract executable
-tesseract_path = r"C:/Program Files/Tesseract-OCR/tesseract.exe"
-pytesseract.pytesseract.tesseract_cmd = tesseract_path
+from core import ocr, parallel
+from core.incremental import IncrementalStore
+from core.metrics import metrics
+from core.result_cache import result_cache
 
 st.title("OCR Text Extraction from Images")
 
@@ -13,34 +12,166 @@ if 'uploader_key' not in st.session_state:
     st.session_state.uploader_key = 0
 if 'total_text' not in st.session_state:
     st.session_state.total_text = ""
+ocr_results = IncrementalStore.for_session(st.session_state, "ocr")
 
 # Add a button to clear all previous inputs
 if st.button("Clear All"):
     st.session_state.uploader_key += 1  # Increment to reset the uploader
     st.session_state.total_text = ""    # Clear the extracted text
+    ocr_results.clear()                 # Forget the OCR results of earlier uploads
 
-# Allow the user to upload multiple image files
+# Allow the user to upload multiple image files and scanned documents
 uploaded_files = st.file_uploader(
-    "Upload Images (PNG, JPG, JPEG)",
-    type=["png", "jpg", "jpeg"],
+    "Upload Images (PNG, JPG, JPEG) or scanned documents (PDF, TIFF)",
+    type=["png", "jpg", "jpeg"] + ocr.DOCUMENT_TYPES,
     accept_multiple_files=True,
     key=f"file_uploader_{st.session_state.uploader_key}"
 )
 
+# Number of images OCR'd at the same time (capped for the whole server)
+workers = st.number_input(
+    "Parallel OCR workers:", min_value=1, max_value=parallel.MAX_WORKERS,
+    value=min(4, parallel.MAX_WORKERS)
+)
+
+# Resolution at which PDF pages are rendered for OCR
+render_dpi = st.number_input("PDF render DPI:", min_value=72, max_value=600, value=300, step=50)
+
+# Image preprocessing before Tesseract
+preset_name = st.selectbox("Preprocessing preset:", list(ocr.PRESETS.keys()), index=2)
+preset = dict(ocr.PRESETS[preset_name])
+with st.expander("Customize preprocessing"):
+    preset["grayscale"] = st.checkbox("Convert to grayscale", value=preset.get("grayscale", False))
+    preset["target_dpi"] = st.number_input(
+        "Target DPI (0 keeps the source DPI):", min_value=0, max_value=1200,
+        value=preset.get("target_dpi") or 0, step=50
+    ) or None
+    preset["max_dimension"] = st.number_input(
+        "Maximum width/height in pixels (0 for no limit):", min_value=0, max_value=20000,
+        value=preset.get("max_dimension") or 0, step=500
+    ) or None
+    preset["deskew"] = st.checkbox("Deskew", value=preset.get("deskew", False))
+    preset["binarize"] = st.checkbox("Binarise (Otsu threshold)", value=preset.get("binarize", False))
+
 if uploaded_files:
-    total_text = ""
-    for uploaded_file in uploaded_files:
-        # Open the image file
-        image = Image.open(uploaded_file)
+    # Only images that are new, changed or need a different preset are OCR'd;
+    # the rest come from this session's earlier runs
+    keys = [ocr_results.key(uploaded_file, (render_dpi, sorted(preset.items()))) for uploaded_file in uploaded_files]
+    ocr_results.retain(keys)
+
+    # Images OCR'd before (by content, preset and language) come from the
+    # on-disk cache
+    cache_keys = [
+        result_cache.key(ocr_results.digest(uploaded_file), "ocr", "tesseract",
+                         {"lang": "eng", "preset": preset, "render_dpi": render_dpi})
+        for uploaded_file in uploaded_files
+    ]
+    for key, cache_key in zip(keys, cache_keys):
+        if key not in ocr_results:
+            cached = result_cache.get_json(cache_key)
+            if cached is not None:
+                ocr_results.put(key, (cached["text"], cached["timings"]))
+    pending = [idx for idx, key in enumerate(keys) if key not in ocr_results]
+
+    texts = [None] * len(uploaded_files)
+    for idx, key in enumerate(keys):
+        if key in ocr_results:
+            texts[idx] = f"Text from {uploaded_files[idx].name}:\n{ocr_results.get(key)[0]}\n\n"
+
+    if pending:
+        # Documents are split into pages that are rendered one at a time and
+        # fed straight into OCR, so only the pages in flight are in memory. A
+        # document that cannot be read is reported and skipped, like a page
+        # that fails OCR, without stopping the other uploads
+        page_counts = {}
+        for idx in pending:
+            try:
+                page_counts[idx] = ocr.document_page_count(uploaded_files[idx].getvalue(), uploaded_files[idx].name)
+            except Exception as e:
+                st.error(f"Error reading {uploaded_files[idx].name}: {e}")
+                texts[idx] = f"Text from {uploaded_files[idx].name}:\n\n\n"
+        pending = [idx for idx in pending if idx in page_counts]
+        page_texts = {idx: [None] * page_counts[idx] for idx in pending}
+        page_timings = {idx: {} for idx in pending}
+        failed = set()
+        page_refs = []  # OCR item index -> (upload index, page index)
+
+        def pending_pages():
+            for idx in pending:
+                pages = ocr.iter_document_pages(
+                    uploaded_files[idx].getvalue(), uploaded_files[idx].name,
+                    dpi=render_dpi, gray=preset.get("grayscale", False)
+                )
+                read = 0
+                try:
+                    for page in pages:
+                        page_refs.append((idx, read))
+                        read += 1
+                        yield page
+                except Exception as e:
+                    st.error(f"Error reading {uploaded_files[idx].name} (page {read + 1}): {e}")
+                    failed.add(idx)
 
-        # Convert the image to RGB (if necessary)
-        image = image.convert("RGB")
+        total_pages = sum(page_counts.values())
+        progress_bar = st.progress(0)
+        live_output = st.empty()
+        completed = 0
 
-        # Extract text from the image using Tesseract OCR
-        text = pytesseract.image_to_string(image, lang="eng")
+        # Extract text from the new pages using Tesseract OCR, several at a time;
+        # the per-page stage timings also go to the diagnostics page
+        with metrics.job("ocr", preset=preset_name, files=len(pending), pages=total_pages) as job:
+            job.add_bytes(sum(uploaded_files[idx].size for idx in pending))
+            for item_idx, result, error in ocr.ocr_images(pending_pages(), workers, lang="eng", preset=preset):
+                idx, page_idx = page_refs[item_idx]
+                if error:
+                    st.error(f"Error processing {uploaded_files[idx].name} (page {page_idx + 1}): {error}")
+                    failed.add(idx)
+                    page_texts[idx][page_idx] = ""
+                else:
+                    page_texts[idx][page_idx] = result[0]
+                    for stage, seconds in result[1].items():
+                        page_timings[idx][stage] = page_timings[idx].get(stage, 0.0) + seconds
+                        job.record(stage, seconds)
+                completed += 1
+                progress_bar.progress(completed / total_pages)
 
-        # Append the extracted text
-        total_text += f"Text from {uploaded_file.name}:\n{text}\n\n"
+                # Once every page of an upload is done, keep its text
+                if all(text is not None for text in page_texts[idx]):
+                    text = ocr.join_pages(page_texts[idx])
+                    if idx not in failed:
+                        ocr_results.put(keys[idx], (text, page_timings[idx]))
+                        result_cache.put_json(cache_keys[idx], {"text": text, "timings": page_timings[idx]})
+                    texts[idx] = f"Text from {uploaded_files[idx].name}:\n{text}\n\n"
+
+                    # Show the results finished so far, still in upload order
+                    ready = [t for t in texts if t is not None]
+                    live_output.text("".join(ready))
+        live_output.empty()
+
+        # Documents without any pages produce no OCR results at all, and one
+        # that could not be read to the end keeps the pages OCR'd before that
+        for idx in pending:
+            if texts[idx] is None:
+                text = ocr.join_pages([text or "" for text in page_texts[idx]]) if page_texts[idx] else ""
+                texts[idx] = f"Text from {uploaded_files[idx].name}:\n{text}\n\n"
+
+    stage_seconds = {}
+    for key in keys:
+        if key in ocr_results:
+            for stage, seconds in ocr_results.get(key)[1].items():
+                stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+
+    # Append the extracted text in upload order
+    total_text = "".join(texts)
+
+    # Time spent in each stage, summed over all images
+    if stage_seconds:
+        st.caption(f"Stage timings for preset '{preset_name}' (summed over all pages of {len(uploaded_files)} uploads):")
+        st.table([
+            {"stage": stage, "seconds": round(seconds, 2),
+             "share": f"{seconds / sum(stage_seconds.values()):.0%}"}
+            for stage, seconds in stage_seconds.items()
+        ])
 
     # Store the total_text in session state
     st.session_state.total_text = total_text
@@ -69,5 +200,8 @@ elif st.session_state.total_text:
         mime="text/plain",
     )
 else:
-    st.info("Please upload image files to extract text.")
- 
\ No newline at end of file
+    st.info("Please upload image files or scanned documents to extract text.")
+
+# On-disk result cache statistics
+if uploaded_files:
+    st.caption(result_cache.summary("ocr"))
@@ -1,7 +1,12 @@
 import streamlit as st
-import pandas as pd
-import tabula
-import io
+import functools
+import os
+
+from core import parallel, table_export, tables
+from core.incremental import IncrementalStore
+from core.metrics import metrics
+from core.tables import load_tables, tabula_service
+from core.result_cache import result_cache
 
 st.title("PDF Table Extractor")
 
@@ -21,29 +26,46 @@ uploaded_files = st.file_uploader(
     accept_multiple_files=True
 )
 
+# Tables are read once per upload and kept for the session
+extracted_tables = IncrementalStore.for_session(st.session_state, "table_sheet")
+
+# Table extraction engine
+col1, col2 = st.columns(2)
+engine = col1.selectbox(
+    "Table extraction engine:", list(tables.ENGINES.keys()),
+    format_func=lambda name: tables.ENGINES[name]
+)
+workers = col2.number_input(
+    "Worker processes (pdfplumber engine):", min_value=1, max_value=parallel.MAX_WORKERS,
+    value=min(4, parallel.MAX_WORKERS)
+)
+
 if uploaded_files:
-    # Create a Pandas Excel writer using XlsxWriter as the engine.
-    output = io.BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
+    keys = [extracted_tables.key(uploaded_file, engine) for uploaded_file in uploaded_files]
+    extracted_tables.retain(keys)
+
+    # Read the tables of all new uploads in one batch, so the Java VM is
+    # started at most once instead of once per file
+    try:
+        with st.spinner(f"Reading tables with {tables.ENGINES[engine]}..."):
+            errors = load_tables(uploaded_files, keys, extracted_tables, engine, int(workers))
+    except Exception as e:
+        st.error(f"An error occurred while reading tables: {e}")
+        errors = {}
 
-    for uploaded_file in uploaded_files:
+    # Collect the tables of every PDF; nothing is concatenated yet
+    pdf_tables = []
+    for file_idx, (uploaded_file, key) in enumerate(zip(uploaded_files, keys)):
         try:
             st.write(f"Processing file: {uploaded_file.name}")
+            if file_idx in errors:
+                raise errors[file_idx]
+            if key not in extracted_tables:
+                continue
 
-            # Read tables from PDF
-            dfs = tabula.read_pdf(uploaded_file, pages='all', multiple_tables=True)
-
+            dfs = extracted_tables.get(key)
             if dfs:
-                # Concatenate all tables from the PDF into a single DataFrame
-                combined_df = pd.DataFrame()
-                for idx, df in enumerate(dfs):
-                    df['Table_Number'] = idx + 1  # Add a column to indicate table number
-                    combined_df = pd.concat([combined_df, df], ignore_index=True)
-
-                # Write the DataFrame to a sheet named after the PDF file
-                # Sheet names can't be longer than 31 characters
-                sheet_name = uploaded_file.name[:31]
-                combined_df.to_excel(writer, sheet_name=sheet_name, index=False)
+                pdf_tables.append((uploaded_file.name, dfs))
                 st.success(f"Extracted tables from {uploaded_file.name}")
             else:
                 st.warning(f"No tables found in {uploaded_file.name}")
@@ -51,16 +73,75 @@ if uploaded_files:
         except Exception as e:
             st.error(f"An error occurred while processing {uploaded_file.name}: {e}")
 
-    # Save the Excel file
-    writer.save()
-    processed_data = output.getvalue()
-
-    # Offer the Excel file for download
-    st.download_button(
-        label="Download Excel file with extracted tables",
-        data=processed_data,
-        file_name="extracted_tables.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    if pdf_tables:
+        # Build the output in a spooled file; each PDF's tables are combined
+        # in one concat only when its sheet is written, and the rows are
+        # streamed to the workbook
+        output_format = st.selectbox(
+            "Output format:", list(table_export.OUTPUT_FORMATS.keys()),
+            format_func=lambda name: table_export.OUTPUT_FORMATS[name]
+        )
+        output = parallel.spooled_file()
+        with metrics.job("tables_export", format=output_format) as job:
+
+            def combined_sheets():
+                for name, dfs in pdf_tables:
+                    with job.span("concat"):
+                        combined = table_export.combine_tables(dfs)
+                    yield name, combined
+
+            with job.span("serialize"):
+                if output_format == "xlsx":
+                    # One sheet per PDF file, named after it
+                    table_export.write_xlsx(combined_sheets(), output)
+                    file_name = "extracted_tables.xlsx"
+                elif output_format == "csv_zip":
+                    table_export.write_csv_zip(
+                        ((f"{os.path.splitext(name)[0]}_table{idx + 1}", df)
+                         for name, dfs in pdf_tables for idx, df in enumerate(dfs)),
+                        output
+                    )
+                    file_name = "extracted_tables.zip"
+                else:
+                    table_export.write_parquet(
+                        [(name, df.attrs.get("page"), idx + 1, df)
+                         for name, dfs in pdf_tables for idx, df in enumerate(dfs)],
+                        output
+                    )
+                    file_name = "extracted_tables.parquet"
+            output.seek(0, os.SEEK_END)
+            job.add_bytes(output.tell())
+            output.seek(0)
+
+        # Offer the file for download; it is read only when the button is
+        # clicked, and the click does not rerun the page
+        st.download_button(
+            label="Download extracted tables",
+            data=functools.partial(parallel.read_spooled, output),
+            file_name=file_name,
+            mime=table_export.MIME_TYPES[output_format],
+            on_click="ignore",
+        )
 else:
     st.info("Please upload PDF files to extract tables.")
+
+# Run both engines over the uploads and show the results side by side. Only
+# on request: it re-reads every file with every engine (and starts the JVM),
+# bypassing the caches. The result is kept until the uploads change.
+if uploaded_files:
+    comparison_key = (tuple(extracted_tables.digest(f) for f in uploaded_files), int(workers))
+    if st.button("Compare engines (time and table count side by side)"):
+        with st.spinner("Comparing table extraction engines..."):
+            st.session_state.table_sheet_comparison = (comparison_key, tables.compare_engines(
+                [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files],
+                int(workers)
+            ))
+    comparison = st.session_state.get("table_sheet_comparison")
+    if comparison is not None and comparison[0] == comparison_key:
+        st.subheader("Engine comparison")
+        st.table(comparison[1])
+
+# On-disk result cache and JVM statistics
+if uploaded_files:
+    st.caption(result_cache.summary("tables"))
+    st.caption(tabula_service.summary())
@@ -1,29 +1,27 @@
 import streamlit as st
-import pandas as pd
-import tabula.io
-from tabula.io import read_pdf
+import functools
 import os
-import tempfile
-from io import BytesIO
 
-from pathlib import Path
-from docxtpl import DocxTemplate
-from tqdm import tqdm
-import shutil
-import send2trash
+from core import parallel, table_export, tables
+from core.incremental import IncrementalStore
+from core.metrics import metrics
+from core.result_cache import result_cache
+from core.tables import load_tables, tabula_service
 
 st.title("Extract Tables from PDF Files")
 
 # Initialize session state variables if they don't exist
 if 'uploader_key' not in st.session_state:
     st.session_state.uploader_key = 0
-if 'excel_data' not in st.session_state:
-    st.session_state.excel_data = None
+if 'table_export' not in st.session_state:
+    st.session_state.table_export = None
+extracted_tables = IncrementalStore.for_session(st.session_state, "tables_excel")
 
 # Add a button to clear all previous inputs
 if st.button("Clear All"):
     st.session_state.uploader_key += 1  # Increment to reset the uploader
-    st.session_state.excel_data = None  # Clear the Excel data
+    st.session_state.table_export = None  # Clear the exported file
+    extracted_tables.clear()              # Forget the tables read earlier
 
 # Allow the user to upload multiple PDF files
 uploaded_files = st.file_uploader(
@@ -33,54 +31,107 @@ uploaded_files = st.file_uploader(
     key=f"file_uploader_{st.session_state.uploader_key}"
 )
 
+# Table extraction engine
+col1, col2 = st.columns(2)
+engine = col1.selectbox(
+    "Table extraction engine:", list(tables.ENGINES.keys()),
+    format_func=lambda name: tables.ENGINES[name]
+)
+workers = col2.number_input(
+    "Worker processes (pdfplumber engine):", min_value=1, max_value=parallel.MAX_WORKERS,
+    value=min(4, parallel.MAX_WORKERS)
+)
+
+# Output format for the extracted tables
+output_format = st.selectbox(
+    "Output format:", list(table_export.OUTPUT_FORMATS.keys()),
+    format_func=lambda name: table_export.OUTPUT_FORMATS[name]
+)
+
 if uploaded_files:
+    # Only uploads not seen before in this session are sent to the engine
+    keys = [extracted_tables.key(uploaded_file, engine) for uploaded_file in uploaded_files]
+    extracted_tables.retain(keys)
+
     with st.spinner("Processing PDF files..."):
-        # A dictionary to store DataFrames and sheet names
-        excel_sheets = {}
-        for uploaded_file in uploaded_files:
-            # Save the uploaded file to a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-                temp_file.write(uploaded_file.read())
-                temp_file_path = temp_file.name
-
-            # Read tables from the PDF file using tabula
-            try:
-                dfs = tabula.read_pdf(temp_file_path, pages='all', multiple_tables=True)
-                if dfs:
-                    # For each table extracted, add it to the dictionary
-                    for idx, df in enumerate(dfs):
-                        # Clean up the sheet name to be Excel-compatible
-                        base_name = os.path.splitext(uploaded_file.name)[0]
-                        sheet_name = f"{base_name[:20]}_{idx}"
-                        sheet_name = sheet_name.replace(':', '_').replace('/', '_').replace('\\', '_')
-                        excel_sheets[sheet_name] = df
+        # Read the tables of all new uploads in one batch, so the Java VM is
+        # started at most once instead of once per file
+        try:
+            errors = load_tables(uploaded_files, keys, extracted_tables, engine, int(workers))
+        except Exception as e:
+            st.error(f"Error reading tables: {e}")
+            errors = {}
+
+        # A list of (source file, sheet name, DataFrame), one per table
+        extracted = []
+        for file_idx, (uploaded_file, key) in enumerate(zip(uploaded_files, keys)):
+            if file_idx in errors:
+                st.error(f"Error processing {uploaded_file.name}: {errors[file_idx]}")
+                continue
+            if key not in extracted_tables:
+                continue
+
+            dfs = extracted_tables.get(key)
+            if dfs:
+                # One sheet per table, named after the PDF file and table index
+                base_name = os.path.splitext(uploaded_file.name)[0]
+                for idx, df in enumerate(dfs):
+                    extracted.append((uploaded_file.name, f"{base_name[:20]}_{idx}", df))
+            else:
+                st.warning(f"No tables found in {uploaded_file.name}")
+
+        if extracted:
+            # Stream all tables into a spooled output file
+            output = parallel.spooled_file()
+            with metrics.job("tables_export", format=output_format) as job, job.span("serialize"):
+                if output_format == "xlsx":
+                    table_export.write_xlsx(((name, df) for _, name, df in extracted), output)
+                    file_name = "extracted_tables.xlsx"
+                elif output_format == "csv_zip":
+                    table_export.write_csv_zip(((name, df) for _, name, df in extracted), output)
+                    file_name = "extracted_tables.zip"
                 else:
-                    st.warning(f"No tables found in {uploaded_file.name}")
-            except Exception as e:
-                st.error(f"Error processing {uploaded_file.name}: {e}")
-            finally:
-                # Delete the temporary file
-                os.remove(temp_file_path)
-
-        if excel_sheets:
-            # Save all DataFrames to an Excel file in memory
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                for sheet_name, df in excel_sheets.items():
-                    # Limit sheet_name to 31 characters for Excel compatibility
-                    sheet_name = sheet_name[:31]
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
-                writer.save()
-                st.session_state.excel_data = output.getvalue()
+                    numbers = {}
+                    rows = []
+                    for source, _, df in extracted:
+                        numbers[source] = numbers.get(source, 0) + 1
+                        rows.append((source, df.attrs.get("page"), numbers[source], df))
+                    table_export.write_parquet(rows, output)
+                    file_name = "extracted_tables.parquet"
+            st.session_state.table_export = (output, file_name, table_export.MIME_TYPES[output_format])
 
         else:
             st.info("No tables extracted from the uploaded PDF files.")
 
-# Provide a download button if Excel data is available
-if st.session_state.excel_data:
+# Provide a download button if an exported file is available. The file is
+# read only when the button is clicked, and the click does not rerun the page.
+if st.session_state.table_export:
+    output, file_name, mime = st.session_state.table_export
     st.download_button(
-        label="Download Extracted Tables as Excel",
-        data=st.session_state.excel_data,
-        file_name="extracted_tables.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        label="Download Extracted Tables",
+        data=functools.partial(parallel.read_spooled, output),
+        file_name=file_name,
+        mime=mime,
+        on_click="ignore",
     )
+
+# Run both engines over the uploads and show the results side by side. Only
+# on request: it re-reads every file with every engine (and starts the JVM),
+# bypassing the caches. The result is kept until the uploads change.
+if uploaded_files:
+    comparison_key = (tuple(extracted_tables.digest(f) for f in uploaded_files), int(workers))
+    if st.button("Compare engines (time and table count side by side)"):
+        with st.spinner("Comparing table extraction engines..."):
+            st.session_state.tables_excel_comparison = (comparison_key, tables.compare_engines(
+                [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files],
+                int(workers)
+            ))
+    comparison = st.session_state.get("tables_excel_comparison")
+    if comparison is not None and comparison[0] == comparison_key:
+        st.subheader("Engine comparison")
+        st.table(comparison[1])
+
+# On-disk result cache and JVM statistics
+if uploaded_files:
+    st.caption(result_cache.summary("tables"))
+    st.caption(tabula_service.summary())
@@ -1,57 +1,25 @@
 import streamlit as st
+import functools
 import os
-import fitz  # PyMuPDF
-import io
-from pathlib import Path
-from PIL import Image
-import zipfile
+
+from core import parallel, pdf_images
+from core.incremental import IncrementalStore
+from core.metrics import metrics
 
 st.title("PDF Image Extractor")
 
 st.write("""
-This app extracts all images from selected PDF files and saves them into new subfolders.
+This app extracts all images from selected PDF files into a ZIP file, with one folder per PDF.
 
 - **Upload** one or more PDF files.
 - The app **extracts all images** from each PDF.
-- Images are saved in a **new subfolder** named after the PDF file.
+- Images are placed in a **folder** of the ZIP named after the PDF file.
 - Each image file is named with the **PDF file name**, **page number**, and **image number**.
+- Images are saved in the format stored in the PDF, and an image repeated on many pages is saved once.
 
-**Note:** Ensure that `PyMuPDF` and `Pillow` are installed in your Python environment.
+**Note:** Ensure that `PyMuPDF` is installed in your Python environment.
 """)
 
-# Function to extract images from a PDF file
-def extract_images_from_pdf(pdf_file, output_dir):
-    pdf_name = os.path.splitext(pdf_file.name)[0]
-    pdf_data = pdf_file.read()
-    pdf_stream = io.BytesIO(pdf_data)
-    pdf_doc = fitz.open(stream=pdf_stream, filetype='pdf')
-    total_pages = len(pdf_doc)
-    
-    # Create a subfolder for the images
-    images_folder_name = pdf_name.replace(' ', '_')
-    images_folder_path = os.path.join(output_dir, images_folder_name)
-    if not os.path.exists(images_folder_path):
-        os.makedirs(images_folder_path)
-    
-    image_count = 0
-    for page_index in range(total_pages):
-        page = pdf_doc.load_page(page_index)
-        image_list = page.get_images(full=True)
-        if image_list:
-            for img_index, img in enumerate(image_list, start=1):
-                xref = img[0]
-                base_image = pdf_doc.extract_image(xref)
-                image_bytes = base_image['image']
-                image_ext = base_image['ext']
-                image = Image.open(io.BytesIO(image_bytes))
-                # Create image file name
-                image_filename = f"{pdf_name}_page{page_index+1}_img{img_index}.{image_ext}"
-                image_filepath = os.path.join(images_folder_path, image_filename)
-                # Save the image
-                image.save(image_filepath)
-                image_count += 1
-    return images_folder_path, image_count
-
 # Main app
 uploaded_files = st.file_uploader(
     "Upload PDF files to extract images:",
@@ -59,46 +27,96 @@ uploaded_files = st.file_uploader(
     accept_multiple_files=True
 )
 
+# Extraction options
+dedupe = st.checkbox("Save repeated images only once", value=True)
+col1, col2 = st.columns(2)
+min_side = col1.number_input(
+    "Skip images smaller than (pixels, 0 keeps all):", min_value=0, value=0, step=8
+)
+workers = col2.number_input(
+    "Worker processes:", min_value=1, max_value=parallel.MAX_WORKERS,
+    value=min(4, parallel.MAX_WORKERS)
+)
+
+# Images are extracted once per upload and kept for the session
+extracted_pdfs = IncrementalStore.for_session(st.session_state, "images")
+
 if uploaded_files:
-    # Create a temporary directory to store images
-    output_dir = "extracted_images"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
+    params = {"dedupe": dedupe, "min_side": int(min_side)}
+    keys = [extracted_pdfs.key(pdf_file, params) for pdf_file in uploaded_files]
+    extracted_pdfs.retain(keys)
+
+    # Extract the PDFs not seen before together, with one progress bar each
+    missing = [idx for idx, key in enumerate(keys) if key not in extracted_pdfs]
+    errors = {}
+    if missing:
+        documents = []
+        progress_bars = []
+        for idx in missing:
+            pdf_name = os.path.splitext(uploaded_files[idx].name)[0]
+            # The images go into a folder of the ZIP named after the PDF file
+            documents.append((pdf_name, pdf_name.replace(' ', '_'), uploaded_files[idx].getvalue()))
+            progress_bars.append(st.progress(0, text=f"Extracting images from {uploaded_files[idx].name}"))
+
+        def show_progress(doc_index, pages_done, total_pages):
+            progress_bars[doc_index].progress(
+                pages_done / total_pages,
+                text=f"{uploaded_files[missing[doc_index]].name}: page {pages_done} of {total_pages}"
+            )
+
+        with metrics.job("images", files=len(documents), workers=int(workers)) as job:
+            job.add_bytes(sum(len(data) for _, _, data in documents))
+            with job.span("extract"):
+                results = pdf_images.extract_documents(
+                    documents, dedupe, int(min_side), int(workers), on_progress=show_progress
+                )
+        for idx, progress_bar, result in zip(missing, progress_bars, results):
+            progress_bar.empty()
+            if isinstance(result, Exception):
+                errors[idx] = result
+            else:
+                extracted_pdfs.put(keys[idx], result)
+
     total_images_extracted = 0
-    folders_created = []
+    archives = []
+    report = pdf_images.new_report()
     
-    for pdf_file in uploaded_files:
+    for idx, (pdf_file, key) in enumerate(zip(uploaded_files, keys)):
         st.write(f"Processing file: {pdf_file.name}")
-        try:
-            images_folder_path, image_count = extract_images_from_pdf(pdf_file, output_dir)
-            total_images_extracted += image_count
-            folders_created.append(images_folder_path)
-            st.success(f"Extracted {image_count} images from {pdf_file.name}")
-        except Exception as e:
-            st.error(f"An error occurred while processing {pdf_file.name}: {e}")
+        if idx in errors:
+            st.error(f"An error occurred while processing {pdf_file.name}: {errors[idx]}")
+            continue
+        archive_file, image_count, file_report = extracted_pdfs.get(key)
+        pdf_images.merge_reports(report, file_report)
+        total_images_extracted += image_count
+        if image_count:
+            archives.append((key, archive_file))
+        st.success(f"Extracted {image_count} images from {pdf_file.name}")
     
+    st.caption(pdf_images.summary(report))
+
     if total_images_extracted > 0:
-        # Create a zip file of the output directory
-        zip_filename = "extracted_images.zip"
-        zip_path = os.path.join(output_dir, zip_filename)
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for folder in folders_created:
-                for root, dirs, files in os.walk(folder):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, output_dir)
-                        zipf.write(file_path, arcname)
+        # Combine the per-file archives into one ZIP, only when the set of
+        # files changed; the previous one is closed, which deletes it
+        archive_keys = [key for key, _ in archives]
+        combined = st.session_state.get("images_zip")
+        if combined is None or combined[0] != archive_keys:
+            if combined is not None:
+                combined[1].close()
+            with metrics.job("images_zip", files=len(archives)) as job, job.span("serialize"):
+                zip_file = pdf_images.combine_zips([f for _, f in archives], parallel.spooled_file())
+            st.session_state.images_zip = (archive_keys, zip_file)
+        zip_file = st.session_state.images_zip[1]
         
-        # Provide download link for the zip file
-        with open(zip_path, "rb") as f:
-            bytes_data = f.read()
-            st.download_button(
-                label="Download All Extracted Images as ZIP",
-                data=bytes_data,
-                file_name=zip_filename,
-                mime="application/zip"
-            )
+        # Provide download link for the zip file; it is read only when the
+        # button is clicked, and the click does not rerun the page
+        st.download_button(
+            label="Download All Extracted Images as ZIP",
+            data=functools.partial(parallel.read_spooled, zip_file),
+            file_name="extracted_images.zip",
+            mime="application/zip",
+            on_click="ignore",
+        )
     else:
         st.warning("No images were extracted from the uploaded PDF files.")
 else:
@@ -1,22 +1,25 @@
 import streamlit as st
-import pandas as pd
-import pdfplumber
-from docx import Document
-from io import StringIO
-import re
+
+from core import parallel, pdf_text
+from core.text_spool import TextSpool, MERGED_SPOOL_MB
+from core.incremental import IncrementalStore
+from core.metrics import metrics
+from core.result_cache import result_cache
 
 st.title("Extract and Merge Text from Files")
 
 # Initialize session state variables if they don't exist
 if 'uploader_key' not in st.session_state:
     st.session_state.uploader_key = 0
-if 'merged_text' not in st.session_state:
-    st.session_state.merged_text = ""
+if 'merged_output' not in st.session_state:
+    st.session_state.merged_output = None
+raw_texts = IncrementalStore.for_session(st.session_state, "text")
 
 # Add a button to clear all previous inputs
 if st.button("Clear All"):
     st.session_state.uploader_key += 1  # Increment to reset the uploader
-    st.session_state.merged_text = ""   # Clear the merged text
+    st.session_state.merged_output = None  # Clear the merged text
+    raw_texts.clear()                      # Forget the text extracted earlier
 
 # Allow the user to upload multiple files
 uploaded_files = st.file_uploader(
@@ -26,65 +29,144 @@ uploaded_files = st.file_uploader(
     key=f"file_uploader_{st.session_state.uploader_key}"
 )
 
+# PDF text extraction engine and page-level parallelism for large PDFs
+col1, col2 = st.columns(2)
+engine = col1.selectbox(
+    "PDF extraction engine:", list(pdf_text.ENGINES.keys()),
+    format_func=lambda name: pdf_text.ENGINES[name]
+)
+workers = col2.number_input(
+    "Worker processes for large PDFs:", min_value=1, max_value=parallel.MAX_WORKERS,
+    value=min(4, parallel.MAX_WORKERS)
+)
+
+# Pages without a text layer (scans) can be rendered and OCR'd instead
+col1, col2 = st.columns(2)
+ocr_scanned = col1.checkbox("OCR scanned pages (pages without a usable text layer)", value=False)
+ocr_dpi = col2.selectbox("OCR render DPI:", [150, 200, 300, 400], index=2) if ocr_scanned else None
+
 # Option to remove extra line breaks
 remove_line_breaks = st.checkbox("Remove extra line breaks", value=False)
 
 if uploaded_files:
-    all_texts = []
-    for uploaded_file in uploaded_files:
+    # Raw text is extracted once per upload and kept for the session; options
+    # such as line-break removal are applied to the kept text on every rerun
+    keys = [raw_texts.key(uploaded_file, (engine, ocr_dpi)) for uploaded_file in uploaded_files]
+    raw_texts.retain(keys)
+
+    # Each file's text is streamed into its own spool (memory up to a small
+    # limit, then a temp file), never held as one big string
+    file_spools = []
+    pdf_pages = 0
+    pdf_seconds = 0.0
+    for uploaded_file, key in zip(uploaded_files, keys):
         file_type = uploaded_file.type
         file_name = uploaded_file.name.lower()
 
         try:
-            if file_name.endswith('.txt'):
+            # Extra detail for the success message, e.g. how many pages were OCR'd
+            report = ""
+            if key in raw_texts:
+                spool, report = raw_texts.get(key)
+            elif file_name.endswith('.txt'):
                 # Read text from TXT file
-                stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-                text = stringio.read()
+                spool = TextSpool()
+                spool.write(uploaded_file.getvalue().decode("utf-8"))
             elif file_name.endswith('.docx'):
                 # Read text from DOCX file
+                from docx import Document
                 doc = Document(uploaded_file)
-                text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
+                spool = TextSpool()
+                for idx, paragraph in enumerate(doc.paragraphs):
+                    spool.write(('\n' if idx else '') + paragraph.text)
             elif file_name.endswith('.pdf'):
-                # Read text from PDF file
-                text = ""
-                with pdfplumber.open(uploaded_file) as pdf:
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + '\n'
+                spool = TextSpool()
+                # PDFs seen before (by content) come from the on-disk cache
+                cache_key = result_cache.key(
+                    raw_texts.digest(uploaded_file), "text", engine, {"ocr_dpi": ocr_dpi}
+                )
+                cached_path = result_cache.get_text_file(cache_key)
+                if cached_path:
+                    with open(cached_path, "rb") as cached_file:
+                        spool.write_file(cached_file)
+                    report = " (from cache)"
+                else:
+                    # Read text from PDF file, page by page, OCR'ing scanned pages
+                    with metrics.job("text", engine=engine, ocr=bool(ocr_dpi)) as job:
+                        job.add_bytes(uploaded_file.size)
+                        with job.span("extract"):
+                            page_count, ocr_pages, seconds = pdf_text.extract_text_to_spool(
+                                uploaded_file.getvalue(), spool, engine, int(workers), ocr_dpi=ocr_dpi
+                            )
+                        with job.span("cache_write"):
+                            result_cache.put_text_file(cache_key, spool.file())
+                    pdf_pages += page_count
+                    pdf_seconds += seconds
+                    if ocr_dpi:
+                        report = f" ({ocr_pages} of {page_count} pages needed OCR)"
             else:
                 st.warning(f"Unsupported file type: {file_name}")
                 continue
+            raw_texts.put(key, (spool, report))
 
-            # Optionally remove extra line breaks
-            if remove_line_breaks:
-                text = re.sub(r'\n+', '\n', text)
-
-            all_texts.append(text)
-            st.success(f"Text extracted from {uploaded_file.name}")
+            file_spools.append(spool)
+            st.success(f"Text extracted from {uploaded_file.name}{report}")
 
         except Exception as e:
             st.error(f"Error processing {uploaded_file.name}: {e}")
 
-    # Merge all texts into a single string
-    if all_texts:
-        merged_text = '\n\n'.join(all_texts)
-        st.session_state.merged_text = merged_text
+    # Extraction speed of the PDFs parsed in this run
+    if pdf_pages and pdf_seconds:
+        st.caption(
+            f"Extracted {pdf_pages} PDF pages in {pdf_seconds:.2f} s "
+            f"({pdf_pages / pdf_seconds:.1f} pages/s with {pdf_text.ENGINES[engine]})."
+        )
+
+    # Merge all texts into a single spooled file, optionally removing extra
+    # line breaks on the way
+    if file_spools:
+        merged_output = TextSpool(max_size=MERGED_SPOOL_MB * 1024 * 1024)
+        with metrics.job("text_merge", files=len(file_spools)) as job, job.span("serialize"):
+            for idx, spool in enumerate(file_spools):
+                if idx:
+                    merged_output.write('\n\n')
+                merged_output.write_spool(spool, collapse_newlines=remove_line_breaks)
+            job.add_bytes(merged_output.size)
+        if st.session_state.merged_output is not None:
+            st.session_state.merged_output.close()
+        st.session_state.merged_output = merged_output
 
     else:
         st.info("No text extracted from the uploaded files.")
 
-# Display the merged text in a text area
-if st.session_state.merged_text:
+# Display the merged text one preview page at a time
+PREVIEW_BYTES = 100_000
+merged_output = st.session_state.merged_output
+if merged_output is not None and merged_output.size:
     st.subheader("Merged Text")
-    st.text_area("Merged Output", st.session_state.merged_text, height=300)
+    preview_pages = (merged_output.size + PREVIEW_BYTES - 1) // PREVIEW_BYTES
+    preview_page = 1
+    if preview_pages > 1:
+        preview_page = st.number_input(
+            f"Preview page (of {preview_pages}, {merged_output.size / 1024 / 1024:.1f} MB in total):",
+            min_value=1, max_value=preview_pages, value=1
+        )
+    st.text_area(
+        "Merged Output",
+        merged_output.read_slice((preview_page - 1) * PREVIEW_BYTES, PREVIEW_BYTES),
+        height=300
+    )
 
-    # Provide a download button for the merged text
+    # Provide a download button for the merged text. The spool is read only
+    # when the button is clicked, and the click does not rerun the page.
     st.download_button(
         label="Download Merged Text",
-        data=st.session_state.merged_text,
+        data=lambda: merged_output.file().read(),
         file_name="merged_text.txt",
         mime="text/plain",
+        on_click="ignore",
     )
 
-
+# On-disk result cache statistics
+if uploaded_files:
+    st.caption(result_cache.summary("text"))
@@ -1,6 +1,8 @@
 import streamlit as st
-from PyPDF2 import PdfMerger
-import io
+import functools
+
+from core import parallel, pdf_merge
+from core.metrics import metrics
 
 st.title("PDF Merger")
 
@@ -11,7 +13,7 @@ This app merges selected PDF files into a single PDF file.
 - Select the files you want to merge.
 - Download the merged PDF file.
 
-**Note:** Ensure that `PyPDF2` is installed in your Python environment.
+**Note:** Ensure that `PyMuPDF` (and `PyPDF2` for the PyPDF2 engine) is installed in your Python environment.
 """)
 
 # Upload multiple PDF files
@@ -29,31 +31,36 @@ if uploaded_files:
         if st.checkbox(file.name, key=file.name):
             file_selection.append(file)
     
+    # Merge engine; PyMuPDF can also drop fonts and images repeated across the files
+    col1, col2 = st.columns(2)
+    engine = col1.selectbox(
+        "Merge engine:", list(pdf_merge.ENGINES.keys()),
+        format_func=lambda name: pdf_merge.ENGINES[name]
+    )
+    dedupe = col2.checkbox("Remove duplicate fonts and images", value=True, disabled=engine != "fitz")
+    
     if file_selection:
         # Button to trigger the merge
         if st.button("Merge PDFs"):
-            merger = PdfMerger()
             try:
-                for pdf_file in file_selection:
-                    # Read the PDF file
-                    pdf_bytes = pdf_file.read()
-                    pdf_stream = io.BytesIO(pdf_bytes)
-                    merger.append(pdf_stream)
-                
-                # Write out the merged PDF
-                merged_pdf = io.BytesIO()
-                merger.write(merged_pdf)
-                merger.close()
-                merged_pdf.seek(0)
+                # Write out the merged PDF to a spooled file (on disk when large)
+                merged_pdf = parallel.spooled_file()
+                with metrics.job("merge", engine=engine, files=len(file_selection)) as job:
+                    with job.span("merge"):
+                        report = pdf_merge.merge_pdfs(file_selection, merged_pdf, engine, dedupe)
+                    job.add_bytes(report["input_bytes"])
                 
                 st.success("PDF files merged successfully!")
+                st.caption(pdf_merge.summary(report))
                 
-                # Provide download button
+                # Provide download button; the merged PDF is read only when
+                # it is clicked, and the click does not rerun the page
                 st.download_button(
                     label="Download Merged PDF",
-                    data=merged_pdf,
+                    data=functools.partial(parallel.read_spooled, merged_pdf),
                     file_name="merged.pdf",
-                    mime="application/pdf"
+                    mime="application/pdf",
+                    on_click="ignore",
                 )
             except Exception as e:
                 st.error(f"An error occurred while merging PDFs: {e}")
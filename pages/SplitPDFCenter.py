@@ -1,18 +1,21 @@
 import streamlit as st
-from PyPDF2 import PdfReader, PdfWriter
-import io
+import functools
+import os
+
+from core import parallel, pdf_split, pdf_text
+from core.metrics import metrics
 
 st.title("PDF Splitter")
 
 st.write("""
-This app splits a selected PDF file into one or more PDF files based on the page ranges you specify.
+This app splits a selected PDF file into one or more PDF files, based on the page ranges you specify
+or automatically: every N pages, by maximum part size, or by the top-level bookmarks.
 
 - Upload a PDF file.
-- Choose how many parts you want to split the PDF into.
-- Specify the page ranges for each part.
-- Download the split PDF files.
+- Choose how to split it; for page ranges, choose the number of parts and the pages of each part.
+- Download the split PDF files as one ZIP file.
 
-**Note:** Ensure that `PyPDF2` is installed in your Python environment.
+**Note:** Ensure that `PyMuPDF` is installed in your Python environment.
 """)
 
 # Upload a single PDF file
@@ -22,81 +25,99 @@ uploaded_file = st.file_uploader(
 )
 
 if uploaded_file:
-    # Read the uploaded PDF file
-    pdf_reader = PdfReader(uploaded_file)
-    total_pages = len(pdf_reader.pages)
+    # Count the pages of the uploaded PDF file
+    pdf_data = uploaded_file.getvalue()
+    total_pages = pdf_text.page_count(pdf_data)
     st.write(f"The uploaded PDF has **{total_pages}** pages.")
 
-    # Input: Number of parts to split into
-    num_parts = st.number_input(
-        "Enter the number of parts you want to split the PDF into:",
-        min_value=1,
-        max_value=total_pages,
-        step=1,
-        value=2
-    )
-
-    if num_parts:
-        # Dynamic input for page ranges
-        page_ranges = []
-        st.write("Specify the page ranges for each part (e.g., 1-3, 4, 5-7):")
-        for i in range(num_parts):
-            page_range = st.text_input(
-                f"Page range for Part {i+1}:", key=f"page_range_{i}"
+    # A PDF without pages has nothing to split (and no valid page inputs)
+    if total_pages == 0:
+        st.warning("The uploaded PDF has no pages to split.")
+    else:
+        # How to split: by hand, or automatically for large documents
+        mode = st.radio(
+            "Split by:", list(pdf_split.MODES.keys()),
+            format_func=lambda name: pdf_split.MODES[name], horizontal=True
+        )
+
+        if mode == "ranges":
+            # Input: Number of parts to split into
+            num_parts = st.number_input(
+                "Enter the number of parts you want to split the PDF into:",
+                min_value=1,
+                max_value=total_pages,
+                step=1,
+                value=min(2, total_pages)
             )
-            page_ranges.append(page_range)
+
+            # Dynamic input for page ranges
+            page_ranges = []
+            st.write("Specify the page ranges for each part (e.g., 1-3, 4, 5-7):")
+            for i in range(num_parts):
+                page_range = st.text_input(
+                    f"Page range for Part {i+1}:", key=f"page_range_{i}"
+                )
+                page_ranges.append(page_range)
+        elif mode == "every_n":
+            pages_per_part = st.number_input(
+                "Pages per part:", min_value=1, max_value=total_pages, step=1, value=min(2, total_pages)
+            )
+        elif mode == "max_size":
+            max_mb = st.number_input("Maximum part size (MB):", min_value=0.1, value=10.0, step=1.0)
+            st.caption("Part sizes are estimated from page contents and images, so parts can come out somewhat larger.")
+
+        workers = st.number_input(
+            "Worker processes:", min_value=1, max_value=parallel.MAX_WORKERS,
+            value=min(4, parallel.MAX_WORKERS)
+        )
 
         # Button to trigger the split
         if st.button("Split PDF"):
-            split_success = True
-            split_files = []
             try:
-                for idx, page_range in enumerate(page_ranges):
-                    if page_range:
-                        # Parse the page range
-                        pages_to_extract = []
-                        ranges = [r.strip() for r in page_range.split(',')]
-                        for r in ranges:
-                            if '-' in r:
-                                start, end = r.split('-')
-                                start = int(start)
-                                end = int(end)
-                                pages_to_extract.extend(range(start, end + 1))
-                            else:
-                                pages_to_extract.append(int(r))
-                        # Adjust page numbers (PyPDF2 uses zero-based indexing)
-                        pages_to_extract = [p - 1 for p in pages_to_extract]
-
-                        # Create a PdfWriter for each split part
-                        pdf_writer = PdfWriter()
-                        for page_num in pages_to_extract:
-                            if 0 <= page_num < total_pages:
-                                pdf_writer.add_page(pdf_reader.pages[page_num])
-                            else:
-                                st.error(f"Page number {page_num + 1} is out of range.")
-                                split_success = False
-                                break
-
-                        if split_success:
-                            # Save the split PDF to a BytesIO object
-                            split_pdf = io.BytesIO()
-                            pdf_writer.write(split_pdf)
-                            split_pdf.seek(0)
-                            split_files.append((f"Part_{idx+1}.pdf", split_pdf))
-                    else:
-                        st.error(f"Please specify a page range for Part {idx+1}.")
-                        split_success = False
-                        break
-
-                if split_success and split_files:
-                    st.success("PDF file split successfully!")
-                    for filename, pdf_file in split_files:
-                        st.download_button(
-                            label=f"Download {filename}",
-                            data=pdf_file,
-                            file_name=filename,
-                            mime="application/pdf"
-                        )
+                with metrics.job("split", mode=mode, workers=int(workers)) as job:
+                    job.add_bytes(len(pdf_data))
+                    # Work out the pages of every part
+                    parts = []
+                    with job.span("plan"):
+                        if mode == "ranges":
+                            for idx, page_range in enumerate(page_ranges):
+                                if not page_range:
+                                    raise ValueError(f"Please specify a page range for Part {idx+1}.")
+                                parts.append((pdf_split.part_file_name(idx + 1),
+                                              pdf_split.parse_page_range(page_range, total_pages)))
+                        elif mode == "every_n":
+                            for idx, pages in enumerate(pdf_split.plan_every_n(total_pages, int(pages_per_part))):
+                                parts.append((pdf_split.part_file_name(idx + 1), pages))
+                        elif mode == "max_size":
+                            for idx, pages in enumerate(pdf_split.plan_max_size(pdf_data, max_mb)):
+                                parts.append((pdf_split.part_file_name(idx + 1), pages))
+                        else:
+                            for idx, (title, pages) in enumerate(pdf_split.plan_bookmarks(pdf_data)):
+                                parts.append((pdf_split.part_file_name(idx + 1, title), pages))
+
+                    # Write the parts in parallel into one ZIP
+                    progress_bar = st.progress(0, text=f"Writing {len(parts)} parts")
+
+                    def show_progress(done, total):
+                        progress_bar.progress(done / total, text=f"Written {done} of {total} parts")
+
+                    split_zip = parallel.spooled_file()
+                    with job.span("write"):
+                        report = pdf_split.split_to_zip(pdf_data, parts, split_zip, int(workers), show_progress)
+                    progress_bar.empty()
+
+                st.success("PDF file split successfully!")
+                st.caption(pdf_split.summary(report))
+                base_name = os.path.splitext(uploaded_file.name)[0]
+                # The ZIP is read only when the button is clicked, and the
+                # click does not rerun the page
+                st.download_button(
+                    label=f"Download all {len(parts)} parts as ZIP",
+                    data=functools.partial(parallel.read_spooled, split_zip),
+                    file_name=f"{base_name}_split.zip",
+                    mime="application/zip",
+                    on_click="ignore",
+                )
             except Exception as e:
                 st.error(f"An error occurred while splitting the PDF: {e}")
 else:
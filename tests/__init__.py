@@ -0,0 +1 @@
+# Tests for the core helpers; run with python -m pytest from the repository root.
@@ -0,0 +1,124 @@
+import json
+import os
+import random
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from benchmarks import corpus
+from core import batch, cli
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    rng = random.Random(0)
+    directory = tmp_path / "in"
+    (directory / "sub").mkdir(parents=True)
+    corpus.make_pdf(str(directory / "a.pdf"), 2, rng)
+    corpus.make_pdf(str(directory / "sub" / "b.pdf"), 3, rng)
+    (directory / "notes.txt").write_text("not a pdf")
+    return str(directory)
+
+
+def _manifest(output_dir):
+    with open(os.path.join(output_dir, batch.MANIFEST_NAME), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_iter_inputs(input_dir):
+    assert list(batch.iter_inputs(input_dir, ["pdf"])) == ["a.pdf", os.path.join("sub", "b.pdf")]
+    assert list(batch.iter_inputs(input_dir, ["PDF"], recursive=False)) == ["a.pdf"]
+
+
+def test_extract_text_file(input_dir, tmp_path):
+    output_path = str(tmp_path / "a.txt")
+    details = batch.extract_text_file(os.path.join(input_dir, "a.pdf"), output_path)
+    assert details["pages"] == 2
+    with open(output_path, encoding="utf-8") as f:
+        assert len(f.read().split()) > 20
+    assert not os.path.exists(output_path + ".partial")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_text_batch_and_resume(input_dir, tmp_path, workers):
+    output_dir = str(tmp_path / "out")
+    results = []
+    totals = batch.run_batch("text", input_dir, output_dir, workers=workers,
+                             on_result=lambda *result: results.append(result))
+    assert (totals["done"], totals["skipped"], totals["failed"]) == (2, 0, 0)
+    assert all(error is None for _, _, error in results)
+    assert os.path.exists(os.path.join(output_dir, "a.txt"))
+    assert os.path.exists(os.path.join(output_dir, "sub", "b.txt"))
+    assert sorted(entry["input"] for entry in _manifest(output_dir)) == ["a.pdf", os.path.join("sub", "b.pdf")]
+
+    # Everything is in the manifest: a rerun does nothing
+    totals = batch.run_batch("text", input_dir, output_dir, workers=workers)
+    assert (totals["done"], totals["skipped"]) == (0, 2)
+
+    # A changed input, or a missing output, is processed again
+    os.utime(os.path.join(input_dir, "a.pdf"), ns=(0, 0))
+    os.remove(os.path.join(output_dir, "sub", "b.txt"))
+    totals = batch.run_batch("text", input_dir, output_dir, workers=workers)
+    assert (totals["done"], totals["skipped"]) == (2, 0)
+
+    # So are all files when the options change, or when resume is off
+    totals = batch.run_batch("text", input_dir, output_dir, {"engine": "fitz", "ocr_dpi": 200})
+    assert totals["done"] == 2
+    totals = batch.run_batch("text", input_dir, output_dir, {"engine": "fitz", "ocr_dpi": 200}, resume=False)
+    assert totals["done"] == 2
+
+
+def test_failed_file_is_not_recorded(input_dir, tmp_path):
+    with open(os.path.join(input_dir, "broken.pdf"), "wb") as f:
+        f.write(b"not a pdf")
+    output_dir = str(tmp_path / "out")
+    totals = batch.run_batch("text", input_dir, output_dir)
+    assert (totals["done"], totals["failed"]) == (2, 1)
+    assert "broken.pdf" not in {entry["input"] for entry in _manifest(output_dir)}
+    assert not os.path.exists(os.path.join(output_dir, "broken.txt.partial"))
+
+
+def test_merge_directory(input_dir, tmp_path):
+    output_path = str(tmp_path / "merged.pdf")
+    report = batch.merge_directory(input_dir, output_path)
+    assert report["pages"] == 5
+    with fitz.open(output_path) as merged:
+        assert len(merged) == 5
+
+
+def test_cli_merge_reports_a_bad_pdf(input_dir, tmp_path, capsys):
+    with open(os.path.join(input_dir, "broken.pdf"), "wb") as f:
+        f.write(b"not a pdf")
+    assert cli.main(["merge", input_dir, str(tmp_path / "merged.pdf")]) == 1
+    err = capsys.readouterr().err
+    assert err.startswith("FAILED  merge of ") and err.count("\n") == 1
+
+
+def test_merge_directory_without_pdfs(tmp_path):
+    with pytest.raises(ValueError):
+        batch.merge_directory(str(tmp_path), str(tmp_path / "merged.pdf"))
+
+
+def test_unknown_tool(tmp_path):
+    with pytest.raises(ValueError):
+        batch.run_batch("nope", str(tmp_path), str(tmp_path / "out"))
+
+
+def test_ocr_outputs_keep_the_input_extension(monkeypatch, tmp_path):
+    def ocr_file(path, output_path, **options):
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(path))
+
+    extensions = batch.TOOLS["ocr"][0]
+    monkeypatch.setitem(batch.TOOLS, "ocr", (extensions, ".txt", ocr_file))
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    for name in ("scan.png", "scan.pdf"):
+        (input_dir / name).write_bytes(b"")
+    output_dir = tmp_path / "out"
+    totals = batch.run_batch("ocr", str(input_dir), str(output_dir))
+    assert totals["done"] == 2
+    for name in ("scan.png", "scan.pdf"):
+        assert (output_dir / f"{name}.txt").read_text(encoding="utf-8") == name
+    assert sorted(entry["output"] for entry in _manifest(str(output_dir))) == ["scan.pdf.txt", "scan.png.txt"]
@@ -0,0 +1,23 @@
+import types
+
+from core import incremental
+
+
+def _upload(name, data, **ids):
+    return types.SimpleNamespace(name=name, getvalue=lambda: data, **ids)
+
+
+def test_digest_is_cached_per_upload_id():
+    store = incremental.IncrementalStore()
+    store.digest(_upload("a.pdf", b"first", file_id="1"))
+    # Same id, so the upload is not hashed again
+    assert store.digest(_upload("a.pdf", b"second", file_id="1")) == incremental.content_hash(b"first")
+
+
+def test_digest_without_upload_id_is_not_cached_by_name():
+    store = incremental.IncrementalStore()
+    first = _upload("a.pdf", b"first")
+    second = _upload("a.pdf", b"second")
+    assert store.digest(first) == incremental.content_hash(b"first")
+    assert store.digest(second) == incremental.content_hash(b"second")
+    assert store.key(first) != store.key(second)
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from core import ocr
+
+
+def _thread_limit_after_import(**extra):
+    env = {name: value for name, value in os.environ.items() if name != "OMP_THREAD_LIMIT"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import os, core.ocr; print(os.environ.get('OMP_THREAD_LIMIT'))"],
+        env={**env, **extra}, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    return result.stdout.strip()
+
+
+def test_import_limits_tesseract_threads():
+    assert _thread_limit_after_import() == ocr.TESSERACT_THREAD_LIMIT
+
+
+def test_import_keeps_the_deployment_thread_limit():
+    # A limit set for the server is passed on unchanged
+    assert _thread_limit_after_import(OMP_THREAD_LIMIT="4") == "4"
+
+
+def test_tesseract_gets_the_process_environment():
+    pytest.importorskip("pytesseract")
+    assert ocr._tesseract().pytesseract.subprocess_args()["env"] is os.environ
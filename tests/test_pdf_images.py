@@ -0,0 +1,34 @@
+import random
+import types
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from benchmarks import corpus
+from core import pdf_images
+
+
+def test_summary_counts_the_extract_time_of_the_skipped_repeats(tmp_path, monkeypatch):
+    # Ten pages share one logo xref; pages 1 and 6 also have a photo. A fake
+    # clock makes the logo cheap and the photos expensive to extract.
+    path = tmp_path / "document.pdf"
+    corpus.make_pdf(str(path), 10, random.Random(0))
+    clock = [0.0]
+    monkeypatch.setattr(pdf_images, "time", types.SimpleNamespace(perf_counter=lambda: clock[0]))
+    extract_image = fitz.Document.extract_image
+
+    def timed_extract_image(doc, xref):
+        image = extract_image(doc, xref)
+        clock[0] += 0.01 if image["width"] == 64 else 1.0
+        return image
+
+    monkeypatch.setattr(fitz.Document, "extract_image", timed_extract_image)
+    report = pdf_images.new_report()
+    images = list(pdf_images.iter_pdf_images(path.read_bytes(), "document", report=report))
+
+    assert len(images) == 3
+    assert report["repeated_xrefs"] == 9
+    assert report["extract_seconds"] == pytest.approx(2.01)
+    assert report["extract_seconds_saved"] == pytest.approx(0.09)
+    assert "about 0.09 s of extraction" in pdf_images.summary(report)
@@ -0,0 +1,67 @@
+import io
+import os
+import random
+import tempfile
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from benchmarks import corpus
+from core import parallel, pdf_merge
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    rng = random.Random(0)
+    paths = []
+    for pages in (3, 5):
+        path = str(tmp_path / f"document_{pages}.pdf")
+        corpus.make_pdf(path, pages, rng)
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("dedupe", [True, False])
+def test_merge_fitz_into_spooled_file(pdfs, dedupe):
+    output = parallel.spooled_file()
+    report = pdf_merge.merge_pdfs(pdfs, output, "fitz", dedupe)
+    assert report["files"] == 2
+    assert report["pages"] == 8
+    assert report["output_bytes"] > 0
+    with fitz.open(stream=output.read(), filetype="pdf") as merged:
+        assert len(merged) == 8
+
+
+def test_merge_uploaded_files(pdfs):
+    uploads = []
+    for path in pdfs:
+        with open(path, "rb") as f:
+            uploads.append(io.BytesIO(f.read()))
+    output = parallel.spooled_file()
+    report = pdf_merge.merge_pdfs(uploads, output)
+    assert report["pages"] == 8
+    assert report["input_bytes"] == sum(upload.getbuffer().nbytes for upload in uploads)
+
+
+def test_unknown_engine(pdfs):
+    with pytest.raises(ValueError):
+        pdf_merge.merge_pdfs(pdfs, parallel.spooled_file(), "nope")
+
+
+def test_merge_fitz_does_not_hold_the_pdf_in_memory(pdfs, monkeypatch):
+    def tobytes(self, *args, **kwargs):
+        raise AssertionError("merged PDF built in memory")
+
+    directories = []
+    real_mkdtemp = tempfile.mkdtemp
+
+    def mkdtemp(**kwargs):
+        directories.append(real_mkdtemp(**kwargs))
+        return directories[-1]
+
+    monkeypatch.setattr(fitz.Document, "tobytes", tobytes)
+    monkeypatch.setattr(tempfile, "mkdtemp", mkdtemp)
+    report = pdf_merge.merge_pdfs(pdfs, parallel.spooled_file())
+    assert report["pages"] == 8
+    assert directories and not any(os.path.exists(directory) for directory in directories)
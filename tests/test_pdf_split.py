@@ -0,0 +1,25 @@
+import pytest
+
+from core import pdf_split
+
+
+def test_parse_page_range():
+    assert pdf_split.parse_page_range("1-3, 5", 5) == [0, 1, 2, 4]
+    assert pdf_split.parse_page_range("2", 2) == [1]
+    assert pdf_split.parse_page_range(" 4 - 4 ,1", 4) == [3, 0]
+
+
+@pytest.mark.parametrize("text", ["0", "6", "1-6", "a", "1-2-3", "", "1,,2"])
+def test_parse_page_range_rejects(text):
+    with pytest.raises(ValueError):
+        pdf_split.parse_page_range(text, 5)
+
+
+def test_plan_every_n():
+    assert pdf_split.plan_every_n(5, 2) == [[0, 1], [2, 3], [4]]
+    assert pdf_split.plan_every_n(0, 2) == []
+
+
+def test_part_file_name():
+    assert pdf_split.part_file_name(3) == "Part_0003.pdf"
+    assert pdf_split.part_file_name(12, "Section 2: Results/Annex") == "Part_0012_Section_2_ResultsAnnex.pdf"
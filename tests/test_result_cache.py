@@ -0,0 +1,27 @@
+import os
+
+from core.result_cache import ResultCache, _dir_size
+
+
+def test_overwriting_an_entry_keeps_the_size(tmp_path):
+    cache = ResultCache(root=str(tmp_path), max_mb=1)
+    key = cache.key("digest", "text")
+    cache.put_text(key, "x" * 1000)
+    assert cache.size_mb() * 1024 * 1024 == 1000
+    for _ in range(5):
+        cache.put_text(key, "y" * 400)
+    assert cache._size == _dir_size(str(tmp_path)) == 400
+    assert cache.get_text(key) == "y" * 400
+
+
+def test_oldest_entries_are_evicted_past_the_limit(tmp_path):
+    cache = ResultCache(root=str(tmp_path), max_mb=1)
+    keys = [cache.key(f"digest-{idx}", "text") for idx in range(3)]
+    for age, key in zip((20, 10), keys):
+        cache.put_text(key, "z" * 400 * 1024)
+        mtime = os.path.getmtime(cache._path(key)) - age
+        os.utime(cache._path(key), (mtime, mtime))
+    cache.put_text(keys[2], "z" * 400 * 1024)
+    assert cache.get_text(keys[0]) is None
+    assert cache.get_text(keys[2]) == "z" * 400 * 1024
+    assert cache._size == _dir_size(str(tmp_path)) <= cache.max_bytes
@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from core import table_export
+
+
+def test_parquet_keeps_source_columns_apart_from_table_columns():
+    first = pd.DataFrame({"page": [7, 8], "amount": [1.5, None]})
+    second = pd.DataFrame({"table_number": ["x"], "page_1": ["y"], "page": [9]})
+    output = table_export.write_parquet([("a.pdf", 1, 1, first), ("b.pdf", 3, 2, second)], io.BytesIO())
+
+    table = pq.read_table(output)
+    assert table.column_names == [
+        "source_file", "page", "table_number", "page_1", "amount", "table_number_1", "page_1_1",
+    ]
+    assert table.column("page").to_pylist() == [1, 1, 3]
+    assert table.column("table_number").to_pylist() == [1, 1, 2]
+    assert table.column("page_1").to_pylist() == [7, 8, 9]
+    assert table.column("amount").to_pylist() == [1.5, None, None]
+    assert table.column("page_1_1").to_pylist() == [None, None, "y"]
+
+
+def test_parquet_falls_back_to_strings_only_for_conflicting_columns():
+    first = pd.DataFrame({"code": [1, 2], "count": [3, 4], "price": [1, 2], "note": [None, None]})
+    second = pd.DataFrame({"code": ["A7"], "count": [5], "price": [2.5], "note": ["late"]})
+    mixed = pd.DataFrame({"code": [3], "count": pd.Series([6], dtype=object)})
+    output = table_export.write_parquet(
+        [("a.pdf", 1, 1, first), ("b.pdf", 1, 1, second), ("c.pdf", 1, 1, mixed)], io.BytesIO()
+    )
+
+    table = pq.read_table(output)
+    assert str(table.schema.field("code").type) == "string"
+    assert table.column("code").to_pylist() == ["1", "2", "A7", "3"]
+    assert str(table.schema.field("count").type) == "int64"
+    assert table.column("count").to_pylist() == [3, 4, 5, 6]
+    assert str(table.schema.field("price").type) == "double"
+    assert table.column("price").to_pylist() == [1.0, 2.0, 2.5, None]
+    assert str(table.schema.field("note").type) == "string"
+    assert table.column("note").to_pylist() == [None, None, "late", None]
@@ -0,0 +1,121 @@
+import json
+import os
+import random
+import subprocess
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from benchmarks import corpus
+from core import tables
+
+
+@pytest.fixture(scope="module")
+def corpus_pdf(tmp_path_factory):
+    # Pages 1 and 4 have a ruled table below the prose; pages 2, 3, 5 and 6
+    # are prose only (page 6 with a photo).
+    path = str(tmp_path_factory.mktemp("corpus") / "document.pdf")
+    corpus.make_pdf(path, 6, random.Random(0))
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _page(draw):
+    doc = fitz.open()
+    draw(doc.new_page(width=595, height=842))
+    return doc
+
+
+def test_candidate_pages_skip_prose(corpus_pdf):
+    assert tables.candidate_pages(corpus_pdf) == {0: "lines", 3: "lines"}
+
+
+def test_aligned_columns_on_corpus_pages(corpus_pdf):
+    with fitz.open(stream=corpus_pdf, filetype="pdf") as doc:
+        assert [tables._has_aligned_columns(page) for page in doc] == [True, False, False, True, False, False]
+
+
+def test_borderless_table_is_a_text_candidate():
+    def draw(page):
+        page.insert_textbox(fitz.Rect(50, 60, 545, 200), " ".join(["Some prose above the table."] * 10),
+                            fontsize=10)
+        for row in range(5):
+            for column in range(4):
+                text = f"Column {column + 1}" if row == 0 else f"{row * 10 + column}.50"
+                page.insert_text((50 + column * 120, 240 + row * 16), text, fontsize=9)
+
+    with _page(draw) as doc:
+        assert tables._has_aligned_columns(doc[0])
+        assert tables.candidate_pages(doc.tobytes()) == {0: "text"}
+
+
+def test_two_column_prose_is_not_a_table():
+    rng = random.Random(1)
+
+    def draw(page):
+        for left in (50, 310):
+            page.insert_textbox(fitz.Rect(left, 60, left + 235, 780),
+                                " ".join(corpus._sentence(rng) for _ in range(40)), fontsize=10)
+
+    with _page(draw) as doc:
+        assert not tables._has_aligned_columns(doc[0])
+
+
+def test_frame_from_rows_converts_numeric_columns():
+    pd = pytest.importorskip("pandas")
+    df = tables._frame_from_rows([["Item", "Item", None], ["1", "a", "2.5"], ["3", "b", ""]])
+    assert pd.api.types.is_integer_dtype(df.iloc[:, 0])
+    assert not pd.api.types.is_numeric_dtype(df.iloc[:, 1])
+    assert pd.api.types.is_float_dtype(df.iloc[:, 2])
+    assert df.iloc[:, 2].isna().tolist() == [False, True]
+
+
+def test_tabula_batch_reads_the_files_a_bad_pdf_stopped(monkeypatch):
+    tabula = pytest.importorskip("tabula")
+    table = [{"page_number": 1, "data": [[{"text": "a"}, {"text": "b"}], [{"text": "1"}, {"text": "2"}]]}]
+
+    def convert_into(path, output_path, **kwargs):
+        if path.endswith("00001.pdf"):
+            raise subprocess.CalledProcessError(1, "java")
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(table, f)
+
+    def convert_into_by_batch(directory, **kwargs):
+        # Like tabula-java: files in order, stopping at the first bad one
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            convert_into(path, os.path.splitext(path)[0] + ".json")
+
+    monkeypatch.setattr(tabula, "convert_into", convert_into)
+    monkeypatch.setattr(tabula, "convert_into_by_batch", convert_into_by_batch)
+    monkeypatch.setattr(tables.TabulaService, "mode", "subprocess")
+    service = tables.TabulaService()
+    monkeypatch.setattr(service, "warm_up", lambda: 1.0)
+
+    results = service.read_batch([("a.pdf", b"a"), ("bad.pdf", b"b"), ("c.pdf", b"c")])
+    assert isinstance(results[1], subprocess.CalledProcessError)
+    for frames in (results[0], results[2]):
+        assert [(list(df.columns), df.values.tolist(), df.attrs["page"]) for df in frames] == [(["a", "b"], [[1, 2]], 1)]
+    assert service.files_processed == 3
+    assert service.jvm_starts == 3
+
+
+def test_compare_engines_leaves_the_shared_tabula_service_alone(monkeypatch):
+    calls = []
+
+    def read_batch(self, pdfs):
+        calls.append(self)
+        self.files_processed += len(pdfs)
+        return [[] for _ in pdfs]
+
+    monkeypatch.setattr(tables.TabulaService, "warm_up", lambda self: 1.0)
+    monkeypatch.setattr(tables.TabulaService, "read_batch", read_batch)
+    monkeypatch.setattr(tables, "read_tables_plumber", lambda data, workers: [])
+    files_processed = tables.tabula_service.files_processed
+
+    rows = tables.compare_engines([("a.pdf", b"a"), ("b.pdf", b"b")])
+    assert [row["error"] for row in rows] == ["", ""]
+    assert len(calls) == 1 and calls[0] is not tables.tabula_service
+    assert calls[0].files_processed == 2
+    assert tables.tabula_service.files_processed == files_processed
@@ -0,0 +1,27 @@
+import io
+
+from core.text_spool import TextSpool
+
+
+def test_chunks_keep_multibyte_characters_whole():
+    spool = TextSpool(max_size=16)
+    spool.write("é" * 10 + "\n")
+    spool.write("ünïcode")
+    assert spool.size == len(("é" * 10 + "\nünïcode").encode("utf-8"))
+    assert "".join(spool.chunks(chunk_size=3)) == "é" * 10 + "\nünïcode"
+
+
+def test_write_spool_collapses_newlines_across_chunks(monkeypatch):
+    source = TextSpool()
+    monkeypatch.setattr(source, "chunks", lambda: iter(["a\n\n", "\nb\n", "\n\nc"]))
+    merged = TextSpool()
+    merged.write_spool(source, collapse_newlines=True)
+    assert "".join(merged.chunks()) == "a\nb\nc"
+
+
+def test_read_slice_and_file():
+    spool = TextSpool()
+    spool.write("hello world")
+    spool.write_file(io.BytesIO(b"!"))
+    assert spool.read_slice(6, 5) == "world"
+    assert spool.file().read() == b"hello world!"
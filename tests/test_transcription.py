@@ -0,0 +1,169 @@
+import itertools
+import os
+import subprocess
+
+import pytest
+
+from core import transcription
+
+RATE = transcription.SAMPLE_RATE
+
+
+def _segment(start, end, text):
+    return {"start": start, "end": end, "text": text}
+
+
+def test_stitch_single_chunk():
+    segments = [_segment(0.0, 1.0, " Hello"), _segment(1.0, 2.0, " world.")]
+    result = transcription.stitch_chunks([segments], [(0, 2 * RATE)])
+    assert result == {"text": "Hello world.", "segments": segments}
+
+
+def test_stitch_overlap_keeps_each_segment_once():
+    # Chunks [0, 12) s and [10, 20) s overlap around the 11 s midpoint.
+    chunks = [(0, 12 * RATE), (10 * RATE, 20 * RATE)]
+    first = [_segment(0.0, 5.0, " One."), _segment(9.0, 10.5, " Two."), _segment(10.8, 12.0, " Three.")]
+    second = [_segment(10.0, 10.6, " wo."), _segment(10.8, 12.0, " Three."), _segment(12.0, 19.0, " Four.")]
+    result = transcription.stitch_chunks([first, second], chunks)
+    assert [segment["text"] for segment in result["segments"]] == [" One.", " Two.", " Three.", " Four."]
+    assert result["text"] == "One. Two. Three. Four."
+
+
+def test_stitch_drops_repeat_across_midpoint():
+    # The same sentence decoded by both chunks, on either side of the midpoint.
+    chunks = [(0, 12 * RATE), (10 * RATE, 20 * RATE)]
+    first = [_segment(10.0, 10.9, " Same sentence.")]
+    second = [_segment(10.9, 11.8, "same  sentence.")]
+    result = transcription.stitch_chunks([first, second], chunks)
+    assert [segment["text"] for segment in result["segments"]] == [" Same sentence."]
+
+
+def test_offset_segments():
+    shifted = transcription.offset_segments([_segment(1.0, 2.0, " a")], 10.0)
+    assert shifted == [_segment(11.0, 12.0, " a")]
+
+
+@pytest.mark.parametrize("decodes", [True, False])
+def test_decode_audio_falls_back_to_a_temp_file(monkeypatch, decodes):
+    np = pytest.importorskip("numpy")
+    paths = []
+
+    def ffmpeg_decode(source, data=None, sample_rate=RATE):
+        if source != "pipe:0":
+            paths.append(source)
+            with open(source, "rb") as f:
+                assert f.read() == b"m4a data"
+            if decodes:
+                return np.zeros(RATE, dtype=np.float32)
+        raise subprocess.CalledProcessError(1, "ffmpeg", stderr=b"moov atom not found")
+
+    monkeypatch.setattr(transcription, "_ffmpeg_decode", ffmpeg_decode)
+    if decodes:
+        assert len(transcription.decode_audio(b"m4a data", suffix=".m4a")) == RATE
+    else:
+        with pytest.raises(RuntimeError, match="moov atom"):
+            transcription.decode_audio(b"m4a data", suffix=".m4a")
+    assert len(paths) == 1 and paths[0].endswith(".m4a")
+    assert not os.path.exists(paths[0])
+
+
+def test_split_at_silence_advances_by_half_a_window():
+    # With a large overlap and search range the quietest frame could sit just
+    # past start + overlap, which made every window advance by a few seconds.
+    audio = _tone(300)
+    for second in range(0, 300, 10):
+        audio[int((second + 0.5) * RATE):int((second + 0.6) * RATE)] = 0.0
+    chunks = transcription.split_at_silence(audio, window_seconds=60, overlap_seconds=30, search_seconds=20)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(audio)
+    starts = [start for start, _ in chunks]
+    assert all(later - earlier >= 30 * RATE for earlier, later in zip(starts, starts[1:]))
+    assert len(chunks) <= 9
+
+
+def _tone(seconds, envelope=lambda t: 1.0):
+    np = pytest.importorskip("numpy")
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (0.1 * envelope(t) * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def test_detect_speech_drops_pauses():
+    audio = _tone(20)
+    for start in (3, 9, 15):
+        audio[start * RATE:(start + 2) * RATE] = 0.0
+    regions = transcription.detect_speech(audio)
+    assert [(round(start / RATE, 1), round(end / RATE, 1)) for start, end in regions] == [
+        (0.0, 3.2), (4.8, 9.2), (10.8, 15.2), (16.8, 20.0),
+    ]
+
+
+@pytest.mark.parametrize("depth", [0.0, 0.3])
+def test_detect_speech_keeps_continuous_speech(depth):
+    # No pauses at all: the quietest frames are speech too
+    np = pytest.importorskip("numpy")
+    audio = _tone(20, lambda t: 0.5 + depth * np.sin(2 * np.pi * 0.25 * t))
+    assert transcription.detect_speech(audio) == [(0, len(audio))]
+
+
+def test_detect_speech_of_silence():
+    assert transcription.detect_speech(_tone(5, lambda t: 0.0)) == []
+
+
+class FakeModel:
+    calls = itertools.count()
+
+    def transcribe(self, audio, **options):
+        text = f" {len(audio)}-{next(self.calls)}"  # unique, so no repeat is dropped
+        return {"text": text, "segments": [{"start": 0.0, "end": len(audio) / RATE, "text": text}]}
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    # Thread pools stand in for the spawned worker processes.
+    from concurrent.futures import ThreadPoolExecutor
+    from core import parallel, whisper_models
+    registry = whisper_models.ModelRegistry(budget_mb=1000)
+    monkeypatch.setattr(whisper_models, "registry", registry)
+    monkeypatch.setattr(whisper_models, "model_mb", lambda model_size, backend="pytorch", threads=None: 300)
+    monkeypatch.setattr(whisper_models, "get_model", lambda *args: FakeModel())
+    monkeypatch.setattr(parallel, "process_pool", lambda workers, initializer, initargs: ThreadPoolExecutor(
+        workers, initializer=initializer, initargs=initargs))
+    pools = transcription.WorkerPools()
+    monkeypatch.setattr(transcription, "worker_pools", pools)
+    yield pools, registry
+    pools.shutdown()
+
+
+def test_worker_pool_is_reused_and_capped_by_budget(pools):
+    pools, registry = pools
+    with pools.use("base", "pytorch", 8) as (pool, workers):
+        assert workers == 3  # 1000 MB budget / 300 MB per copy
+        assert registry.used_mb() == 900
+    with pools.use("base", "pytorch", 2) as (again, _):
+        assert again is pool
+
+    # A pool for another model replaces the idle one and its reservation
+    registry.budget_mb = 1500
+    with pools.use("small", "pytorch", 2) as (other, workers):
+        assert other is not pool and workers == 2
+        assert registry.used_mb() == 600
+
+
+def test_no_worker_copies_without_budget(pools):
+    pools, registry = pools
+    registry.budget_mb = 500
+    with pools.use("base", "pytorch", 4) as (pool, workers):
+        assert (pool, workers) == (None, 1)
+    assert registry.used_mb() == 0
+
+
+def test_transcribe_long_audio_on_worker_pool(pools):
+    np = pytest.importorskip("numpy")
+    audio = np.full(25 * RATE, 0.5, dtype=np.float32)
+    audio[9 * RATE:int(9.1 * RATE)] = 0  # short pauses to cut at
+    audio[18 * RATE:int(18.1 * RATE)] = 0
+    chunks = transcription.split_at_silence(audio, window_seconds=10, overlap_seconds=0)
+    assert len(chunks) == 3
+    result = transcription.transcribe_long_audio(FakeModel(), "base", audio, window_seconds=10,
+                                                 overlap_seconds=0, workers=3)
+    assert [text.split("-")[0] for text in result["text"].split()] == [str(end - start) for start, end in chunks]
+    assert [segment["start"] for segment in result["segments"]] == [start / RATE for start, _ in chunks]
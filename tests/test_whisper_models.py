@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from core import whisper_models
+
+
+class FakeModel:
+    def __init__(self):
+        self.running = 0
+        self.overlapped = False
+
+    def transcribe(self, audio, **options):
+        self.running += 1
+        self.overlapped |= self.running > 1
+        time.sleep(0.01)
+        self.running -= 1
+        return {"text": audio, "segments": []}
+
+
+def test_registry_loads_each_key_once():
+    registry = whisper_models.ModelRegistry(budget_mb=100)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return FakeModel()
+
+    first = registry.get("a", loader, approx_mb=10)
+    assert registry.get("a", loader, approx_mb=10) is first
+    assert len(loads) == 1
+    assert isinstance(first, whisper_models.SharedModel)
+    assert first.running == 0  # attributes pass through to the model
+
+
+def test_shared_model_serializes_transcribe_calls():
+    registry = whisper_models.ModelRegistry(budget_mb=100)
+    model = registry.get("a", FakeModel, approx_mb=10)
+    threads = [threading.Thread(target=model.transcribe, args=(str(i),)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not model.model.overlapped
+
+
+def test_registry_evicts_least_recently_used():
+    registry = whisper_models.ModelRegistry(budget_mb=25)
+    registry.get("a", FakeModel, approx_mb=10)
+    registry.get("b", FakeModel, approx_mb=10)
+    registry.get("a", FakeModel, approx_mb=10)
+    registry.get("c", FakeModel, approx_mb=10)
+    assert registry.loaded() == ["a", "c"]
+    assert registry.used_mb() == 20
+
+
+def test_model_key():
+    assert whisper_models.model_key("base") == ("pytorch", "base")
+    assert whisper_models.model_key("base", "int8", 4) == ("int8", "base")
+    assert whisper_models.model_key("base", "ctranslate2", 4) == ("ctranslate2", "base", 4)
+
+
+def _tiny_whisper():
+    whisper = pytest.importorskip("whisper")
+    dims = whisper.model.ModelDimensions(
+        n_mels=80, n_audio_ctx=10, n_audio_state=64, n_audio_head=2, n_audio_layer=1,
+        n_vocab=100, n_text_ctx=10, n_text_state=64, n_text_head=2, n_text_layer=1,
+    )
+    torch = pytest.importorskip("torch")
+    torch.manual_seed(0)
+    model = whisper.model.Whisper(dims)
+    # The decoder's positional embedding is allocated uninitialized (it comes
+    # from the checkpoint); give it values so the outputs are finite.
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+    return model
+
+
+def test_int8_quantizes_whisper_linears():
+    torch = pytest.importorskip("torch")
+    from torch.ao.nn.quantized.dynamic import Linear as QuantizedLinear
+    model = _tiny_whisper()
+    fp32_mb = whisper_models.estimate_model_mb(model, None)
+    mel, tokens = torch.randn(1, 80, 20), torch.zeros(1, 3, dtype=torch.long)
+    with torch.no_grad():
+        expected = model(mel, tokens)
+        quantized = whisper_models.quantize_int8(model)
+        assert not any(type(m).__name__ == "Linear" and type(m).__module__.startswith("whisper")
+                       for m in quantized.modules())
+        assert sum(isinstance(m, QuantizedLinear) for m in quantized.modules()) > 0
+        assert torch.allclose(quantized(mel, tokens), expected, atol=0.5)
+    assert whisper_models.estimate_model_mb(quantized, None) < fp32_mb